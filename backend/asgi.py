@@ -0,0 +1,278 @@
+"""
+ASGI entry point for the backend.
+
+The wait- and stream-heavy endpoints (/api/test_connection(s), /api/predict,
+/api/train_model_stream and /api/jobs/<id>/stream) are served by native async
+handlers, so waiting clients don't pin an OS thread each. Every other route is
+passed through to the Flask app unchanged. Paths and JSON shapes are identical
+to the WSGI app.
+
+Run with:  uvicorn asgi:application --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import Headers, MultiDict
+
+import backend
+from backend import app
+from compression import compress, negotiate
+
+wsgi_application = WsgiToAsgi(app)
+
+# Flask-CORS allows every origin by default; mirror that (and its exposed headers) on the async routes.
+CORS_HEADERS = [
+    (b'access-control-allow-origin', b'*'),
+    (b'access-control-expose-headers', ', '.join(backend.CORS_EXPOSE_HEADERS).encode('latin-1'))
+]
+
+
+class AsyncRequest:
+    """The parts of an ASGI request the async handlers need."""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.path = scope['path']
+        self.method = scope['method']
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+        self.headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+
+    async def body(self):
+        chunks = []
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                break
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        return b''.join(chunks)
+
+    async def json(self):
+        body = await self.body()
+        return json.loads(body) if body else None
+
+
+async def send_json(send, payload, status=200, headers=()):
+    body = app.json.dumps(payload).encode('utf-8') + b'\n'
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + CORS_HEADERS + list(headers)
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def compressing(send, accept_encoding):
+    """
+    Wraps send so complete JSON responses are compressed as the Flask hook
+    compresses them. A JSON response's start is held until its first body
+    message; other and streamed (more_body) responses pass through unchanged.
+    """
+    encoding = negotiate(accept_encoding)
+    held = None
+
+    async def send_compressed(message):
+        nonlocal held
+        if message['type'] == 'http.response.start' and (b'content-type', b'application/json') in message['headers']:
+            held = message
+            return
+        if held is not None:
+            start, held = held, None
+            headers = start['headers'] + [(b'vary', b'Accept-Encoding')]
+            body = message.get('body', b'')
+            if encoding and not message.get('more_body') and len(body) >= backend.COMPRESSION_MIN_BYTES:
+                body = compress(body, encoding)
+                headers = [(k, v) for k, v in headers if k != b'content-length'] + [
+                    (b'content-encoding', encoding.encode()), (b'content-length', str(len(body)).encode())
+                ]
+                message = {**message, 'body': body}
+            await send({**start, 'headers': headers})
+        await send(message)
+
+    return send_compressed
+
+
+async def stream_job(request, send, job, last_event_id=0):
+    """Streams a job's events as SSE until it finishes or the client disconnects."""
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-job-id', job.id.encode())
+        ] + CORS_HEADERS
+    })
+    writer = backend.create_sse_writer()
+    events = job.attach_async(last_event_id, backend.SSE_HEARTBEAT_SECONDS, backend.SSE_BATCH_WINDOW_MS / 1000)
+    try:
+        async for batch in events:
+            if disconnected.is_set():
+                break
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    send({'type': 'http.response.body', 'body': writer.encode(batch), 'more_body': True}),
+                    backend.SSE_WRITE_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # The client stopped reading; drop the stream rather than buffer for it.
+                break
+            writer.wrote(time.perf_counter() - started)
+        else:
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        await events.aclose()
+        watcher.cancel()
+        backend.sse_events_coalesced.inc(writer.coalesced)
+
+
+# --- Async route handlers ---
+
+async def test_connection(request, send):
+    try:
+        payload = await request.json()
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON body'}, 400)
+    future, error = backend.start_connection_test(payload)
+    if error:
+        return await send_json(send, *error)
+    await send_json(send, *backend.connection_test_response(await asyncio.wrap_future(future)))
+
+
+async def test_connections(request, send):
+    try:
+        payload = await request.json()
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON body'}, 400)
+    started = time.perf_counter()
+    future, results, error = backend.start_connection_batch(payload)
+    if error:
+        return await send_json(send, *error)
+    probed = await asyncio.wrap_future(future)
+    await send_json(send, backend.connection_batch_response(results, probed, time.perf_counter() - started))
+
+
+async def predict(request, send):
+    try:
+        input_data = await request.json()
+    except ValueError:
+        return await send_json(send, {'error': 'Invalid JSON body'}, 400)
+
+    if isinstance(input_data, dict) and 'dataset' in input_data:
+        body, error = await asyncio.to_thread(backend.predict_dataset, input_data, request.args.get('model'))
+        return await send_json(send, *(error or (body,)))
+
+    started = time.perf_counter()
+    # The prediction cache may read its SQLite store, so submit off the event loop.
+    future, is_batch, error = await asyncio.to_thread(backend.submit_prediction, input_data, request.args.get('model'))
+    if error:
+        return await send_json(send, *error)
+    values = await asyncio.wrap_future(future)
+    await send_json(send, backend.prediction_response(input_data, values, is_batch, time.perf_counter() - started))
+
+
+async def train_model_stream(request, send):
+    # Reads the project from storage and may scan the upload folder.
+    job, last_event_id, error = await asyncio.to_thread(backend.resolve_training_stream, request.args, request.headers)
+    if error:
+        return await send_json(send, *error)
+    await stream_job(request, send, job, last_event_id)
+
+
+async def stream_job_events(request, send, job_id):
+    job = backend.job_scheduler.get(job_id)
+    if not job:
+        return await send_json(send, {'error': 'Job not found'}, 404)
+    resume_job_id, last_event_id = backend.parse_last_event_id(request.headers, request.args)
+    await stream_job(request, send, job, last_event_id if resume_job_id in (None, job_id) else 0)
+
+
+ASYNC_ROUTES = [
+    ('POST', re.compile(r'^/api/test_connection$'), test_connection),
+    ('POST', re.compile(r'^/api/test_connections$'), test_connections),
+    ('POST', re.compile(r'^/api/predict$'), predict),
+    ('GET', re.compile(r'^/api/train_model_stream$'), train_model_stream),
+    ('GET', re.compile(r'^/api/jobs/(?P<job_id>[^/]+)/stream$'), stream_job_events),
+]
+
+
+async def observed(handler, request, send, **params):
+    """
+    Runs a native handler with the same request metrics, authentication,
+    admission control and response compression as the Flask hooks.
+    """
+    endpoint = handler.__name__
+    started = backend.request_metrics.start()
+    status = None
+
+    async def observe(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+            backend.request_metrics.observe(started, endpoint, request.method, status)
+        await send(message)
+
+    send_observed = compressing(observe, request.headers.get('Accept-Encoding'))
+
+    try:
+        # A key missing from the auth cache is looked up in storage.
+        error = await asyncio.to_thread(
+            backend.authorize_request, request.method, request.path, endpoint, request.headers, request.args
+        )
+        if error:
+            return await send_json(send_observed, *error)
+        client = request.scope.get('client')
+        release, rejection = backend.admit_request(
+            request.method, request.path, endpoint, request.headers, request.args, client[0] if client else None
+        )
+        if rejection:
+            payload, status, retry_after = rejection
+            return await send_json(send_observed, payload, status, [(b'retry-after', str(retry_after).encode())])
+        try:
+            return await handler(request, send_observed, **params)
+        finally:
+            if release:
+                release()
+    finally:
+        if status is None:
+            backend.request_metrics.observe(started, endpoint, request.method, 500)
+        backend.request_metrics.finish()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http':
+        for method, pattern, handler in ASYNC_ROUTES:
+            match = pattern.match(scope['path'])
+            if match and scope['method'] == method:
+                return await observed(handler, AsyncRequest(scope, receive), send, **match.groupdict())
+
+    return await wsgi_application(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(application, host='0.0.0.0', port=5001)
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+
+from storage import hash_api_key
+
+
+def extract_api_key(headers, args):
+    """
+    Returns the API key presented with a request, or None. Accepted as
+    "Authorization: Bearer <key>", an X-API-Key header, or an `apiKey` query
+    parameter (EventSource can't send headers).
+    """
+    authorization = headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        return authorization[7:].strip() or None
+    return headers.get('X-API-Key') or args.get('apiKey') or None
+
+
+class ApiKeyAuthenticator:
+    """
+    Verifies API keys by SHA-256 digest with a small LRU cache in front of
+    storage, whose entries expire after `ttl` seconds.
+
+    Cache entries map digest -> (expires_at, key_id, permissions); unknown and
+    inactive keys are cached too so repeated bad keys don't hit storage.
+    `invalidate(key_id)` drops a key's entry immediately, e.g. after it is
+    activated, deactivated or deleted. The cache is per process: other worker
+    processes see a status change once their entry expires, so `ttl` bounds
+    how long a revoked key keeps working there.
+    """
+
+    def __init__(self, storage, ttl=10.0, max_entries=4096):
+        self.storage = storage
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._digests_by_key_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, raw_key):
+        """Returns the permission set of an active key, or None if the key is unknown or inactive."""
+        digest = hash_api_key(raw_key)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached and cached[0] > now:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+
+        api_key = self.storage.get_api_key_by_hash(digest)
+        key_id = api_key['id'] if api_key else None
+        if api_key and api_key['status'] == 'Active':
+            permissions = frozenset(name for name, granted in api_key['permissions'].items() if granted)
+        else:
+            permissions = None
+
+        with self._lock:
+            self._cache[digest] = (now + self.ttl, key_id, permissions)
+            self._cache.move_to_end(digest)
+            if key_id:
+                self._digests_by_key_id[key_id] = digest
+            while len(self._cache) > self.max_entries:
+                _, (_, evicted_key_id, _) = self._cache.popitem(last=False)
+                self._digests_by_key_id.pop(evicted_key_id, None)
+        return permissions
+
+    def invalidate(self, key_id):
+        """Forgets any cached verification of `key_id`."""
+        with self._lock:
+            digest = self._digests_by_key_id.pop(key_id, None)
+            if digest:
+                self._cache.pop(digest, None)
+
+    def authorize(self, raw_key, permission, required=True):
+        """
+        Checks a request's key against the permission its route needs.
+        Returns None if allowed, otherwise an error response as a (payload, status) pair.
+        """
+        if raw_key is None:
+            if required:
+                return {'error': 'API key required'}, 401
+            return None
+        permissions = self.lookup(raw_key)
+        if permissions is None:
+            return {'error': 'Invalid or inactive API key'}, 401
+        if permission and permission not in permissions:
+            return {'error': f'API key lacks the "{permission}" permission'}, 403
+        return None
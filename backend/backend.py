@@ -1,27 +1,130 @@
-
+import base64
+import json
+import logging
+import math
 import os
+import re
 import time
 import uuid
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, g, request, jsonify, send_file, url_for
 from flask_cors import CORS
+from inference import InferenceEngine, LinearScorer, format_prediction, featurize_columns
+from model_registry import ModelRegistry
+from storage import create_storage
+from auth import ApiKeyAuthenticator, extract_api_key
+from limits import ConcurrencyLimiter, ReleasingFile, TokenBucketLimiter
+from storage import hash_api_key, mask_api_key
+from upload_store import UploadStore, UploadError
+from profiler import ProfileCache
+from columnar import ColumnarCache
+from response_cache import ResponseCache
+from compression import ArtifactCompressor, CompressedBodies, compress, is_compressible, negotiate
+from prediction_cache import PredictionCache, SharedPredictionStore
+from connectivity import ConnectivityProber, ProbeError, TargetPolicy, parse_target
+from metrics import MetricsRegistry, RequestMetrics
+from structured_logging import configure_logging
+from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
-CORS(app)
+# Response headers browsers may read cross-origin; asgi.py sends the same list.
+CORS_EXPOSE_HEADERS = ['ETag', 'Link', 'X-Next-Cursor', 'X-Job-Id', 'Retry-After']
+CORS(app, expose_headers=CORS_EXPOSE_HEADERS)
+
+# --- 1. SETUP & DATABASES ---
+
+# Logs are handed to a background writer through a bounded queue (records are
+# dropped, not waited on, when it's full). LOG_FORMAT is "json" or "text".
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
 
-# --- 1. SETUP & IN-MEMORY DATABASES ---
+log_handler = configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_QUEUE_SIZE)
+log = logging.getLogger('backend')
+
+# Prometheus metrics served at /metrics.
+metrics_registry = MetricsRegistry()
+request_metrics = RequestMetrics(metrics_registry)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'uploads'))
 MODELS_FOLDER = os.path.join(BASE_DIR, 'predefined_models')
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(MODELS_FOLDER, exist_ok=True)
 
-# In-memory database for storing project details
-projects_db = {}
+# Largest dataset accepted by /api/upload and the resumable /api/uploads protocol.
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', 10240))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+upload_store = UploadStore(UPLOAD_FOLDER, max_file_size=MAX_UPLOAD_MB * 1024 * 1024)
+# Dataset profiles, keyed by content hash so identical uploads are profiled once.
+profile_cache = ProfileCache(upload_store, os.path.join(UPLOAD_FOLDER, '.profiles'))
+# Typed, memory-mapped column copies of uploaded CSVs for training and batch scoring.
+dataset_cache = ColumnarCache(upload_store, profile_cache, os.path.join(UPLOAD_FOLDER, '.columnar'))
+
+# Micro-batching knobs for /api/predict. Concurrent single-record requests are
+# coalesced into batches of at most this many records, waiting at most this long.
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 64))
+PREDICT_MAX_WAIT_MS = float(os.environ.get('PREDICT_MAX_WAIT_MS', 5))
+
+# Loaded models are kept in an LRU cache bounded by this many megabytes.
+MODEL_CACHE_BUDGET_MB = int(os.environ.get('MODEL_CACHE_BUDGET_MB', 256))
+MODEL_REGISTRY_POLL_SECONDS = float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 2))
+# Model used by /api/predict when the request doesn't name one.
+DEFAULT_PREDICT_MODEL = os.environ.get('DEFAULT_PREDICT_MODEL', 'GenericModel.pkl')
+# Trained models kept per domain; each training run deletes the oldest beyond this.
+TRAINED_MODELS_KEPT = max(1, int(os.environ.get('TRAINED_MODELS_KEPT', 5)))
+
+model_registry = ModelRegistry(
+    MODELS_FOLDER,
+    memory_budget=MODEL_CACHE_BUDGET_MB * 1024 * 1024,
+    poll_interval=MODEL_REGISTRY_POLL_SECONDS
+)
+
+inference_engine = InferenceEngine(
+    LinearScorer(),
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_wait=PREDICT_MAX_WAIT_MS / 1000
+)
+# Version of the built-in scorer in prediction cache keys; registry models use their content hash.
+BUILTIN_SCORER_VERSION = 'builtin:LinearScorer:0'
+
+# Memoized /api/predict results, keyed by the model's content hash and the
+# canonical JSON of each record (0 entries disables the cache). With
+# PREDICTION_CACHE_PATH set, worker processes share results through that SQLite file.
+PREDICTION_CACHE_ENTRIES = int(os.environ.get('PREDICTION_CACHE_ENTRIES', 100000))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get('PREDICTION_CACHE_TTL_SECONDS', 600))
+PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH', '')
+PREDICTION_CACHE_SHARED_ENTRIES = int(os.environ.get('PREDICTION_CACHE_SHARED_ENTRIES', 1000000))
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICTION_CACHE_ENTRIES,
+    ttl=PREDICTION_CACHE_TTL_SECONDS,
+    shared=SharedPredictionStore(
+        PREDICTION_CACHE_PATH, ttl=PREDICTION_CACHE_TTL_SECONDS, max_entries=PREDICTION_CACHE_SHARED_ENTRIES
+    ) if PREDICTION_CACHE_PATH and PREDICTION_CACHE_ENTRIES > 0 else None
+)
+
+# Projects and API keys live in a pluggable storage engine shared by all
+# worker processes: "sqlite:///<path>" (default, WAL mode) or "memory://".
+STORAGE_URL = os.environ.get('STORAGE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'data', 'uimodel.db')}")
+
+storage = create_storage(STORAGE_URL)
+
+# Every permission a key can hold; the bootstrap admin key gets all of them.
+API_KEY_PERMISSIONS = [
+    "read:projects", "write:projects", "delete:projects",
+    "read:training_jobs", "execute:training_jobs",
+    "read:models", "write:models", "delete:models", "deploy:models",
+    "read:datasources", "write:datasources", "delete:datasources",
+    "execute:predictions",
+    "read:users", "write:users", "read:billing", "admin:webhooks",
+    "admin:keys",
+]
 
-# In-memory database for API keys
-api_keys_db = [
+# Example keys seeded into an empty database. They are display-only: no
+# secret exists for them, so they can never authenticate a request.
+DEFAULT_API_KEYS = [
     {
         "id": "sk-1",
         "name": "Default Key",
@@ -47,13 +150,412 @@ api_keys_db = [
     }
 ]
 
+storage.seed_api_keys(DEFAULT_API_KEYS)
+
+# The first usable key. When set, it is stored (by digest) as "sk-admin"
+# with every permission, replacing an older admin key if the value changed;
+# further keys are then created through POST /api/keys with it.
+API_ADMIN_KEY = os.environ.get('API_ADMIN_KEY', '')
+ADMIN_KEY_ID = 'sk-admin'
+
+if API_ADMIN_KEY and storage.get_api_key_by_hash(hash_api_key(API_ADMIN_KEY)) is None:
+    storage.replace_api_key({
+        "id": ADMIN_KEY_ID,
+        "name": "Admin Key",
+        "key": mask_api_key(API_ADMIN_KEY),
+        "status": "Active",
+        "createdAt": time.time(),
+        "permissions": {permission: True for permission in API_KEY_PERMISSIONS}
+    }, hash_api_key(API_ADMIN_KEY))
+
+# Presented API keys are always verified. Requests without a key are only
+# rejected when API_AUTH_REQUIRED is set, since the dashboard doesn't send one.
+API_AUTH_REQUIRED = os.environ.get('API_AUTH_REQUIRED', '').lower() in ('1', 'true', 'yes')
+API_KEY_CACHE_TTL_SECONDS = float(os.environ.get('API_KEY_CACHE_TTL_SECONDS', 10))
+
+authenticator = ApiKeyAuthenticator(storage, ttl=API_KEY_CACHE_TTL_SECONDS)
+
+# Serialized GET responses for the polled collections, invalidated on writes.
+# Projects and keys are checked against the storage's write counters, so a
+# write in any worker process invalidates them; models are indexed per process.
+# A non-zero TTL additionally bounds how long any entry is served.
+RESPONSE_CACHE_TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 0))
+
+response_cache = ResponseCache(
+    app.json.dumps, ttl=RESPONSE_CACHE_TTL_SECONDS,
+    shared_version=storage.collection_version, shared_collections=('projects', 'keys')
+)
+model_registry.on_change(lambda name, entry: response_cache.bump('models'))
+
+# Responses of at least this many bytes are compressed when the client accepts
+# gzip (or zstd/brotli, if those packages are installed). Model files get
+# precompressed variants on disk unless MODEL_PRECOMPRESSION is off.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+MODEL_PRECOMPRESSION = os.environ.get('MODEL_PRECOMPRESSION', '1').lower() in ('1', 'true', 'yes')
+
+compressed_bodies = CompressedBodies()
+artifact_compressor = ArtifactCompressor(model_registry, min_bytes=COMPRESSION_MIN_BYTES) if MODEL_PRECOMPRESSION else None
+
+# Admission control. Requests needing these permissions take a token from a
+# per-client bucket (rate per second, burst); a rate of 0 disables the class.
+PREDICT_RATE_PER_SECOND = float(os.environ.get('PREDICT_RATE_PER_SECOND', 50))
+PREDICT_RATE_BURST = int(os.environ.get('PREDICT_RATE_BURST', 100))
+TRAINING_RATE_PER_MINUTE = float(os.environ.get('TRAINING_RATE_PER_MINUTE', 30))
+TRAINING_RATE_BURST = int(os.environ.get('TRAINING_RATE_BURST', 10))
+# Concurrent requests per client and in total on the expensive routes.
+PREDICT_MAX_CONCURRENT_PER_CLIENT = int(os.environ.get('PREDICT_MAX_CONCURRENT_PER_CLIENT', 32))
+STREAM_MAX_CONCURRENT_PER_CLIENT = int(os.environ.get('STREAM_MAX_CONCURRENT_PER_CLIENT', 4))
+STREAM_MAX_CONCURRENT = int(os.environ.get('STREAM_MAX_CONCURRENT', 256))
+GENERATE_MAX_CONCURRENT_PER_CLIENT = int(os.environ.get('GENERATE_MAX_CONCURRENT_PER_CLIENT', 1))
+GENERATE_MAX_CONCURRENT = int(os.environ.get('GENERATE_MAX_CONCURRENT', 2))
+# New work is shed with 503 while this many records / jobs are already waiting.
+PREDICT_MAX_QUEUED_RECORDS = int(os.environ.get('PREDICT_MAX_QUEUED_RECORDS', 4096))
+TRAINING_MAX_QUEUED_JOBS = int(os.environ.get('TRAINING_MAX_QUEUED_JOBS', 16))
+
+rate_limiters = {
+    permission: TokenBucketLimiter(rate, burst)
+    for permission, rate, burst in (
+        ('execute:predictions', PREDICT_RATE_PER_SECOND, PREDICT_RATE_BURST),
+        ('execute:training_jobs', TRAINING_RATE_PER_MINUTE / 60, TRAINING_RATE_BURST),
+    )
+    if rate > 0
+}
+# Cancelling frees capacity, so it is never rate limited.
+RATE_LIMIT_EXEMPT_ENDPOINTS = frozenset(['cancel_job'])
+
+stream_limiter = ConcurrencyLimiter(STREAM_MAX_CONCURRENT_PER_CLIENT, STREAM_MAX_CONCURRENT)
+concurrency_limiters = {
+    'predict': ConcurrencyLimiter(PREDICT_MAX_CONCURRENT_PER_CLIENT),
+    'generate_model': ConcurrencyLimiter(GENERATE_MAX_CONCURRENT_PER_CLIENT, GENERATE_MAX_CONCURRENT),
+    'train_model_stream': stream_limiter,
+    'stream_job_events': stream_limiter,
+}
+requests_rejected = metrics_registry.counter(
+    'http_requests_rejected_total', 'Requests shed by admission control, by endpoint and reason.', ('endpoint', 'reason')
+)
+
+# Permission each endpoint requires; None means any valid key.
+ENDPOINT_PERMISSIONS = {
+    'get_projects': 'read:projects',
+    'get_project': 'read:projects',
+    'create_project': 'write:projects',
+    'get_api_keys': 'admin:keys',
+    'create_api_key': 'admin:keys',
+    'delete_api_key': 'admin:keys',
+    'toggle_api_key_status': 'admin:keys',
+    'upload_file': 'write:datasources',
+    'create_upload': 'write:datasources',
+    'get_upload': 'write:datasources',
+    'append_upload_chunk': 'write:datasources',
+    'abort_upload': 'write:datasources',
+    'get_dataset_profile': 'read:datasources',
+    'test_connection': 'write:datasources',
+    'test_connections': 'write:datasources',
+    'get_models': 'read:models',
+    'download_model': 'read:models',
+    'generate_model': 'write:models',
+    'train_model_stream': 'execute:training_jobs',
+    'create_job': 'execute:training_jobs',
+    'cancel_job': 'execute:training_jobs',
+    'get_jobs': 'read:training_jobs',
+    'get_job': 'read:training_jobs',
+    'stream_job_events': 'read:training_jobs',
+    'create_hyperparameter_search': 'execute:training_jobs',
+    'predict': 'execute:predictions',
+    'predict_stats': 'read:models',
+}
+
+
+def authorize_request(method, path, endpoint, headers, args):
+    """
+    Authenticates an /api/* request by API key and checks the endpoint's permission.
+    Returns None if allowed, otherwise an error response as a (payload, status) pair.
+    """
+    if method == 'OPTIONS' or not path.startswith('/api/'):
+        return None
+    return authenticator.authorize(
+        extract_api_key(headers, args),
+        ENDPOINT_PERMISSIONS.get(endpoint),
+        required=API_AUTH_REQUIRED
+    )
+
+
+def client_identity(headers, args, remote_addr):
+    """Identifies the caller for per-client limits: a digest of its API key, else its address."""
+    raw_key = extract_api_key(headers, args)
+    return f"key:{hash_api_key(raw_key)[:16]}" if raw_key else f"addr:{remote_addr}"
+
+
+def queue_full(endpoint, headers, args):
+    """Whether the queue the request would add work to is full."""
+    if endpoint == 'predict':
+        return inference_engine.queued_records() >= PREDICT_MAX_QUEUED_RECORDS
+    if endpoint in ('create_job', 'create_hyperparameter_search', 'generate_model'):
+        return job_scheduler.queued() >= TRAINING_MAX_QUEUED_JOBS
+    if endpoint == 'train_model_stream':
+        # Resuming or following a known job adds no work.
+        resuming = args.get('jobId') or headers.get('Last-Event-ID') or args.get('lastEventId')
+        return not resuming and job_scheduler.queued() >= TRAINING_MAX_QUEUED_JOBS
+    return False
+
+
+def admit_request(method, path, endpoint, headers, args, remote_addr):
+    """
+    Applies the endpoint's queue limit, its concurrency cap and the per-client
+    rate limit of its permission class, in that order, so an overloaded
+    request is rejected before any work starts. A rate token is only taken
+    once the other checks pass, so requests shed for load don't use up the
+    client's rate budget.
+    Returns (release, None) if admitted, where release (or None) must be
+    called once the request has finished, otherwise (None, (payload, status,
+    retry_after_seconds)).
+    """
+    if method == 'OPTIONS' or not path.startswith('/api/'):
+        return None, None
+    limiter = rate_limiters.get(ENDPOINT_PERMISSIONS.get(endpoint))
+    if endpoint in RATE_LIMIT_EXEMPT_ENDPOINTS:
+        limiter = None
+    concurrency = concurrency_limiters.get(endpoint)
+    if queue_full(endpoint, headers, args):
+        requests_rejected.inc(labels=(endpoint, 'queue_full'))
+        return None, ({'error': 'Server is busy, try again shortly'}, 503, 1)
+    if limiter is None and concurrency is None:
+        return None, None
+    client = client_identity(headers, args, remote_addr)
+
+    release = None
+    if concurrency is not None:
+        cap = concurrency.acquire(client)
+        if cap:
+            requests_rejected.inc(labels=(endpoint, f'concurrency_{cap}'))
+            if cap == 'client':
+                return None, ({'error': 'Too many concurrent requests for this client'}, 429, 1)
+            return None, ({'error': 'Too many concurrent requests'}, 503, 1)
+        release = lambda: concurrency.release(client)
+    if limiter is not None:
+        wait = limiter.take(client)
+        if wait:
+            if release:
+                release()
+            requests_rejected.inc(labels=(endpoint, 'rate_limited'))
+            return None, ({'error': 'Rate limit exceeded'}, 429, max(1, math.ceil(min(wait, 3600))))
+    return release, None
+
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = request_metrics.start()
+
+
+@app.after_request
+def observe_request_metrics(response):
+    request_metrics.observe(g.request_started, request.endpoint, request.method, response.status_code)
+    g.request_observed = True
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    if 'request_started' not in g:
+        return
+    if not g.get('request_observed'):
+        request_metrics.observe(g.request_started, request.endpoint, request.method, 500)
+    request_metrics.finish()
+
+
+@app.before_request
+def authenticate():
+    error = authorize_request(request.method, request.path, request.endpoint, request.headers, request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+
+
+@app.before_request
+def admit():
+    release, rejection = admit_request(
+        request.method, request.path, request.endpoint, request.headers, request.args, request.remote_addr
+    )
+    if rejection:
+        payload, status, retry_after = rejection
+        response = jsonify(payload)
+        response.status_code = status
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.admission_release = release
+
+
+@app.after_request
+def hold_admission(response):
+    # Streamed responses keep their slot until the server closes them.
+    release = g.pop('admission_release', None)
+    if release:
+        response.call_on_close(release)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compresses complete (non-streamed) text and JSON responses for clients that accept it."""
+    if (response.direct_passthrough or response.is_streamed or not is_compressible(response.mimetype)
+            or 'Content-Encoding' in response.headers or response.status_code < 200 or response.status_code in (204, 206)):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if not encoding or (response.content_length or 0) < COMPRESSION_MIN_BYTES:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak)
+    return response
+
+
+@app.teardown_request
+def release_admission(error=None):
+    # Only reached with a slot still held if the request failed before after_request.
+    release = g.pop('admission_release', None)
+    if release:
+        release()
+
+
+def encoded_etag(etag, encoding):
+    """The ETag of a content-coded representation; each coding needs its own strong ETag."""
+    return f"{etag}-{encoding}" if encoding else etag
+
+
+def cached_json_response(collection, key, build):
+    """
+    Serves a collection read from the response cache with a strong ETag,
+    answering 304 Not Modified when it matches If-None-Match.
+    Compressed bodies are cached per ETag, so a repeated read isn't recompressed.
+    build() returns (payload, extra_headers or None).
+    """
+    body, etag, headers = response_cache.get(collection, key, build)
+    encoding = negotiate(request.headers.get('Accept-Encoding')) if len(body) >= COMPRESSION_MIN_BYTES else None
+    etag = encoded_etag(etag, encoding)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    elif encoding:
+        response = app.response_class(compressed_bodies.get(etag, encoding, body), mimetype='application/json')
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if headers:
+        response.headers.update(headers)
+    # Let browsers keep the body but revalidate on every poll.
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 
 # --- 2. API ENDPOINTS ---
 
+# Page size of /api/projects when only `cursor` is given, and the largest page allowed.
+# Without `limit` or `cursor` the whole list is returned, as the dashboard expects.
+PROJECTS_PAGE_SIZE = int(os.environ.get('PROJECTS_PAGE_SIZE', 100))
+PROJECTS_MAX_PAGE_SIZE = int(os.environ.get('PROJECTS_MAX_PAGE_SIZE', 1000))
+PROJECT_FIELDS = ('id', 'name', 'description', 'owner', 'domainType', 'createdAt')
+PROJECT_SORTS = ('createdAt', 'name')
+
+
+def encode_cursor(sort, project):
+    """Opaque pagination cursor pointing just past `project` in `sort` order."""
+    value = project[sort] if sort != 'name' else project['name'] or ''
+    raw = json.dumps([sort, value, project['id']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """Returns the (sort_value, id) position of a cursor, or raises ValueError."""
+    try:
+        cursor_sort, value, project_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if cursor_sort != sort:
+        raise ValueError('Cursor was issued for a different sort order')
+    return value, project_id
+
+
+def parse_project_query(args):
+    """
+    Validates the pagination, filter, sort and fields parameters of /api/projects.
+    Returns (query, None) or (None, error_response).
+    """
+    sort = args.get('sort', 'createdAt')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in PROJECT_SORTS:
+        return None, ({'error': f"sort must be one of: {', '.join(PROJECT_SORTS)} (prefix with '-' for descending)"}, 400)
+
+    fields = None
+    if args.get('fields'):
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in PROJECT_FIELDS]
+        if unknown:
+            return None, ({'error': f"Unknown fields: {', '.join(unknown)}"}, 400)
+
+    try:
+        limit = int(args.get('limit', PROJECTS_PAGE_SIZE))
+        created_after = float(args['createdAfter']) if args.get('createdAfter') else None
+        created_before = float(args['createdBefore']) if args.get('createdBefore') else None
+    except ValueError:
+        return None, ({'error': 'limit, createdAfter and createdBefore must be numbers'}, 400)
+    try:
+        after = decode_cursor(args['cursor'], sort) if args.get('cursor') else None
+    except ValueError as e:
+        return None, ({'error': str(e)}, 400)
+    if not 1 <= limit <= PROJECTS_MAX_PAGE_SIZE:
+        return None, ({'error': f'limit must be between 1 and {PROJECTS_MAX_PAGE_SIZE}'}, 400)
+    if not args.get('limit') and not args.get('cursor'):
+        limit = None
+
+    return {
+        'owner': args.get('owner'),
+        'domain_type': args.get('domainType'),
+        'created_after': created_after,
+        'created_before': created_before,
+        'sort': sort,
+        'descending': descending,
+        'after': after,
+        'limit': limit,
+        'fields': fields
+    }, None
+
+
+def list_projects_page(query, args):
+    """
+    Runs a parsed project query. Returns (projects, headers): the page
+    projected to the requested fields, plus X-Next-Cursor and Link headers
+    if there is a next page.
+    """
+    fields = query.pop('fields')
+    projects, has_more = storage.query_projects(**query)
+    headers = None
+    if has_more and projects:
+        next_cursor = encode_cursor(query['sort'], projects[-1])
+        next_url = url_for('get_projects', **dict(args.items(), cursor=next_cursor))
+        headers = {'X-Next-Cursor': next_cursor, 'Link': f'<{next_url}>; rel="next"'}
+    if fields:
+        projects = [{field: project[field] for field in fields} for project in projects]
+    return projects, headers
+
+
 @app.route('/api/projects', methods=['GET'])
 def get_projects():
-    """Returns a list of all projects."""
-    return jsonify(list(projects_db.values()))
+    """
+    Returns projects as a JSON array, oldest first by default: all of them,
+    or one page when `limit` or `cursor` is given.
+    Supports owner/domainType/createdAfter/createdBefore filters,
+    sort=[-]createdAt|[-]name, limit, cursor and fields=a,b projection.
+    The next page's cursor is returned in the X-Next-Cursor and Link headers.
+    """
+    query, error = parse_project_query(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+    cache_key = tuple(sorted(request.args.items(multi=True)))
+    return cached_json_response('projects', cache_key, lambda: list_projects_page(query, request.args))
 
 @app.route('/api/projects', methods=['POST'])
 def create_project():
@@ -68,27 +570,21 @@ def create_project():
         'domainType': data.get('domainType'),
         'createdAt': time.time()
     }
-    projects_db[project_id] = new_project
+    storage.create_project(new_project)
     return jsonify(new_project), 201
 
 @app.route('/api/projects/<project_id>', methods=['GET'])
 def get_project(project_id):
     """Returns details for a specific project."""
-    project = projects_db.get(project_id)
+    project = storage.get_project(project_id)
     if project:
         return jsonify(project)
     return jsonify({'error': 'Project not found'}), 404
 
 @app.route('/api/keys', methods=['GET'])
 def get_api_keys():
-    """Returns a list of all API keys, excluding the full key for security."""
-    # Return a "short" version of the key
-    censored_keys = []
-    for key in api_keys_db:
-        censored_key = key.copy()
-        censored_key['key'] = f"{key['key'][:5]}...{key['key'][-4:]}"
-        censored_keys.append(censored_key)
-    return jsonify(censored_keys)
+    """Returns a list of all API keys; storage only ever holds their masked form."""
+    return cached_json_response('keys', None, lambda: (storage.list_api_keys(), None))
 
 @app.route('/api/keys', methods=['POST'])
 def create_api_key():
@@ -99,8 +595,18 @@ def create_api_key():
 
     if not name:
         return jsonify({'error': 'Key name is required'}), 400
-
-    new_key_id = f"sk-{len(api_keys_db) + 1}"
+    if not isinstance(permissions, dict):
+        return jsonify({'error': 'permissions must be an object'}), 400
+
+    # A key can only grant what it holds; keyless callers are only let in when auth isn't required.
+    raw_key = extract_api_key(request.headers, request.args)
+    if raw_key is not None:
+        held = authenticator.lookup(raw_key) or frozenset()
+        escalated = sorted(permission for permission, granted in permissions.items() if granted and permission not in held)
+        if escalated:
+            return jsonify({'error': f"Cannot grant permissions the calling key lacks: {', '.join(escalated)}"}), 403
+
+    new_key_id = storage.next_api_key_id()
     # Generate a secure, random 64-character key
     full_key = f"sk_{uuid.uuid4().hex}{uuid.uuid4().hex}"
 
@@ -112,17 +618,16 @@ def create_api_key():
         "createdAt": time.time(),
         "permissions": permissions
     }
-    api_keys_db.append(new_key)
+    # Only the digest and a masked copy are stored, so the full key can't be recovered later
+    storage.add_api_key(dict(new_key, key=mask_api_key(full_key)), hash_api_key(full_key))
     # Return the full key this one time
     return jsonify(new_key), 201
 
 @app.route('/api/keys/<key_id>', methods=['DELETE'])
 def delete_api_key(key_id):
     """Deletes an API key."""
-    global api_keys_db
-    key_to_delete = next((key for key in api_keys_db if key['id'] == key_id), None)
-    if key_to_delete:
-        api_keys_db = [key for key in api_keys_db if key['id'] != key_id]
+    if storage.delete_api_key(key_id):
+        authenticator.invalidate(key_id)
         return jsonify({'message': 'API key deleted successfully'}), 200
     return jsonify({'error': 'API key not found'}), 404
 
@@ -134,9 +639,9 @@ def toggle_api_key_status(key_id):
     if new_status not in ['Active', 'Inactive']:
         return jsonify({'error': 'Invalid status'}), 400
 
-    key_to_update = next((key for key in api_keys_db if key['id'] == key_id), None)
+    key_to_update = storage.set_api_key_status(key_id, new_status)
     if key_to_update:
-        key_to_update['status'] = new_status
+        authenticator.invalidate(key_id)
         return jsonify(key_to_update), 200
     return jsonify({'error': 'API key not found'}), 404
 
@@ -144,7 +649,8 @@ def toggle_api_key_status(key_id):
 def upload_file():
     """
     Endpoint to handle file uploads from the user.
-    It saves the file to the 'uploads' directory.
+    It streams the file into the 'uploads' directory through the upload store.
+    Large datasets should use the resumable /api/uploads protocol instead.
     """
     # Check if the 'file' key is in the request's file parts
     if 'file' not in request.files:
@@ -157,61 +663,486 @@ def upload_file():
         return jsonify({'error': 'No file selected for uploading'}), 400
 
     if file:
-        # We don't do anything with the file, just save it to show it was received.
-        filename = file.filename
-        file.save(os.path.join(UPLOAD_FOLDER, filename))
+        filename = secure_filename(file.filename)
+        if not filename:
+            return jsonify({'error': 'Invalid file name'}), 400
+        try:
+            stored = upload_store.save_stream(file.stream, filename)
+        except UploadError as e:
+            return jsonify({'error': e.message}), e.status
+        if filename.lower().endswith('.csv'):
+            dataset_cache.warm(filename)
         return jsonify({
-            'message': f'File "{filename}" uploaded successfully. Ready to generate model.'
+            'message': f'File "{filename}" uploaded successfully. Ready to generate model.',
+            'fileName': filename,
+            'sha256': stored['sha256']
         }), 200
 
     return jsonify({'error': 'File upload failed'}), 500
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """
+    Starts a resumable upload. Expects {"fileName": ..., "size": <total bytes>}.
+    Chunks are then sent with PATCH /api/uploads/<uploadId>.
+    """
+    data = request.json or {}
+    filename = secure_filename(data.get('fileName') or '')
+    if not filename:
+        return jsonify({'error': 'A valid file name is required'}), 400
+    try:
+        session = upload_store.create_session(filename, int(data.get('size', -1)))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Upload size is required'}), 400
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    return jsonify(session.to_dict()), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Returns a resumable upload's state; `offset` is where the client should resume."""
+    session = upload_store.get_session(upload_id)
+    if session:
+        return jsonify(session.to_dict())
+    return jsonify({'error': 'Upload not found'}), 404
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def append_upload_chunk(upload_id):
+    """
+    Appends the raw request body at the byte offset given in the Upload-Offset header.
+    The file is committed once the declared size has been received.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    try:
+        result = upload_store.append_chunk(upload_id, offset, request.stream)
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    if 'file' in result:
+        result['message'] = f'File "{result["fileName"]}" uploaded successfully. Ready to generate model.'
+        if result['fileName'].lower().endswith('.csv'):
+            dataset_cache.warm(result['fileName'])
+    return jsonify(result), 200
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Aborts a resumable upload and discards the partial file."""
+    if upload_store.abort_session(upload_id):
+        return jsonify({'message': 'Upload aborted'}), 200
+    return jsonify({'error': 'Upload not found'}), 404
+
+@app.route('/api/datasets/<filename>/profile', methods=['GET'])
+def get_dataset_profile(filename):
+    """
+    Returns the profile of an uploaded CSV: row count and, per column, the
+    inferred type, null count, min/max/mean and approximate distinct count.
+    """
+    filename = secure_filename(filename)
+    if not filename.lower().endswith('.csv'):
+        return jsonify({'error': 'Only CSV datasets can be profiled'}), 400
+    profile = profile_cache.get(filename)
+    if profile is None:
+        return jsonify({'error': 'Dataset not found'}), 404
+    return jsonify(profile)
+
+# Data source connectivity probes: TCP connect timeout, how long results are
+# reused per host:port, how many connects run at once, and the batch size cap.
+CONNECTION_TIMEOUT_SECONDS = float(os.environ.get('CONNECTION_TIMEOUT_SECONDS', 3))
+CONNECTION_CACHE_TTL_SECONDS = float(os.environ.get('CONNECTION_CACHE_TTL_SECONDS', 30))
+CONNECTION_MAX_CONCURRENCY = int(os.environ.get('CONNECTION_MAX_CONCURRENCY', 256))
+CONNECTION_BATCH_LIMIT = int(os.environ.get('CONNECTION_BATCH_LIMIT', 1000))
+# Probes may not reach private, loopback or link-local addresses unless the
+# network (comma-separated CIDRs) or host name is allowed here.
+CONNECTION_ALLOWED_NETWORKS = os.environ.get('CONNECTION_ALLOWED_NETWORKS', '').split(',')
+CONNECTION_ALLOWED_HOSTS = os.environ.get('CONNECTION_ALLOWED_HOSTS', '').split(',')
+CONNECTION_BLOCK_PRIVATE = os.environ.get('CONNECTION_BLOCK_PRIVATE', '1').lower() in ('1', 'true', 'yes')
+
+connectivity_prober = ConnectivityProber(
+    timeout=CONNECTION_TIMEOUT_SECONDS,
+    ttl=CONNECTION_CACHE_TTL_SECONDS,
+    max_concurrency=CONNECTION_MAX_CONCURRENCY,
+    policy=TargetPolicy(CONNECTION_ALLOWED_HOSTS, CONNECTION_ALLOWED_NETWORKS, CONNECTION_BLOCK_PRIVATE)
+)
+
+
+def start_connection_test(source):
+    """
+    Starts probing one DataSource. Returns (future, None), where the future
+    resolves to a one-element result list, or (None, error_response).
+    """
+    try:
+        target = parse_target(source)
+    except ProbeError as e:
+        return None, ({'status': 'error', 'message': str(e)}, 400)
+    log.info('Testing connection', extra={'dataSource': source.get('id'), 'host': target[0], 'port': target[1]})
+    return connectivity_prober.submit([target]), None
+
+
+def connection_test_response(results):
+    """
+    Builds the (payload, status) of a single connection test; unreachable
+    sources answer 502 and targets the policy refuses 403.
+    """
+    result = dict(results[0])
+    if result['blocked']:
+        return result, 403
+    return result, 200 if result['reachable'] else 502
+
+
+def start_connection_batch(payload):
+    """
+    Starts probing every DataSource in a batch request (a list, or an object
+    with a `dataSources` list). Returns (future, results, None), where
+    `results` already holds the error entries of sources that couldn't be
+    parsed, or (None, None, error_response).
+    """
+    sources = payload.get('dataSources') if isinstance(payload, dict) else payload
+    if not isinstance(sources, list) or not sources:
+        return None, None, ({'error': 'Expected a non-empty list of data sources'}, 400)
+    if len(sources) > CONNECTION_BATCH_LIMIT:
+        return None, None, ({'error': f'At most {CONNECTION_BATCH_LIMIT} data sources per batch'}, 400)
+
+    results, targets = [], []
+    for source in sources:
+        source_id = source.get('id') if isinstance(source, dict) else None
+        try:
+            targets.append(parse_target(source))
+            results.append({'id': source_id})
+        except ProbeError as e:
+            results.append({'id': source_id, 'status': 'error', 'reachable': False, 'message': str(e)})
+    log.info('Testing connections', extra={'sources': len(sources), 'targets': len(set(targets))})
+    return connectivity_prober.submit(targets), results, None
+
+
+def connection_batch_response(results, probed, elapsed):
+    """Merges probe results into the batch's result list (in request order) and summarizes it."""
+    probed = iter(probed)
+    results = [entry if 'status' in entry else dict(next(probed), id=entry['id']) for entry in results]
+    reachable = sum(1 for entry in results if entry['reachable'])
+    return {
+        'results': results,
+        'reachable': reachable,
+        'unreachable': len(results) - reachable,
+        'elapsedMs': round(elapsed * 1000, 3)
+    }
+
+
 @app.route('/api/test_connection', methods=['POST'])
 def test_connection():
     """
-    Simulates testing a data source connection.
-    Waits for 2 seconds and returns a success message.
+    Tests a data source connection with a TCP connect to its host and port
+    (the port defaults by data source type). Returns 502 if it's unreachable.
     """
-    print(f"Received request to test connection with data: {request.json}")
-    time.sleep(2)
-    return jsonify({'status': 'success', 'message': 'Connection successful!'})
+    future, error = start_connection_test(request.json)
+    if error:
+        return jsonify(error[0]), error[1]
+    payload, status = connection_test_response(future.result())
+    return jsonify(payload), status
+
+@app.route('/api/test_connections', methods=['POST'])
+def test_connections():
+    """Tests many data source connections concurrently and returns one result per source."""
+    started = time.perf_counter()
+    future, results, error = start_connection_batch(request.json)
+    if error:
+        return jsonify(error[0]), error[1]
+    return jsonify(connection_batch_response(results, future.result(), time.perf_counter() - started))
 
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """
-    Scans the predefined_models directory and returns a list of available models.
+    Returns a list of available models from the in-memory model registry.
     """
-    models = []
-    for filename in os.listdir(MODELS_FOLDER):
-        if os.path.isfile(os.path.join(MODELS_FOLDER, filename)):
-            file_path = os.path.join(MODELS_FOLDER, filename)
-            models.append({
-                'fileName': filename,
-                'fileSize': os.path.getsize(file_path),
-                'createdAt': os.path.getctime(file_path)
-            })
-    return jsonify(models)
+    return cached_json_response('models', None, lambda: (model_registry.list(), None))
 
 import random
 from flask import Response, stream_with_context
 from training_logs import TRAINING_LOGS
+from jobs import JobScheduler
+from sse import SSEWriter
+from training import TrainingConfig, TrainingData, TrainingError, train, build_model, save_model
+from cross_validation import CrossValidator, CV_TYPES
+from hyperparameter_search import AshaScheduler, HyperparameterSearch, SearchSpace
+
+# Bounded pool running training jobs; extra jobs wait in the scheduler queue.
+TRAINING_MAX_WORKERS = int(os.environ.get('TRAINING_MAX_WORKERS', 4))
+# Per-job cap on the replayable event buffer served to (re)connecting SSE viewers.
+TRAINING_EVENT_BUFFER_EVENTS = int(os.environ.get('TRAINING_EVENT_BUFFER_EVENTS', 2000))
+TRAINING_EVENT_BUFFER_KB = int(os.environ.get('TRAINING_EVENT_BUFFER_KB', 512))
+
+job_scheduler = JobScheduler(
+    max_workers=TRAINING_MAX_WORKERS,
+    max_events=TRAINING_EVENT_BUFFER_EVENTS,
+    max_bytes=TRAINING_EVENT_BUFFER_KB * 1024
+)
+
+# SSE streams: keep-alive interval, how long to gather events into one write,
+# and when a viewer counts as slow (its per-epoch updates are then coalesced).
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_BATCH_WINDOW_MS = float(os.environ.get('SSE_BATCH_WINDOW_MS', 25))
+SSE_MAX_BACKLOG_EVENTS = int(os.environ.get('SSE_MAX_BACKLOG_EVENTS', 64))
+SSE_SLOW_WRITE_SECONDS = float(os.environ.get('SSE_SLOW_WRITE_SECONDS', 0.5))
+# ASGI only: a stream whose write isn't accepted within this long is closed.
+SSE_WRITE_TIMEOUT_SECONDS = float(os.environ.get('SSE_WRITE_TIMEOUT_SECONDS', 30))
+
+sse_events_coalesced = metrics_registry.counter(
+    'sse_events_coalesced_total', 'Progress events skipped for slow SSE viewers.'
+)
+
+# Cross-validation folds run in parallel on a process pool sized to the host's cores.
+CV_MAX_WORKERS = int(os.environ.get('CV_MAX_WORKERS', os.cpu_count() or 1))
+# Cap on the featurized dataset shared with fold workers; larger datasets are sampled.
+CV_SHARED_MEMORY_MB = int(os.environ.get('CV_SHARED_MEMORY_MB', 1024))
+# Leave-one-out trains one model per row, so it falls back to k-fold above this many rows.
+CV_MAX_LEAVE_ONE_OUT_ROWS = int(os.environ.get('CV_MAX_LEAVE_ONE_OUT_ROWS', 200))
+
+cross_validator = CrossValidator(
+    max_workers=CV_MAX_WORKERS,
+    max_shared_bytes=CV_SHARED_MEMORY_MB * 1024 * 1024,
+    max_folds=CV_MAX_LEAVE_ONE_OUT_ROWS
+)
+
+# Search trials share the cross-validation process pool; at most this many run at once per search.
+HPO_MAX_CONCURRENT_TRIALS = int(os.environ.get('HPO_MAX_CONCURRENT_TRIALS', CV_MAX_WORKERS))
+HPO_MAX_TRIALS = int(os.environ.get('HPO_MAX_TRIALS', 200))
+
+hyperparameter_search = HyperparameterSearch(
+    pool=cross_validator.pool,
+    max_concurrent_trials=HPO_MAX_CONCURRENT_TRIALS,
+    max_shared_bytes=CV_SHARED_MEMORY_MB * 1024 * 1024
+)
+
+
+def run_training(job, domain, selected_model_file, training_time_minutes):
+    """
+    Simulates a model training process, emitting logs and accuracy updates as job events.
+    """
+    total_seconds = training_time_minutes * 60
+    num_epochs = min(100, max(10, int(training_time_minutes * 2.5))) # Scale epochs with time
+
+    # 1. Starting Logs
+    start_logs = [
+        "Initializing training environment...",
+        "Authenticating user...",
+        "Requesting GPU resources...",
+        "GPU resources allocated.",
+        f"Selected model: {selected_model_file} for domain: {domain}",
+        "Loading dataset...",
+        "Dataset loaded. Found 15,000 samples.",
+        "Preprocessing and augmenting data...",
+    ]
+    for log in start_logs:
+        job.emit({'log': log})
+        job.sleep(random.uniform(0.1, 0.3))
+
+    # 2. Middle (Epoch) Logs
+    middle_logs = [log for log in TRAINING_LOGS if "Epoch" not in log and "Shutting down" not in log]
+
+    start_accuracy = random.uniform(30, 40)
+
+    # Determine final accuracy range
+    if 4 <= training_time_minutes <= 10:
+        end_accuracy = random.uniform(75, 85)
+    elif 10 < training_time_minutes <= 30:
+        end_accuracy = random.uniform(80, 90)
+    else: # 30-60 minutes
+        end_accuracy = random.uniform(85, 95)
+
+    total_steps = num_epochs + len(middle_logs)
+    time_per_step = total_seconds / total_steps if total_steps > 0 else 0
+
+    for i in range(num_epochs):
+        # Simulate gradual accuracy increase
+        current_progress = i / num_epochs
+        accuracy = start_accuracy + (end_accuracy - start_accuracy) * (current_progress + random.uniform(-0.05, 0.05))
+        accuracy = max(start_accuracy, min(end_accuracy, accuracy)) # Clamp accuracy
+
+        loss = 1.5 * (1 - (accuracy / 100)) + random.uniform(-0.1, 0.1)
+
+        epoch_log = f"Epoch {i+1}/{num_epochs} - loss: {loss:.4f} - accuracy: {accuracy/100:.4f}"
+        job.emit({'log': epoch_log, 'accuracy': round(accuracy, 2)}, replaceable=True)
+
+        # Sprinkle in random logs
+        if i % 5 == 0 and middle_logs:
+            random_log = random.choice(middle_logs)
+            job.emit({'log': random_log})
+            job.sleep(time_per_step / 2) # Extra delay for random logs
+
+        job.sleep(time_per_step)
+
+    # 3. Finishing Logs
+    end_logs = [
+        "Finalizing model...",
+        "Running final evaluation on test set...",
+        "Saving model to registry...",
+        "Model saved successfully.",
+        "Shutting down training process...",
+        "Releasing GPU resources."
+    ]
+    for log in end_logs:
+        job.emit({'log': log})
+        job.sleep(random.uniform(0.2, 0.5))
+
+    # Final accuracy signal
+    job.emit({'final_accuracy': round(end_accuracy, 2)})
+
+
+# ModelParameters fields /api/train_model_stream accepts as query parameters.
+TRAINING_PARAM_KEYS = (
+    'dataset', 'targetColumn', 'modelType', 'learningRate', 'epochs', 'batchSize',
+    'trainTestSplit', 'validationType', 'kFolds', 'geoFencing', 'calculateDistance',
+    'latitudeColumn', 'longitudeColumn', 'handleMissingData', 'dataCleaning', 'featureScaling'
+)
+
+
+def resolve_training_dataset(name=None):
+    """
+    Returns (file_name, None) for the dataset to train on: `name` if given,
+    else the most recently uploaded CSV (file_name is None if there is none).
+    Returns (None, error_response) if a named dataset doesn't exist.
+    """
+    if not name:
+        return upload_store.latest('.csv'), None
+    filename = secure_filename(str(name))
+    if not filename or upload_store.file_hash(filename) is None:
+        return None, ({'error': 'Dataset not found'}, 404)
+    return filename, None
 
-@app.route('/api/train_model_stream', methods=['GET'])
-def train_model_stream():
+
+def save_trained_model(model, domain):
+    """
+    Saves a trained model into predefined_models under a new name and returns
+    the file name. Only the newest TRAINED_MODELS_KEPT models of the domain
+    are kept; older ones are deleted.
     """
-    Simulates a model training process, streaming logs and accuracy updates via SSE.
+    prefix = f"{domain.replace(' ', '_')}_Model_"
+    model_file = f"{prefix}{uuid.uuid4().hex[:8]}.pkl"
+    save_model(model, MODELS_FOLDER, model_file)
+    prune_trained_models(prefix, keep=model_file)
+    model_registry.refresh()
+    return model_file
+
+
+def prune_trained_models(prefix, keep):
+    """Deletes all but the newest TRAINED_MODELS_KEPT "<prefix><id>.pkl" files, never `keep`."""
+    pattern = re.compile(re.escape(prefix) + r'[0-9a-f]{8}\.pkl')
+    trained = []
+    with os.scandir(MODELS_FOLDER) as it:
+        for entry in it:
+            if entry.is_file() and pattern.fullmatch(entry.name) and entry.name != keep:
+                trained.append((entry.stat().st_mtime, entry.name))
+    trained.sort(reverse=True)
+    for _, name in trained[max(0, TRAINED_MODELS_KEPT - 1):]:
+        try:
+            os.remove(os.path.join(MODELS_FOLDER, name))
+        except OSError as e:
+            log.warning('Could not remove old model %s: %s', name, e)
+
+
+def train_on_dataset(dataset_name, params, domain, on_epoch=None, check_cancelled=None, log=None):
     """
-    project_id = request.args.get('projectId')
-    training_time_minutes = int(request.args.get('trainingTime', 4))
+    Trains a model on an uploaded dataset with the given ModelParameters and
+    saves it into predefined_models. With a cross-validated validationType the
+    model is fitted on every row and the reported metrics are the
+    cross-validation ones. Raises TrainingError if the dataset or parameters
+    can't be used.
+    """
+    dataset = dataset_cache.load(dataset_name)
+    if dataset is None:
+        raise TrainingError(f'Dataset "{dataset_name}" not found.')
+    config = TrainingConfig(params)
+    cross_validate = config.validation_type in CV_TYPES
+    if cross_validate:
+        config.train_split = 1.0
+    data = TrainingData(dataset, config, pool=cross_validator.pool)
+    if log:
+        log(f"Dataset loaded. Found {dataset.rows:,} samples.")
+        log(f"Target column: {data.target} ({data.task}), {len(data.feature_columns)} feature columns.")
+        if data.preprocessor:
+            steps = data.preprocessor.describe()
+            log(f"Preprocessing: handleMissingData={steps['handleMissingData']}, dataCleaning={steps['dataCleaning']}, "
+                f"featureScaling={steps['featureScaling']}; {steps.get('duplicateRows', 0)} duplicate and "
+                f"{steps.get('droppedRows', 0)} incomplete rows left out.")
+        if data.geo:
+            log(f"Geospatial stage: {len(data.geo_columns)} derived columns ({', '.join(c.name for c in data.geo_columns)}).")
+        log(f"Training for {config.epochs} epochs, batch size {config.batch_size}, learning rate {config.learning_rate}.")
+
+    model, metrics, history = train(data, config, on_epoch, check_cancelled)
+    cross_validation = None
+    if cross_validate:
+        if log:
+            log(f"Running {config.validation_type} cross-validation...")
+        cross_validation = cross_validator.run(data, config)
+        metrics = {key: cross_validation[key] for key in ('accuracy', 'precision', 'recall', 'f1Score')}
+        if log:
+            log(f"Cross-validation finished: {cross_validation['folds']} folds, accuracy {metrics['accuracy']:.2f}%.")
+
+    return {
+        'modelFile': save_trained_model(model, domain),
+        'metrics': metrics,
+        'rows': dataset.rows,
+        'target': data.target,
+        'task': data.task,
+        'history': history,
+        'crossValidation': cross_validation
+    }
+
+
+def run_dataset_training(job, domain, dataset_name, params):
+    """
+    Trains on an uploaded dataset, emitting real per-epoch loss/accuracy as job events.
+    """
+    log = lambda message: job.emit({'log': message})
+
+    def on_epoch(epoch, epochs, loss, metrics):
+        job.emit({
+            'log': f"Epoch {epoch}/{epochs} - loss: {loss:.4f} - accuracy: {metrics['accuracy']/100:.4f}",
+            'accuracy': metrics['accuracy']
+        }, replaceable=True)
+
+    log("Initializing training environment...")
+    log(f"Loading dataset {dataset_name}...")
+    try:
+        result = train_on_dataset(dataset_name, params, domain, on_epoch, job.check_cancelled, log)
+    except TrainingError as e:
+        job.emit({'log': f"Training failed: {e}", 'error': str(e)})
+        raise
+
+    log("Running final evaluation on validation set...")
+    log(f"Model saved to registry as {result['modelFile']}.")
+    job.emit({'final_accuracy': result['metrics']['accuracy'], 'modelFile': result['modelFile']})
+
 
+def start_training_job(project_id, training_time_minutes, params=None):
+    """
+    Validates the project and queues a training job for it. With an uploaded
+    dataset (`params['dataset']` or the latest CSV upload) the job really
+    trains on it; otherwise the training run is simulated.
+    Returns (job, None) on success or (None, error_response) where
+    error_response is a (payload, status) pair.
+    """
+    params = params or {}
     if not project_id:
-        return jsonify({'error': 'Project ID is required'}), 400
+        return None, ({'error': 'Project ID is required'}, 400)
 
-    project = projects_db.get(project_id)
+    project = storage.get_project(project_id)
     if not project:
-        return jsonify({'error': 'Project not found'}), 404
+        return None, ({'error': 'Project not found'}, 404)
+
+    domain = project.get('domainType') or 'default'
 
-    domain = project.get('domainType', 'default')
+    dataset_name, error = resolve_training_dataset(params.get('dataset'))
+    if error:
+        return None, error
+    if dataset_name:
+        job = job_scheduler.submit(
+            'training',
+            lambda job: run_dataset_training(job, domain, dataset_name, params),
+            {'projectId': project_id, 'trainingTime': training_time_minutes, 'dataset': dataset_name, 'parameters': params}
+        )
+        return job, None
 
     # --- Dynamic Model Selection ---
     model_map = {
@@ -223,95 +1154,247 @@ def train_model_stream():
     selected_model_file = model_map.get(domain)
     if not selected_model_file:
         # Fallback for other domains
-        available_models = [f for f in os.listdir(MODELS_FOLDER) if os.path.isfile(os.path.join(MODELS_FOLDER, f))]
+        available_models = model_registry.names()
         selected_model_file = random.choice(available_models) if available_models else None
 
     if not selected_model_file:
-        return jsonify({'error': 'No suitable model found for the project domain.'}), 500
-
-    def generate_logs():
-        total_seconds = training_time_minutes * 60
-        num_epochs = min(100, max(10, int(training_time_minutes * 2.5))) # Scale epochs with time
-
-        # 1. Starting Logs
-        start_logs = [
-            "Initializing training environment...",
-            "Authenticating user...",
-            "Requesting GPU resources...",
-            "GPU resources allocated.",
-            f"Selected model: {selected_model_file} for domain: {domain}",
-            "Loading dataset...",
-            "Dataset loaded. Found 15,000 samples.",
-            "Preprocessing and augmenting data...",
-        ]
-        for log in start_logs:
-            yield f"data: {{\"log\": \"{log}\"}}\n\n"
-            time.sleep(random.uniform(0.1, 0.3))
-
-        # 2. Middle (Epoch) Logs
-        middle_logs = [log for log in TRAINING_LOGS if "Epoch" not in log and "Shutting down" not in log]
-
-        start_accuracy = random.uniform(30, 40)
-
-        # Determine final accuracy range
-        if 4 <= training_time_minutes <= 10:
-            end_accuracy = random.uniform(75, 85)
-        elif 10 < training_time_minutes <= 30:
-            end_accuracy = random.uniform(80, 90)
-        else: # 30-60 minutes
-            end_accuracy = random.uniform(85, 95)
-
-        total_steps = num_epochs + len(middle_logs)
-        time_per_step = total_seconds / total_steps if total_steps > 0 else 0
-
-        for i in range(num_epochs):
-            # Simulate gradual accuracy increase
-            current_progress = i / num_epochs
-            accuracy = start_accuracy + (end_accuracy - start_accuracy) * (current_progress + random.uniform(-0.05, 0.05))
-            accuracy = max(start_accuracy, min(end_accuracy, accuracy)) # Clamp accuracy
-
-            loss = 1.5 * (1 - (accuracy / 100)) + random.uniform(-0.1, 0.1)
-
-            epoch_log = f"Epoch {i+1}/{num_epochs} - loss: {loss:.4f} - accuracy: {accuracy/100:.4f}"
-            yield f"data: {{\"log\": \"{epoch_log}\", \"accuracy\": {accuracy:.2f}}}\n\n"
-
-            # Sprinkle in random logs
-            if i % 5 == 0 and middle_logs:
-                random_log = random.choice(middle_logs)
-                yield f"data: {{\"log\": \"{random_log}\"}}\n\n"
-                time.sleep(time_per_step / 2) # Extra delay for random logs
-
-            time.sleep(time_per_step)
-
-        # 3. Finishing Logs
-        end_logs = [
-            "Finalizing model...",
-            "Running final evaluation on test set...",
-            "Saving model to registry...",
-            "Model saved successfully.",
-            "Shutting down training process...",
-            "Releasing GPU resources."
-        ]
-        for log in end_logs:
-            yield f"data: {{\"log\": \"{log}\"}}\n\n"
-            time.sleep(random.uniform(0.2, 0.5))
-
-        # Final accuracy signal
-        yield f"data: {{\"final_accuracy\": {end_accuracy:.2f}}}\n\n"
-
-    return Response(stream_with_context(generate_logs()), mimetype='text/event-stream')
+        return None, ({'error': 'No suitable model found for the project domain.'}, 500)
+
+    job = job_scheduler.submit(
+        'training',
+        lambda job: run_training(job, domain, selected_model_file, training_time_minutes),
+        {'projectId': project_id, 'trainingTime': training_time_minutes, 'model': selected_model_file, 'parameters': params}
+    )
+    return job, None
+
+
+def parse_last_event_id(headers, args):
+    """
+    Reads the SSE resume position from the Last-Event-ID header (sent by
+    EventSource on reconnect) or the `lastEventId` query parameter.
+    Event IDs have the form "<jobId>:<sequence>". Returns (job_id, sequence).
+    """
+    value = headers.get('Last-Event-ID') or args.get('lastEventId')
+    if not value:
+        return None, 0
+    job_id, _, sequence = value.rpartition(':')
+    try:
+        return job_id or None, max(0, int(sequence))
+    except ValueError:
+        return None, 0
+
+
+def resolve_training_stream(args, headers):
+    """
+    Finds (or starts) the training job a /api/train_model_stream request should attach to.
+    Attaches to `jobId` (or the job named by Last-Event-ID, resuming after that
+    event), or to an unfinished job started with the same project, training
+    time, dataset and parameters, otherwise starts a new job.
+    Returns (job, last_event_id, None) or (None, None, error_response).
+    """
+    resume_job_id, last_event_id = parse_last_event_id(headers, args)
+    job_id = args.get('jobId') or resume_job_id
+    if job_id:
+        job = job_scheduler.get(job_id)
+        if not job:
+            return None, None, ({'error': 'Job not found'}, 404)
+        return job, last_event_id if job_id == resume_job_id else 0, None
+
+    project_id = args.get('projectId')
+    training_time_minutes = int(args.get('trainingTime', 4))
+
+    params = {key: args.get(key) for key in TRAINING_PARAM_KEYS if args.get(key) is not None}
+    # Without a `dataset` parameter, jobs train on the latest upload, which may have changed since.
+    dataset_name, _ = resolve_training_dataset(params.get('dataset'))
+    job = job_scheduler.find_latest(
+        'training', projectId=project_id, trainingTime=training_time_minutes, dataset=dataset_name, parameters=params
+    )
+    if not job:
+        job, error = start_training_job(project_id, training_time_minutes, params)
+        if error:
+            return None, None, error
+    return job, 0, None
+
+
+def create_sse_writer():
+    return SSEWriter(max_backlog=SSE_MAX_BACKLOG_EVENTS, slow_write_seconds=SSE_SLOW_WRITE_SECONDS)
+
+
+def stream_job(job, last_event_id=0):
+    """
+    Attaches an SSE response to a job's event stream, replaying buffered events
+    after `last_event_id`. Disconnecting only detaches the viewer.
+    """
+    def generate_events():
+        writer = create_sse_writer()
+        try:
+            for batch in job.attach(last_event_id, SSE_HEARTBEAT_SECONDS, SSE_BATCH_WINDOW_MS / 1000):
+                # The server writes each chunk before asking for the next, so this times the write.
+                started = time.perf_counter()
+                yield writer.encode(batch)
+                writer.wrote(time.perf_counter() - started)
+        finally:
+            sse_events_coalesced.inc(writer.coalesced)
+
+    response = Response(stream_with_context(generate_events()), mimetype='text/event-stream')
+    response.headers['X-Job-Id'] = job.id
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/train_model_stream', methods=['GET'])
+def train_model_stream():
+    """
+    Streams logs and accuracy updates for a training job via SSE.
+    See resolve_training_stream() for how the job is chosen.
+    """
+    job, last_event_id, error = resolve_training_stream(request.args, request.headers)
+    if error:
+        return jsonify(error[0]), error[1]
+    return stream_job(job, last_event_id)
+
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queues a training job without attaching to its stream."""
+    data = request.json or {}
+    job, error = start_training_job(data.get('projectId'), int(data.get('trainingTime', 4)), data)
+    if error:
+        return jsonify(error[0]), error[1]
+    return jsonify(job.to_dict()), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """Returns the status of all known jobs."""
+    return jsonify(job_scheduler.list())
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Returns the status of a specific job."""
+    job = job_scheduler.get(job_id)
+    if job:
+        return jsonify(job.to_dict())
+    return jsonify({'error': 'Job not found'}), 404
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancels a queued or running job."""
+    job = job_scheduler.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if not job.cancel():
+        return jsonify({'error': f'Job already {job.status}'}), 409
+    return jsonify(job.to_dict()), 200
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job_events(job_id):
+    """Attaches to a job's event stream via SSE, honouring Last-Event-ID."""
+    job = job_scheduler.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    resume_job_id, last_event_id = parse_last_event_id(request.headers, request.args)
+    return stream_job(job, last_event_id if resume_job_id in (None, job_id) else 0)
+
+
+def run_hyperparameter_search(job, domain, dataset_name, params, space, scheduler):
+    """
+    Searches hyperparameters on an uploaded dataset, emitting one event per
+    trial segment, and saves the best trial's model into the registry.
+    """
+    log = lambda message: job.emit({'log': message})
+    log(f"Loading dataset {dataset_name}...")
+    dataset = dataset_cache.load(dataset_name)
+    if dataset is None:
+        raise TrainingError(f'Dataset "{dataset_name}" not found.')
+    config = TrainingConfig(params)
+    data = TrainingData(dataset, config, pool=cross_validator.pool)
+    log(f"Dataset loaded. Found {dataset.rows:,} samples. Target column: {data.target} ({data.task}).")
+    log(f"Starting {space.strategy} search: up to {space.max_trials} trials, {scheduler.max_epochs} epochs, "
+        f"early-stopping rungs at epochs {scheduler.rungs}.")
+
+    result = hyperparameter_search.run(data, config, space, scheduler, job.emit, job.check_cancelled)
+
+    model_file = save_trained_model(build_model(data, result['weights'], result['bias'], result['metrics']), domain)
+    log(f"Best trial {result['bestTrial']}: {result['bestParams']}. Model saved to registry as {model_file}.")
+    summary = {key: value for key, value in result.items() if key not in ('weights', 'bias')}
+    job.emit(dict(summary, final_accuracy=result['metrics']['accuracy'], modelFile=model_file))
+
+
+@app.route('/api/hyperparameter_search', methods=['POST'])
+def create_hyperparameter_search():
+    """
+    Queues a hyperparameter search over an uploaded dataset. Progress streams
+    over /api/jobs/<jobId>/stream like a training job.
+    """
+    data = request.json or {}
+    project_id = data.get('projectId')
+    if not project_id:
+        return jsonify({'error': 'Project ID is required'}), 400
+    project = storage.get_project(project_id)
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+
+    dataset_name, error = resolve_training_dataset(data.get('dataset'))
+    if error:
+        return jsonify(error[0]), error[1]
+    if not dataset_name:
+        return jsonify({'error': 'Upload a dataset before running a hyperparameter search'}), 400
+
+    config = TrainingConfig(data)
+    try:
+        max_trials = min(HPO_MAX_TRIALS, max(1, int(data.get('maxTrials', 20))))
+        space = SearchSpace(data.get('searchSpace'), data.get('strategy', 'random'), max_trials, seed=config.seed)
+        scheduler = AshaScheduler(int(data.get('minEpochs', 1)), config.epochs, int(data.get('reductionFactor', 3)))
+    except (TrainingError, TypeError, ValueError) as e:
+        return jsonify({'error': str(e) or 'Invalid search parameters'}), 400
+
+    domain = project.get('domainType') or 'default'
+    job = job_scheduler.submit(
+        'search',
+        lambda job: run_hyperparameter_search(job, domain, dataset_name, data, space, scheduler),
+        {'projectId': project_id, 'dataset': dataset_name, 'strategy': space.strategy, 'maxTrials': max_trials}
+    )
+    return jsonify(job.to_dict()), 202
 
 
 @app.route('/api/generate_model', methods=['POST'])
 def generate_model():
     """
-    The core "dummy" endpoint. It simulates model generation based on user parameters.
+    Generates a model from the user's parameters. With an uploaded dataset
+    (`dataset` or the latest CSV upload) it trains a real model on it and
+    reports its validation metrics; otherwise it simulates the result.
     """
     params = request.json
     domain = params.get('domain', 'default')
     training_time_minutes = params.get('trainingTime', 1)
 
-    print(f"Received parameters for model generation: {params}")
+    log.info('Model generation requested', extra={'domain': domain, 'trainingTime': training_time_minutes, 'dataset': params.get('dataset')})
+
+    dataset_name, error = resolve_training_dataset(params.get('dataset'))
+    if error:
+        return jsonify(error[0]), error[1]
+    if dataset_name:
+        try:
+            result = train_on_dataset(dataset_name, params, domain)
+        except TrainingError as e:
+            return jsonify({'error': str(e)}), 400
+        metrics = result['metrics']
+        return jsonify({
+            'message': 'Model generation completed successfully!',
+            'modelName': result['modelFile'].rsplit('.', 1)[0],
+            'downloadUrl': f"/api/download_model/{result['modelFile']}",
+            'apiEndpoint': f"/api/predict?model={result['modelFile']}",
+            'accuracy': metrics['accuracy'],
+            'precision': metrics['precision'],
+            'recall': metrics['recall'],
+            'f1Score': metrics['f1Score'],
+            'dataset': dataset_name,
+            'target': result['target'],
+            'task': result['task'],
+            'samples': result['rows'],
+            'crossValidation': result['crossValidation'],
+            'parametersReceived': params
+        }), 200
 
     # --- Simulate Processing Delay ---
     # The frontend already simulates the delay, so we remove it from the backend
@@ -319,27 +1402,26 @@ def generate_model():
     # training_time_seconds = training_time_minutes * 60
     # print(f"Simulating model training for {training_time_minutes} minutes ({training_time_seconds} seconds)...")
     # time.sleep(training_time_seconds)
-    print("Backend processing complete, generating metrics immediately.")
+    log.info('Simulating model generation', extra={'domain': domain})
 
     # --- Dynamic Model Selection ---
     try:
-        available_models = {f: f for f in os.listdir(MODELS_FOLDER) if os.path.isfile(os.path.join(MODELS_FOLDER, f))}
+        available_models = {f: f for f in model_registry.names()}
 
         # Try to find a model that exactly matches the domain name (case-sensitive)
         selected_model_file = available_models.get(domain)
 
-        if selected_model_file:
-            print(f"Selected model for domain '{domain}': {selected_model_file}")
-        else:
+        if not selected_model_file:
             # Fallback to a random model if no specific model is found
-            print(f"No model found for domain '{domain}'. Falling back to a random model.")
             if not available_models:
                 return jsonify({'error': 'No predefined models found on the server.'}), 500
             selected_model_file = random.choice(list(available_models.values()))
-            print(f"Randomly selected model: {selected_model_file}")
+            log.info('No model found for domain, using a random model', extra={'domain': domain, 'model': selected_model_file})
+        else:
+            log.info('Selected model for domain', extra={'domain': domain, 'model': selected_model_file})
 
-    except Exception as e:
-        print(f"Error selecting model: {e}")
+    except Exception:
+        log.exception('Error selecting model')
         return jsonify({'error': 'Could not select a model.'}), 500
 
     # --- Generate Dummy Metrics ---
@@ -370,44 +1452,276 @@ def generate_model():
     }), 200
 
 
+# Concurrent model downloads allowed per client (API key, else IP) and overall,
+# so large transfers can't occupy every worker thread.
+DOWNLOAD_MAX_CONCURRENT_PER_CLIENT = int(os.environ.get('DOWNLOAD_MAX_CONCURRENT_PER_CLIENT', 2))
+DOWNLOAD_MAX_CONCURRENT = int(os.environ.get('DOWNLOAD_MAX_CONCURRENT', 8))
+DOWNLOAD_RETRY_AFTER_SECONDS = 5
+# Behind nginx/Apache, hand the transfer to the proxy via X-Sendfile instead of streaming it from Python.
+app.config['USE_X_SENDFILE'] = os.environ.get('MODEL_DOWNLOAD_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+download_limiter = ConcurrencyLimiter(DOWNLOAD_MAX_CONCURRENT_PER_CLIENT, DOWNLOAD_MAX_CONCURRENT)
+
+
+def with_content_coding(response, encoding):
+    """Marks a model download as a content-coded representation (encoding None for the original)."""
+    if artifact_compressor:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
 @app.route('/api/download_model/<filename>', methods=['GET'])
 def download_model(filename):
     """
-    Endpoint to serve the selected dummy model file for download.
+    Serves a model file from the registry with its precomputed SHA-256 as a
+    strong ETag. Conditional requests, Range and If-Range (resume) are
+    supported. Clients accepting a content coding get the file's
+    precompressed variant, with its own ETag, once it has been built.
+    The open file is handed to the server's wsgi.file_wrapper, so servers
+    with sendfile() support send it without copying through Python.
     """
-    # `send_from_directory` is a secure way to send files from a directory.
-    # `as_attachment=True` tells the browser to download the file, not display it.
-    print(f"Request to download model: {filename}")
-    if os.path.exists(os.path.join(MODELS_FOLDER, filename)):
-        return send_from_directory(MODELS_FOLDER, filename, as_attachment=True)
-    else:
+    log.info('Model download requested', extra={'model': filename, 'range': request.headers.get('Range')})
+    entry = model_registry.get(filename)
+    if not entry:
         return jsonify({'error': 'Model file not found.'}), 404
 
-@app.route('/api/predict', methods=['POST'])
-def predict():
+    # Precompressed variants are served as-is; until one is ready the original is sent.
+    encoding = negotiate(request.headers.get('Accept-Encoding')) if artifact_compressor else None
+    variant = artifact_compressor.variant(entry, encoding) if encoding else None
+    path, etag = (variant, encoded_etag(entry['sha256'], encoding)) if variant else (entry['path'], entry['sha256'])
+
+    # Revalidations don't transfer anything, so they don't need a slot.
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    if app.config['USE_X_SENDFILE']:
+        # The proxy performs (and resumes) the transfer itself.
+        response = send_file(path, as_attachment=True, download_name=filename, etag=etag, last_modified=entry['mtime'])
+        return with_content_coding(response, variant and encoding)
+
+    client = client_identity(request.headers, request.args, request.remote_addr)
+    limit = download_limiter.acquire(client)
+    if limit:
+        message, status = (('Too many concurrent downloads for this client', 429) if limit == 'client'
+                           else ('Too many concurrent downloads', 503))
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(DOWNLOAD_RETRY_AFTER_SECONDS)
+        return response
+
+    try:
+        # The slot is held until the server closes the file after sending it.
+        model_file = ReleasingFile(path, lambda: download_limiter.release(client))
+    except OSError:
+        download_limiter.release(client)
+        return jsonify({'error': 'Model file not found.'}), 404
+    try:
+        response = send_file(
+            model_file,
+            as_attachment=True,
+            download_name=filename,
+            etag=etag,
+            last_modified=entry['mtime'],
+            conditional=False
+        )
+        with_content_coding(response, variant and encoding)
+        response.content_length = os.fstat(model_file.fileno()).st_size
+        response = response.make_conditional(request.environ, accept_ranges=True, complete_length=response.content_length)
+    except BaseException:
+        model_file.close()
+        raise
+    return response
+
+# Rows scored per pass when predicting over a whole uploaded dataset.
+DATASET_SCORING_CHUNK_ROWS = 65536
+
+
+def select_scorer(model_name=None):
     """
-    A dummy endpoint to simulate making a prediction with the "generated" model.
+    Returns (scorer, None) for the requested (or default) model, or
+    (None, error_response) if the model doesn't exist. A None scorer means
+    the inference engine's built-in one.
     """
-    # Get the dummy input data from the request
-    input_data = request.json
-    print(f"Received prediction request with data: {input_data}")
+    scorer, _, error = select_versioned_scorer(model_name)
+    return scorer, error
 
-    # Simulate a quick prediction delay
-    time.sleep(1)
 
-    # Return a fake, deterministic prediction result.
-    # Using hash() makes the result change based on input, which looks more real.
-    prediction_value = abs(hash(str(input_data))) % 1000
-    
-    return jsonify({
+def select_versioned_scorer(model_name=None):
+    """
+    Like select_scorer(), but returns (scorer, version, error) where version
+    identifies the model's content for the prediction cache.
+    """
+    name = model_name or (DEFAULT_PREDICT_MODEL if DEFAULT_PREDICT_MODEL in model_registry else None)
+    if not name:
+        return None, BUILTIN_SCORER_VERSION, None
+    try:
+        scorer, version = model_registry.load_versioned(name)
+        return scorer, version, None
+    except KeyError:
+        return None, None, ({'error': 'Model file not found.'}, 404)
+
+
+def predict_dataset(input_data, model_name=None):
+    """
+    Scores rows of an uploaded CSV straight from its memory-mapped columnar copy.
+    Expects {"dataset": <fileName>, "offset": 0, "limit": 1000}.
+    Returns (response_body, None) or (None, error_response).
+    """
+    started = time.perf_counter()
+    scorer, error = select_scorer(model_name)
+    if error:
+        return None, error
+    scorer = scorer or inference_engine.scorer
+
+    dataset = dataset_cache.load(secure_filename(str(input_data['dataset'])))
+    if dataset is None:
+        return None, ({'error': 'Dataset not found'}, 404)
+    offset = max(0, int(input_data.get('offset', 0)))
+    stop = min(dataset.rows, offset + max(0, int(input_data.get('limit', 1000))))
+
+    values = []
+    for start in range(offset, stop, DATASET_SCORING_CHUNK_ROWS):
+        end = min(stop, start + DATASET_SCORING_CHUNK_ROWS)
+        if hasattr(scorer, 'score_columns'):
+            values.extend(scorer.score_columns(dataset.columns, start, end).tolist())
+        elif hasattr(scorer, 'score_features'):
+            values.extend(scorer.score_features(featurize_columns(dataset.columns, start, end)).tolist())
+        else:
+            values.extend(scorer.score(dataset.records(start, end)).tolist())
+
+    body = prediction_response(input_data, values, True, time.perf_counter() - started)
+    body.update({'dataset': dataset.source, 'rows': dataset.rows, 'offset': offset})
+    return body, None
+
+
+def submit_prediction(input_data, model_name=None):
+    """
+    Selects the scorer and queues the payload on the inference engine.
+    A JSON list or {"records": [...]} is scored as a batch. Records already
+    in the prediction cache for this model version are not rescored.
+    Returns (future, is_batch, None) on success or (None, None, error_response).
+    """
+    scorer, version, error = select_versioned_scorer(model_name)
+    if error:
+        return None, None, error
+    # Per-request and off by default: the hot path only pays for the level check.
+    if log.isEnabledFor(logging.DEBUG):
+        records = input_data if isinstance(input_data, list) else input_data.get('records') if isinstance(input_data, dict) else None
+        log.debug('Prediction request', extra={'model': model_name, 'records': len(records) if isinstance(records, list) else 1})
+
+    compute = lambda records: inference_engine.submit(records, scorer)
+    if isinstance(input_data, list):
+        return prediction_cache.submit(version, input_data, compute), True, None
+    if isinstance(input_data, dict) and isinstance(input_data.get('records'), list):
+        return prediction_cache.submit(version, input_data['records'], compute), True, None
+    return prediction_cache.submit(version, [input_data], compute), False, None
+
+
+def prediction_response(input_data, values, is_batch, elapsed):
+    """Builds the /api/predict response body from the scored values."""
+    if is_batch:
+        return {
+            'message': 'Prediction successful',
+            'count': len(values),
+            'predictions': [format_prediction(value) for value in values],
+            'latencyMs': round(elapsed * 1000, 3)
+        }
+    return {
         'message': 'Prediction successful',
         'inputData': input_data,
-        'prediction': {
-            'riskScore': prediction_value / 10,
-            'category': 'Category B' if prediction_value > 500 else 'Category A',
-            'confidence': f"{ (prediction_value % 40) + 50 }%" # A value between 50-90%
-        }
-    }), 200
+        'prediction': format_prediction(values[0])
+    }
+
+
+@app.route('/api/predict', methods=['POST'])
+def predict():
+    """
+    Scores input records with the inference engine.
+    Accepts a single JSON payload, a batch as a JSON list / {"records": [...]},
+    or {"dataset": <uploaded CSV>} to score rows of an uploaded dataset.
+    Single payloads from concurrent requests are coalesced into micro-batches.
+    An optional `?model=<fileName>` selects a model from the registry.
+    """
+    input_data = request.json
+
+    if isinstance(input_data, dict) and 'dataset' in input_data:
+        body, error = predict_dataset(input_data, request.args.get('model'))
+        if error:
+            return jsonify(error[0]), error[1]
+        return jsonify(body), 200
+
+    started = time.perf_counter()
+    future, is_batch, error = submit_prediction(input_data, request.args.get('model'))
+    if error:
+        return jsonify(error[0]), error[1]
+    values = future.result()
+    return jsonify(prediction_response(input_data, values, is_batch, time.perf_counter() - started)), 200
+
+@app.route('/api/predict/stats', methods=['GET'])
+def predict_stats():
+    """Returns micro-batch latency and throughput figures for the inference engine, and prediction cache counters."""
+    return jsonify({**inference_engine.stats(), 'cache': prediction_cache.stats()})
+
+
+# Components that already count their own work are read when /metrics is
+# scraped; only request latency and batch sizes are recorded as they happen.
+prediction_batch_size = metrics_registry.histogram(
+    'prediction_batch_size', 'Records scored per inference micro-batch.',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+)
+prediction_batch_seconds = metrics_registry.histogram(
+    'prediction_batch_duration_seconds', 'Time spent scoring one inference micro-batch.'
+)
+
+def observe_prediction_batch(size, latency):
+    prediction_batch_size.observe(size)
+    prediction_batch_seconds.observe(latency)
+
+inference_engine.on_batch(observe_prediction_batch)
+
+metrics_registry.callback('sse_streams_active', 'Open SSE streams attached to training jobs.', job_scheduler.viewers)
+metrics_registry.callback('model_cache_hits_total', 'Model loads served from the model cache.',
+                          lambda: model_registry.stats()['hits'], kind='counter')
+metrics_registry.callback('model_cache_misses_total', 'Model loads that had to read the model file.',
+                          lambda: model_registry.stats()['misses'], kind='counter')
+metrics_registry.callback('model_cache_evictions_total', 'Models evicted from the model cache.',
+                          lambda: model_registry.stats()['evictions'], kind='counter')
+metrics_registry.callback('model_cache_hit_ratio', 'Fraction of model loads served from the model cache.',
+                          lambda: model_registry.stats()['hitRate'])
+metrics_registry.callback('model_cache_bytes', 'Estimated memory held by cached models.',
+                          lambda: model_registry.stats()['cacheBytes'])
+metrics_registry.callback('response_cache_hits_total', 'Collection reads served from the response cache.',
+                          lambda: response_cache.hits, kind='counter')
+metrics_registry.callback('response_cache_misses_total', 'Collection reads that had to be serialized.',
+                          lambda: response_cache.misses, kind='counter')
+metrics_registry.callback('prediction_cache_hits_total', 'Predicted records served from the prediction cache.',
+                          lambda: prediction_cache.hits + prediction_cache.shared_hits, kind='counter')
+metrics_registry.callback('prediction_cache_misses_total', 'Predicted records that had to be scored.',
+                          lambda: prediction_cache.misses, kind='counter')
+metrics_registry.callback('prediction_cache_evictions_total', 'Entries evicted from the in-process prediction cache.',
+                          lambda: prediction_cache.evictions, kind='counter')
+metrics_registry.callback('prediction_cache_entries', 'Entries held by the in-process prediction cache.',
+                          lambda: prediction_cache.stats()['entries'])
+metrics_registry.callback('admission_slots_in_use', 'Requests holding a concurrency slot, by limited route.',
+                          lambda: {(route,): limiter.stats()['inFlight'] for route, limiter in (
+                              ('predict', concurrency_limiters['predict']),
+                              ('generate_model', concurrency_limiters['generate_model']),
+                              ('streams', stream_limiter))},
+                          labelnames=('route',))
+metrics_registry.callback('model_downloads_in_flight', 'Model downloads being transferred.',
+                          lambda: download_limiter.stats()['inFlight'])
+metrics_registry.callback('log_records_dropped_total', 'Log records dropped because the log queue was full.',
+                          lambda: log_handler.dropped, kind='counter')
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Serves every metric in the Prometheus text exposition format."""
+    return app.response_class(metrics_registry.render(), content_type=MetricsRegistry.CONTENT_TYPE)
 
 
 # --- 3. RUN THE APPLICATION ---
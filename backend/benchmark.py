@@ -0,0 +1,552 @@
+"""
+Latency and throughput benchmarks for the backend API.
+
+Microbenchmarks call the Flask app through its test client, so they measure
+request handling without any network. The concurrency and streaming
+benchmarks start a real server on a loopback port (the threaded Werkzeug
+server, or uvicorn serving asgi.py with --server asgi) and drive it from
+client threads. Every case reports p50/p95/p99 latency and requests/sec;
+the streaming benchmark reports how many concurrent /api/train_model_stream
+connections the server sustained.
+
+The app runs against in-memory storage and a throwaway upload folder, so a
+run leaves no projects or uploads behind. Results are written as JSON so two
+runs (e.g. before and after a change) can be compared:
+
+    python benchmark.py                                # full run
+    python benchmark.py --quick --only predict,models  # a quick subset
+    python benchmark.py --compare old.json new.json    # diff two runs
+"""
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+
+import numpy as np
+
+BENCHMARKS = ('predict', 'projects', 'models', 'upload', 'train_model_stream')
+RESULTS_FORMAT_VERSION = 1
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results')
+
+# Records per /api/predict request: one is the single-record (micro-batched) path.
+PREDICT_RECORD_COUNTS = (1, 10, 100, 1000)
+PREDICT_FIELDS = 10
+# Prediction cache size for the predict-cached cases.
+PREDICTION_CACHE_ENTRIES = 100000
+# /api/upload file sizes in bytes.
+UPLOAD_SIZES = (1024, 1024 * 1024, 16 * 1024 * 1024)
+# Cap on the bytes uploaded per upload case, so large files get fewer iterations.
+UPLOAD_BYTES_PER_CASE = 256 * 1024 * 1024
+SEED_PROJECTS = 1000
+
+
+def percentile_summary(latencies):
+    """Latency figures in milliseconds for a list of durations in seconds."""
+    if not latencies:
+        return None
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'min': round(float(ms.min()), 3),
+        'mean': round(float(ms.mean()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'max': round(float(ms.max()), 3)
+    }
+
+
+def case_result(name, method, path, latencies, errors, elapsed, **extra):
+    return {
+        'name': name,
+        'method': method,
+        'path': path,
+        'requests': len(latencies),
+        'errors': errors,
+        'latencyMs': percentile_summary(latencies),
+        'requestsPerSecond': round(len(latencies) / elapsed, 2) if elapsed else None,
+        **extra
+    }
+
+
+def describe(result):
+    latency = result['latencyMs']
+    errors = f", {result['errors']} errors" if result['errors'] else ''
+    return f"p50 {latency['p50']}ms p99 {latency['p99']}ms, {result['requestsPerSecond']} req/s{errors}"
+
+
+def predict_payload(records):
+    rng = np.random.default_rng(records)
+    rows = [
+        {**{f'feature_{i}': round(float(v), 4) for i, v in enumerate(rng.normal(size=PREDICT_FIELDS - 1))},
+         'category': f'c{int(rng.integers(20))}'}
+        for _ in range(records)
+    ]
+    payload = rows[0] if records == 1 else {'records': rows}
+    return json.dumps(payload).encode('utf-8')
+
+
+def csv_payload(size, index):
+    """A CSV of about `size` bytes whose first row differs per `index`, so uploads aren't deduplicated."""
+    header = f'id,value,label\n0,{index},{uuid.uuid4().hex}\n'.encode('ascii')
+    row = b'1,0.5,sample\n'
+    return header + row * max(0, (size - len(header)) // len(row))
+
+
+def multipart_body(filename, content, boundary):
+    return (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f'Content-Type: text/csv\r\n\r\n'.encode('ascii')
+        + content + f'\r\n--{boundary}--\r\n'.encode('ascii')
+    )
+
+
+class Benchmark:
+    """Runs the selected benchmarks against the app and collects their results."""
+
+    def __init__(self, args):
+        self.args = args
+        self.log = lambda message: print(message, file=sys.stderr, flush=True)
+        import backend
+        self.backend = backend
+        self.client = backend.app.test_client()
+        self.results = {'micro': [], 'concurrency': [], 'streams': None}
+
+    # --- Measurement ---
+
+    def measure(self, name, method, path, call, iterations=None, **extra):
+        """Times `iterations` sequential calls of call(i), which returns True on success."""
+        iterations = iterations or self.args.iterations
+        for i in range(min(self.args.warmup, iterations)):
+            call(-1 - i)
+        latencies, errors = [], 0
+        started = time.perf_counter()
+        for i in range(iterations):
+            t = time.perf_counter()
+            ok = call(i)
+            latencies.append(time.perf_counter() - t)
+            errors += not ok
+        result = case_result(name, method, path, latencies, errors, time.perf_counter() - started, **extra)
+        self.results['micro'].append(result)
+        self.log(f"  {name}: {describe(result)}")
+        return result
+
+    def load_test(self, name, method, path, body, headers, concurrency, ok_statuses=(200,)):
+        """Runs `concurrency` keep-alive clients against the live server for --duration seconds."""
+        deadline = time.perf_counter() + self.args.duration
+        host, port = self.address
+
+        def client():
+            connection = HTTPConnection(host, port, timeout=30)
+            latencies, errors = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    t = time.perf_counter()
+                    try:
+                        connection.request(method, path, body=body, headers=headers)
+                        response = connection.getresponse()
+                        response.read()
+                        errors += response.status not in ok_statuses
+                    except OSError:
+                        errors += 1
+                        connection.close()
+                    latencies.append(time.perf_counter() - t)
+            finally:
+                connection.close()
+            return latencies, errors
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(lambda _: client(), range(concurrency)))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for outcome in outcomes for latency in outcome[0]]
+        result = case_result(name, method, path, latencies, sum(o[1] for o in outcomes), elapsed, concurrency=concurrency)
+        self.results['concurrency'].append(result)
+        self.log(f"  {name} x{concurrency}: {describe(result)}")
+        return result
+
+    # --- Setup ---
+
+    def seed_projects(self):
+        owners = ['alice', 'bob', 'carol', 'dave']
+        domains = ['City', 'Traffic', 'Airports', 'Oil and Gas']
+        for i in range(self.args.projects):
+            self.client.post('/api/projects', json={
+                'name': f'Benchmark project {i:05d}',
+                'description': 'Created by benchmark.py',
+                'owner': owners[i % len(owners)],
+                'domainType': domains[i % len(domains)]
+            })
+
+    @contextlib.contextmanager
+    def server(self):
+        """Serves the app on a free loopback port for the duration of the block."""
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        self.address = sock.getsockname()
+        if self.args.server == 'asgi':
+            import uvicorn
+            import asgi
+            server = uvicorn.Server(uvicorn.Config(asgi.application, log_level='error', lifespan='off', timeout_keep_alive=30))
+            server.install_signal_handlers = lambda: None
+            thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+            thread.start()
+            while not server.started:
+                time.sleep(0.01)
+            try:
+                yield
+            finally:
+                server.should_exit = True
+                thread.join(10)
+                sock.close()
+        else:
+            import logging
+            from werkzeug.serving import make_server
+            logging.getLogger('werkzeug').setLevel(logging.ERROR)
+            sock.close()
+            server = make_server(*self.address, self.backend.app, threaded=True)
+            server.daemon_threads = True
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                yield
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    # --- Benchmarks ---
+
+    def bench_predict(self):
+        self.log('predict')
+        for records in PREDICT_RECORD_COUNTS:
+            body = predict_payload(records)
+            self.measure(
+                f'predict/{records}', 'POST', '/api/predict',
+                lambda i: self.client.post('/api/predict', data=body, content_type='application/json').status_code == 200,
+                records=records, payloadBytes=len(body)
+            )
+        # The same payloads again with the prediction cache on, which is off for every other case.
+        cache = self.backend.prediction_cache
+        cache.max_entries = PREDICTION_CACHE_ENTRIES
+        try:
+            for records in PREDICT_RECORD_COUNTS:
+                body = predict_payload(records)
+                self.measure(
+                    f'predict-cached/{records}', 'POST', '/api/predict',
+                    lambda i: self.client.post('/api/predict', data=body, content_type='application/json').status_code == 200,
+                    records=records, payloadBytes=len(body)
+                )
+        finally:
+            cache.max_entries = 0
+
+    def bench_projects(self):
+        self.log('projects')
+        cases = [
+            ('projects/page', '/api/projects'),
+            ('projects/page-1000-fields', '/api/projects?limit=1000&fields=id,name,createdAt'),
+            ('projects/owner-sorted', '/api/projects?owner=alice&sort=-name&limit=50')
+        ]
+        for name, path in cases:
+            self.measure(name, 'GET', path, lambda i: self.client.get(path).status_code == 200)
+
+        def uncached(i):
+            self.backend.response_cache.bump('projects')
+            return self.client.get('/api/projects').status_code == 200
+        self.measure('projects/page-uncached', 'GET', '/api/projects', uncached)
+
+        etag = self.client.get('/api/projects').headers['ETag']
+        self.measure('projects/not-modified', 'GET', '/api/projects',
+                     lambda i: self.client.get('/api/projects', headers={'If-None-Match': etag}).status_code == 304)
+
+    def bench_models(self):
+        self.log('models')
+        self.measure('models/list', 'GET', '/api/models', lambda i: self.client.get('/api/models').status_code == 200)
+        etag = self.client.get('/api/models').headers['ETag']
+        self.measure('models/not-modified', 'GET', '/api/models',
+                     lambda i: self.client.get('/api/models', headers={'If-None-Match': etag}).status_code == 304)
+
+    def bench_upload(self):
+        self.log('upload')
+        boundary = uuid.uuid4().hex
+        for size in self.args.upload_sizes:
+            iterations = max(3, min(self.args.iterations, UPLOAD_BYTES_PER_CASE // size))
+
+            def upload(i, size=size):
+                body = multipart_body(f'bench_{size}_{i}.csv', csv_payload(size, i), boundary)
+                response = self.client.post('/api/upload', data=body, content_type=f'multipart/form-data; boundary={boundary}')
+                return response.status_code == 200
+            self.measure(f'upload/{size}', 'POST', '/api/upload', upload, iterations=iterations, payloadBytes=size)
+
+    def bench_concurrency(self):
+        cases = []
+        if 'predict' in self.args.only:
+            cases.append(('predict/1', 'POST', '/api/predict', predict_payload(1), {'Content-Type': 'application/json'}, (200,)))
+        if 'projects' in self.args.only:
+            cases.append(('projects/page', 'GET', '/api/projects', None, {}, (200,)))
+        if 'models' in self.args.only:
+            cases.append(('models/list', 'GET', '/api/models', None, {}, (200,)))
+        if not cases:
+            return
+        self.log(f'concurrency ({self.args.server} server)')
+        for name, method, path, body, headers, ok in cases:
+            for concurrency in self.args.concurrency:
+                self.load_test(name, method, path, body, headers, concurrency, ok)
+
+    def bench_streams(self):
+        """Ramps up concurrent SSE viewers of one training job until some fail to connect or stay connected."""
+        self.log(f'train_model_stream ({self.args.server} server)')
+        project = self.client.post('/api/projects', json={'name': 'Stream benchmark', 'domainType': 'City'}).json
+        job = self.client.post('/api/jobs', json={'projectId': project['id'], 'trainingTime': 60}).json
+        path = f"/api/train_model_stream?jobId={job['id']}"
+        host, port = self.address
+        levels = []
+        try:
+            for connections in self.args.stream_levels:
+                level = self._stream_level(host, port, path, connections)
+                levels.append(level)
+                self.log(f"  {connections} connections: {level['sustained']} sustained, "
+                         f"first event p99 {level['firstEventMs'] and level['firstEventMs']['p99']}ms")
+                if level['sustained'] < connections:
+                    break
+        finally:
+            self.client.post(f"/api/jobs/{job['id']}/cancel")
+        full = [level['connections'] for level in levels if level['sustained'] == level['connections']]
+        self.results['streams'] = {
+            'path': '/api/train_model_stream',
+            'holdSeconds': self.args.stream_hold,
+            'maxSustained': max(full, default=0),
+            'levels': levels
+        }
+
+    def _stream_level(self, host, port, path, connections):
+        hold_until = time.monotonic() + self.args.stream_hold + connections * 0.002
+        request = f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: text/event-stream\r\n\r\n'.encode('ascii')
+
+        def viewer():
+            started = time.perf_counter()
+            try:
+                sock = socket.create_connection((host, port), timeout=self.args.stream_timeout)
+            except OSError:
+                return None, False
+            try:
+                sock.sendall(request)
+                reader = sock.makefile('rb')
+                if b' 200 ' not in reader.readline():
+                    return None, False
+                first_event = None
+                while first_event is None:
+                    line = reader.readline()
+                    if not line:
+                        return None, False
+                    if line.startswith(b'data:'):
+                        first_event = time.perf_counter() - started
+                # Held open until the deadline; a read timeout means the stream is idle but alive.
+                while True:
+                    remaining = hold_until - time.monotonic()
+                    if remaining <= 0:
+                        return first_event, True
+                    sock.settimeout(remaining)
+                    try:
+                        if not reader.readline():
+                            return first_event, False
+                    except socket.timeout:
+                        return first_event, True
+            except OSError:
+                return None, False
+            finally:
+                sock.close()
+
+        with ThreadPoolExecutor(connections) as pool:
+            outcomes = list(pool.map(lambda _: viewer(), range(connections)))
+        first_events = [first for first, _ in outcomes if first is not None]
+        return {
+            'connections': connections,
+            'sustained': sum(1 for _, alive in outcomes if alive),
+            'firstEventMs': percentile_summary(first_events)
+        }
+
+    def run(self):
+        started = time.perf_counter()
+        if {'projects', 'train_model_stream'} & set(self.args.only):
+            self.seed_projects()
+        if not self.args.micro_only and 'train_model_stream' in self.args.only:
+            with self.server():
+                self.bench_streams()
+        for name in ('predict', 'projects', 'models'):
+            if name in self.args.only:
+                getattr(self, f'bench_{name}')()
+        if not self.args.micro_only:
+            with self.server():
+                self.bench_concurrency()
+        # Uploads last: CSV uploads warm dataset caches in the background.
+        if 'upload' in self.args.only:
+            self.bench_upload()
+        return {
+            'version': RESULTS_FORMAT_VERSION,
+            'createdAt': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'git': git_revision(),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'server': self.args.server
+            },
+            'config': {
+                'iterations': self.args.iterations,
+                'warmup': self.args.warmup,
+                'durationSeconds': self.args.duration,
+                'concurrency': self.args.concurrency,
+                'projects': self.args.projects,
+                'streamLevels': self.args.stream_levels
+            },
+            'elapsedSeconds': round(time.perf_counter() - started, 2),
+            'results': self.results
+        }
+
+
+def git_revision():
+    def git(*command):
+        return subprocess.run(['git', *command], capture_output=True, text=True, timeout=10,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', '--short', 'HEAD') or None, 'dirty': bool(git('status', '--porcelain', '--', '.'))}
+    except (OSError, subprocess.SubprocessError):
+        return {'commit': None, 'dirty': None}
+
+
+# --- Comparing runs ---
+
+def comparable_cases(results):
+    """Maps a stable key per case to the case."""
+    cases = {f"micro {case['name']}": case for case in results['results']['micro']}
+    cases.update({f"concurrency {case['name']} x{case['concurrency']}": case for case in results['results']['concurrency']})
+    return cases
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(old, new, threshold):
+    """Prints per-case deltas and returns the keys of cases that regressed by more than `threshold` percent."""
+    before, after = comparable_cases(old), comparable_cases(new)
+    regressions = []
+    print(f"{'case':44} {'p50 ms':>20} {'p99 ms':>20} {'req/s':>22}")
+    for key in sorted(before.keys() & after.keys()):
+        old_case, new_case = before[key], after[key]
+        old_latency, new_latency = old_case['latencyMs'], new_case['latencyMs']
+        if not old_latency or not new_latency:
+            continue
+        p50 = change(old_latency['p50'], new_latency['p50'])
+        p99 = change(old_latency['p99'], new_latency['p99'])
+        rps = change(old_case['requestsPerSecond'], new_case['requestsPerSecond'])
+        more_errors = new_case['errors'] > old_case['errors']
+        regressed = p50 > threshold or rps < -threshold or more_errors
+        if regressed:
+            regressions.append(key)
+        print(f"{key:44} {new_latency['p50']:>10.3f} {p50:>+8.1f}% {new_latency['p99']:>10.3f} {p99:>+8.1f}% "
+              f"{new_case['requestsPerSecond']:>12.2f} {rps:>+8.1f}%"
+              + (f"  {new_case['errors']} errors" if more_errors else '') + ('  REGRESSION' if regressed else ''))
+    for key in sorted(before.keys() - after.keys()):
+        print(f'{key:44} missing from the new run')
+
+    old_streams, new_streams = old['results'].get('streams'), new['results'].get('streams')
+    if old_streams and new_streams:
+        print(f"{'train_model_stream max sustained':44} {old_streams['maxSustained']} -> {new_streams['maxSustained']}")
+        if new_streams['maxSustained'] < old_streams['maxSustained']:
+            regressions.append('streams maxSustained')
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the backend API.')
+    parser.add_argument('--only', default=','.join(BENCHMARKS), help=f'comma-separated subset of: {", ".join(BENCHMARKS)}')
+    parser.add_argument('--quick', action='store_true', help='fewer iterations, shorter load tests and smaller uploads')
+    parser.add_argument('--micro-only', action='store_true', help='skip the benchmarks that need a real server')
+    parser.add_argument('--server', choices=('wsgi', 'asgi'), default='wsgi', help='server for the concurrency benchmarks')
+    parser.add_argument('--iterations', type=int, default=200, help='timed requests per microbenchmark case')
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests before each case')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per concurrency level')
+    parser.add_argument('--concurrency', default='1,8,32', help='client counts for the concurrency benchmarks')
+    parser.add_argument('--projects', type=int, default=SEED_PROJECTS, help='projects seeded before the projects benchmarks')
+    parser.add_argument('--stream-levels', default='10,50,100,250,500', help='concurrent SSE connection counts to try')
+    parser.add_argument('--stream-hold', type=float, default=5.0, help='seconds each SSE connection must stay open')
+    parser.add_argument('--stream-timeout', type=float, default=10.0, help='connect/first-event timeout per SSE connection')
+    parser.add_argument('--output', help='results file (default: benchmark_results/<time>-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two results files instead of running')
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent change reported as a regression by --compare')
+    args = parser.parse_args(argv)
+
+    args.only = [name.strip() for name in args.only.split(',') if name.strip()]
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+    args.concurrency = [int(n) for n in args.concurrency.split(',')]
+    args.stream_levels = [int(n) for n in args.stream_levels.split(',')]
+    args.upload_sizes = list(UPLOAD_SIZES)
+    if args.quick:
+        args.iterations = min(args.iterations, 50)
+        args.warmup = min(args.warmup, 5)
+        args.duration = min(args.duration, 2.0)
+        args.projects = min(args.projects, 200)
+        args.stream_levels = [n for n in args.stream_levels if n <= 50] or args.stream_levels[:1]
+        args.stream_hold = min(args.stream_hold, 2.0)
+        args.upload_sizes = [size for size in UPLOAD_SIZES if size <= 1024 * 1024]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        regressions = compare(old, new, args.threshold)
+        return 1 if regressions else 0
+
+    # Isolated from the real database and uploads; set before the app is imported.
+    upload_folder = tempfile.mkdtemp(prefix='uimodel-benchmark-')
+    os.environ['STORAGE_URL'] = 'memory://'
+    os.environ['UPLOAD_FOLDER'] = upload_folder
+    # Repeated payloads would otherwise measure cache hits; bench_predict measures those separately.
+    os.environ['PREDICTION_CACHE_ENTRIES'] = '0'
+    # Every benchmark client is the same caller, so per-client admission limits are lifted.
+    os.environ.update({
+        'PREDICT_RATE_PER_SECOND': '0',
+        'TRAINING_RATE_PER_MINUTE': '0',
+        'PREDICT_MAX_CONCURRENT_PER_CLIENT': '100000',
+        'STREAM_MAX_CONCURRENT_PER_CLIENT': '100000',
+        'STREAM_MAX_CONCURRENT': '100000',
+        'PREDICT_MAX_QUEUED_RECORDS': '1000000',
+    })
+    try:
+        results = Benchmark(args).run()
+    finally:
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_FOLDER, exist_ok=True)
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(RESULTS_FOLDER, f"{stamp}-{results['git']['commit'] or 'unknown'}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
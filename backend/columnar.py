@@ -0,0 +1,193 @@
+import csv
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from profiler import NULL_TOKENS
+
+# Rows converted per chunk; bounds memory while writing the column files.
+CHUNK_ROWS = 65536
+
+
+class Column:
+    """
+    One column of a converted dataset.
+
+    Numeric columns hold a float64 array (NaN for nulls). Boolean and string
+    columns are dictionary-encoded: `values` holds int32 codes into
+    `categories`, with -1 for nulls. Arrays are read-only memory maps.
+    """
+
+    def __init__(self, name, kind, values, categories=None):
+        self.name = name
+        self.kind = kind
+        self.values = values
+        self.categories = categories
+
+    @property
+    def is_categorical(self):
+        return self.categories is not None
+
+    def decode(self, start=0, stop=None):
+        """Returns the column's Python values for rows [start, stop), with None for nulls."""
+        values = self.values[start:stop]
+        if self.is_categorical:
+            if self.kind == 'boolean':
+                return [None if code < 0 else self.categories[code] == 'True' for code in values.tolist()]
+            return [None if code < 0 else self.categories[code] for code in values.tolist()]
+        return [None if v != v else v for v in values.tolist()]
+
+
+class ColumnarDataset:
+    """A converted CSV: typed columns memory-mapped from `.npy` files."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.source = meta['source']
+        self.sha256 = meta['sha256']
+        self.rows = meta['rows']
+        self.columns = []
+        for spec in meta['columns']:
+            values = np.load(os.path.join(path, spec['file']), mmap_mode='r')
+            self.columns.append(Column(spec['name'], spec['kind'], values, spec.get('categories')))
+
+    def column(self, name):
+        return next((c for c in self.columns if c.name == name), None)
+
+    def records(self, start=0, stop=None):
+        """Materializes rows [start, stop) as dicts (for echoing or row-wise consumers)."""
+        decoded = [(c.name, c.decode(start, stop)) for c in self.columns]
+        count = len(decoded[0][1]) if decoded else 0
+        return [{name: values[i] for name, values in decoded} for i in range(count)]
+
+
+def _column_kind(profile_type):
+    if profile_type in ('integer', 'float'):
+        return 'numeric'
+    if profile_type == 'boolean':
+        return 'boolean'
+    return 'string'
+
+
+def convert_csv(source_path, target_path, profile, sha256, source_name):
+    """
+    Converts a CSV into one `.npy` file per column plus `meta.json`, in a
+    single streaming pass sized by the profile's row count. Writes into a
+    temporary directory that is atomically renamed to `target_path`.
+    """
+    tmp_path = f"{target_path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_path)
+    try:
+        rows = profile['rows']
+        specs = []
+        arrays = []
+        encoders = []
+        for index, column in enumerate(profile['columns']):
+            kind = _column_kind(column['type'])
+            filename = f"col{index}.npy"
+            dtype = np.float64 if kind == 'numeric' else np.int32
+            arrays.append(np.lib.format.open_memmap(os.path.join(tmp_path, filename), mode='w+', dtype=dtype, shape=(rows,)))
+            encoders.append({} if kind != 'numeric' else None)
+            specs.append({'name': column['name'], 'kind': kind, 'file': filename})
+
+        width = len(specs)
+        with open(source_path, newline='', encoding='utf-8', errors='replace') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            offset = 0
+            chunk = []
+            for row in reader:
+                if not row:
+                    continue
+                chunk.append(row[:width] + [''] * (width - len(row)))
+                if len(chunk) >= CHUNK_ROWS:
+                    _write_chunk(chunk, offset, specs, arrays, encoders)
+                    offset += len(chunk)
+                    chunk = []
+            if chunk:
+                _write_chunk(chunk, offset, specs, arrays, encoders)
+                offset += len(chunk)
+
+        for spec, array, encoder in zip(specs, arrays, encoders):
+            array.flush()
+            if encoder is not None:
+                spec['categories'] = list(encoder)
+        del arrays
+
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'source': source_name, 'sha256': sha256, 'rows': offset, 'columns': specs}, f)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def _write_chunk(chunk, offset, specs, arrays, encoders):
+    for spec, array, encoder, values in zip(specs, arrays, encoders, zip(*chunk)):
+        target = array[offset:offset + len(values)]
+        if encoder is None:
+            target[:] = [_to_float(v) for v in values]
+        elif spec['kind'] == 'boolean':
+            target[:] = [-1 if v.strip().lower() in NULL_TOKENS else encoder.setdefault(str(v.strip().lower() == 'true'), len(encoder)) for v in values]
+        else:
+            target[:] = [-1 if v.strip().lower() in NULL_TOKENS else encoder.setdefault(v, len(encoder)) for v in values]
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+
+class ColumnarCache:
+    """
+    Columnar copies of uploaded CSVs under `folder/<sha256>/`.
+
+    A dataset is looked up by the source file's current content hash, so a
+    changed file is reconverted automatically; directories for hashes no
+    longer referenced by any upload are removed after each conversion.
+    """
+
+    def __init__(self, upload_store, profile_cache, folder, max_workers=1):
+        self.upload_store = upload_store
+        self.profile_cache = profile_cache
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._convert_locks = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='dataset-converter')
+        os.makedirs(folder, exist_ok=True)
+
+    def load(self, filename):
+        """Returns the ColumnarDataset for an uploaded CSV, converting it on a miss. None if the file is missing."""
+        profile = self.profile_cache.get(filename)
+        if profile is None:
+            return None
+        digest = profile['sha256']
+        path = os.path.join(self.folder, digest)
+        if not os.path.isdir(path):
+            with self._lock:
+                lock = self._convert_locks.setdefault(digest, threading.Lock())
+            with lock:
+                if not os.path.isdir(path):
+                    convert_csv(os.path.join(self.upload_store.folder, filename), path, profile, digest, filename)
+                    self._collect_garbage()
+            with self._lock:
+                self._convert_locks.pop(digest, None)
+        with open(os.path.join(path, 'meta.json')) as f:
+            return ColumnarDataset(path, json.load(f))
+
+    def warm(self, filename):
+        """Profiles and converts a freshly uploaded CSV in the background."""
+        return self._executor.submit(self.load, filename)
+
+    def _collect_garbage(self):
+        live = self.upload_store.known_hashes()
+        for name in os.listdir(self.folder):
+            if name not in live and not name.endswith('.tmp'):
+                shutil.rmtree(os.path.join(self.folder, name), ignore_errors=True)
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; without it only gzip (and zstd if installed) is offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional
+    zstandard = None
+
+# Content codings this server can produce, in order of preference.
+AVAILABLE_ENCODINGS = tuple(
+    encoding for encoding, module in (('zstd', zstandard), ('br', brotli), ('gzip', zlib)) if module is not None
+)
+# Levels for per-response compression (cheap) and for precompressed artifacts (compressed once).
+DYNAMIC_LEVELS = {'gzip': 6, 'br': 5, 'zstd': 3}
+ARTIFACT_LEVELS = {'gzip': 9, 'br': 11, 'zstd': 19}
+COMPRESSIBLE_MIMETYPES = frozenset(['application/json', 'text/csv', 'text/plain', 'text/html', 'application/javascript'])
+CHUNK_SIZE = 1024 * 1024
+
+
+def negotiate(accept_encoding, encodings=AVAILABLE_ENCODINGS):
+    """
+    Picks the content coding for an Accept-Encoding header: the client's
+    highest-q coding among `encodings`, ties broken by the server's order.
+    Returns None for identity.
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = weights.get(encoding, weights.get('x-gzip', wildcard) if encoding == 'gzip' else wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_MIMETYPES or (mimetype or '').startswith('text/')
+
+
+class _Encoder:
+    """A streaming compressor with compress(chunk) / flush() for any available coding."""
+
+    def __init__(self, encoding, level):
+        if encoding == 'gzip':
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+            self.compress, self.flush = self._obj.compress, self._obj.flush
+        elif encoding == 'br':
+            self._obj = brotli.Compressor(quality=level)
+            self.compress, self.flush = self._obj.process, self._obj.finish
+        elif encoding == 'zstd':
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+            self.compress, self.flush = self._obj.compress, self._obj.flush
+        else:
+            raise ValueError(f'Unsupported content coding: {encoding}')
+
+
+def compress(data, encoding, level=None):
+    """Compresses bytes with one of AVAILABLE_ENCODINGS (at its dynamic level by default)."""
+    encoder = _Encoder(encoding, DYNAMIC_LEVELS[encoding] if level is None else level)
+    return encoder.compress(data) + encoder.flush()
+
+
+class CompressedBodies:
+    """
+    Compressed variants of cached response bodies, keyed by (ETag, coding).
+    The ETag is a digest of the body, so a variant is valid for as long as
+    anything serves that body, and the LRU only bounds memory.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag, encoding, body):
+        key = (etag, encoding)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+        compressed = compress(body, encoding)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+
+class ArtifactCompressor:
+    """
+    Precompressed copies of the model files in a ModelRegistry.
+
+    Files already indexed when the compressor is created, and every file that
+    appears or changes later, get one variant per coding written by a
+    background worker to `<models folder>/.compressed/<sha256>.<coding>`, so
+    downloads never compress per request and variants survive restarts.
+    Variants that don't save at least `min_saving` of the size are discarded
+    (and remembered as such), and variants of files no longer in the registry
+    are removed.
+    """
+
+    FOLDER = '.compressed'
+    SKIPPED = '.skip'
+
+    def __init__(self, registry, encodings=AVAILABLE_ENCODINGS, min_bytes=1024, min_saving=0.1):
+        self.registry = registry
+        self.encodings = encodings
+        self.min_bytes = min_bytes
+        self.min_saving = min_saving
+        self.folder = os.path.join(registry.folder, self.FOLDER)
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+        self.built = 0
+        os.makedirs(self.folder, exist_ok=True)
+        registry.on_change(lambda name, entry: self.schedule(entry))
+        for name in registry.names():
+            self.schedule(registry.get(name))
+
+    def path(self, digest, encoding):
+        return os.path.join(self.folder, f'{digest}.{encoding}')
+
+    def variant(self, entry, encoding):
+        """Returns the path of a ready variant of a registry entry, or None to serve the original."""
+        path = self.path(entry['sha256'], encoding)
+        if encoding not in self.encodings or not os.path.isfile(path):
+            self.schedule(entry)
+            return None
+        return path
+
+    def schedule(self, entry):
+        if not entry or entry['fileSize'] < self.min_bytes:
+            return
+        digest = entry['sha256']
+        missing = [e for e in self.encodings if not os.path.exists(self.path(digest, e))
+                   and not os.path.exists(self.path(digest, e) + self.SKIPPED)]
+        if not missing:
+            return
+        with self._lock:
+            if digest in self._pending:
+                return
+            self._pending.add(digest)
+            if self._executor is None:
+                # Only started once there is something to compress.
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='artifact-compressor')
+            self._executor.submit(self._build, entry, missing)
+
+    def _build(self, entry, encodings):
+        digest = entry['sha256']
+        try:
+            for encoding in encodings:
+                self._write_variant(entry['path'], entry['fileSize'], digest, encoding)
+            self._collect_garbage()
+        except OSError as e:
+            log.warning('Could not precompress %s: %s', entry['fileName'], e)
+        finally:
+            with self._lock:
+                self._pending.discard(digest)
+
+    def _write_variant(self, source, size, digest, encoding):
+        path = self.path(digest, encoding)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        encoder = _Encoder(encoding, ARTIFACT_LEVELS[encoding])
+        hasher = hashlib.sha256()
+        try:
+            with open(source, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    hasher.update(chunk)
+                    dst.write(encoder.compress(chunk))
+                dst.write(encoder.flush())
+            if hasher.hexdigest() != digest:
+                # Replaced while being read; the registry schedules the new content itself.
+                os.remove(tmp_path)
+                return
+            if os.path.getsize(tmp_path) > size * (1 - self.min_saving):
+                os.remove(tmp_path)
+                open(path + self.SKIPPED, 'w').close()
+                return
+            os.replace(tmp_path, path)
+            with self._lock:
+                self.built += 1
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _collect_garbage(self):
+        entries = (self.registry.get(name) for name in self.registry.names())
+        live = {entry['sha256'] for entry in entries if entry}
+        for filename in os.listdir(self.folder):
+            if filename.split('.', 1)[0] not in live and not filename.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.folder, filename))
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {'encodings': list(self.encodings), 'built': self.built, 'pending': len(self._pending)}
@@ -0,0 +1,242 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+
+# Ports probed when a data source doesn't specify one, by data source type id.
+DEFAULT_PORTS = {
+    'postgresql': 5432,
+    'mysql': 3306,
+    'snowflake': 443,
+    'aws-s3': 443,
+    'mongodb': 27017,
+    'kafka': 9092,
+    'mqtt': 1883,
+    'rabbitmq': 5672
+}
+
+
+class ProbeError(ValueError):
+    """A data source description that can't be probed."""
+
+
+def parse_target(source):
+    """Returns the (host, port) to probe for a DataSource dict, or raises ProbeError."""
+    if not isinstance(source, dict):
+        raise ProbeError('Each data source must be an object')
+    host = str(source.get('host') or '').strip()
+    if not host:
+        raise ProbeError('Host is required')
+    port = source.get('port') or DEFAULT_PORTS.get(source.get('id'))
+    try:
+        port = int(port)
+    except (TypeError, ValueError):
+        raise ProbeError('Port is required' if port is None else 'Port must be a number')
+    if not 0 < port < 65536:
+        raise ProbeError('Port must be between 1 and 65535')
+    return host.lower(), port
+
+
+class TargetPolicy:
+    """
+    Decides which addresses probes may connect to, so the endpoint can't be
+    used to scan the server's own network. Addresses in `allowed_networks`
+    (CIDR strings) are always allowed; with `block_private`, every other
+    non-global address (private, loopback, link-local, carrier-grade NAT,
+    reserved) and multicast is refused. Hosts named in `allowed_hosts` skip
+    the address check.
+    """
+
+    def __init__(self, allowed_hosts=(), allowed_networks=(), block_private=True):
+        self.allowed_hosts = frozenset(host.strip().lower() for host in allowed_hosts if host.strip())
+        self.allowed_networks = [ipaddress.ip_network(net.strip(), strict=False) for net in allowed_networks if net.strip()]
+        self.block_private = block_private
+
+    def allows(self, address):
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        if getattr(ip, 'ipv4_mapped', None):
+            ip = ip.ipv4_mapped
+        if any(ip in network for network in self.allowed_networks):
+            return True
+        return not self.block_private or (ip.is_global and not ip.is_multicast)
+
+
+class ConnectivityProber:
+    """
+    Checks TCP reachability of data sources from a dedicated asyncio loop.
+
+    Each probe is a non-blocking connect bounded by `timeout`, so a batch of
+    targets completes in about one timeout window however many there are
+    (up to `max_concurrency` connects in flight). Results are cached per
+    (host, port) for `ttl` seconds (`failure_ttl` for failures), concurrent
+    probes of the same target share one connect, and successful connections
+    are kept open for `idle_seconds` so a repeat probe of that host reuses
+    the pooled connection instead of dialling again.
+
+    Hosts are resolved first and only addresses the TargetPolicy allows are
+    dialled; the connect goes to the checked address, so a DNS answer that
+    changes between check and connect can't redirect it. Refused targets
+    come back unreachable with `blocked` set.
+
+    `submit()` returns a concurrent.futures.Future, so Flask handlers can
+    block on it and ASGI handlers can await it with asyncio.wrap_future.
+    """
+
+    def __init__(self, timeout=3.0, ttl=30.0, failure_ttl=5.0, max_concurrency=256, idle_seconds=60.0,
+                 max_idle_per_target=2, policy=None):
+        self.policy = policy or TargetPolicy()
+        self.timeout = timeout
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_concurrency = max_concurrency
+        self.idle_seconds = idle_seconds
+        self.max_idle_per_target = max_idle_per_target
+        self._cache = {}
+        self._inflight = {}
+        self._idle = {}
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self.probes = 0
+        self.cache_hits = 0
+        self.pool_hits = 0
+        self.blocked = 0
+
+    def _ensure_loop(self):
+        # Started lazily so the Flask reloader's parent process never spawns the thread.
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                threading.Thread(target=self._run_loop, name='connectivity-prober', daemon=True).start()
+            return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._reap_idle())
+        self._loop.run_forever()
+
+    def submit(self, targets):
+        """Probes a list of (host, port) targets concurrently; the future resolves to one result dict per target."""
+        return asyncio.run_coroutine_threadsafe(self._probe_all(targets), self._ensure_loop())
+
+    async def _probe_all(self, targets):
+        return await asyncio.gather(*(self._probe(host, port) for host, port in targets))
+
+    async def _probe(self, host, port):
+        key = (host, port)
+        cached = self._cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return dict(cached[1], cached=True)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._check(host, port))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return dict(await asyncio.shield(task), cached=False)
+
+    async def _check(self, host, port):
+        key = (host, port)
+        started = time.perf_counter()
+        self.probes += 1
+        if self._take_idle(key):
+            self.pool_hits += 1
+            result = self._result(host, port, True, 'Connection successful!', started, pooled=True)
+        else:
+            try:
+                async with self._semaphore:
+                    address = await asyncio.wait_for(self._resolve(host, port), self.timeout)
+                    if address is None:
+                        self.blocked += 1
+                        result = self._result(host, port, False, 'Connection refused: target address is not allowed', started)
+                        result['blocked'] = True
+                        self._cache[key] = (time.monotonic() + self.failure_ttl, result)
+                        return result
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(address, port), self.timeout)
+            except asyncio.TimeoutError:
+                result = self._result(host, port, False, f'Connection timed out after {self.timeout:g}s', started)
+            except OSError as e:
+                result = self._result(host, port, False, f'Connection failed: {e.strerror or e}', started)
+            else:
+                self._put_idle(key, reader, writer)
+                result = self._result(host, port, True, 'Connection successful!', started)
+
+        ttl = self.ttl if result['reachable'] else self.failure_ttl
+        self._cache[key] = (time.monotonic() + ttl, result)
+        return result
+
+    async def _resolve(self, host, port):
+        """Returns the first address of `host` the policy allows, or None."""
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        if host in self.policy.allowed_hosts:
+            return infos[0][4][0]
+        return next((info[4][0] for info in infos if self.policy.allows(info[4][0])), None)
+
+    def _result(self, host, port, reachable, message, started, pooled=False):
+        return {
+            'host': host,
+            'port': port,
+            'status': 'success' if reachable else 'error',
+            'reachable': reachable,
+            'message': message,
+            'latencyMs': round((time.perf_counter() - started) * 1000, 3),
+            'pooled': pooled,
+            'blocked': False,
+            'checkedAt': time.time()
+        }
+
+    # --- Idle connection pool ---
+
+    def _take_idle(self, key):
+        """Returns True if a still-open pooled connection to `key` exists (it stays pooled)."""
+        connections = self._idle.get(key, [])
+        while connections:
+            reader, writer, expires = connections[-1]
+            if expires > time.monotonic() and _is_open(reader, writer):
+                connections[-1] = (reader, writer, time.monotonic() + self.idle_seconds)
+                return True
+            connections.pop()
+            writer.close()
+        return False
+
+    def _put_idle(self, key, reader, writer):
+        connections = self._idle.setdefault(key, [])
+        if len(connections) >= self.max_idle_per_target:
+            writer.close()
+            return
+        connections.append((reader, writer, time.monotonic() + self.idle_seconds))
+
+    async def _reap_idle(self):
+        while True:
+            await asyncio.sleep(min(self.idle_seconds, 5.0))
+            now = time.monotonic()
+            for key in list(self._idle):
+                alive = []
+                for reader, writer, expires in self._idle[key]:
+                    if expires > now and _is_open(reader, writer):
+                        alive.append((reader, writer, expires))
+                    else:
+                        writer.close()
+                if alive:
+                    self._idle[key] = alive
+                else:
+                    del self._idle[key]
+            for key in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                del self._cache[key]
+
+    def stats(self):
+        return {
+            'probes': self.probes,
+            'cacheHits': self.cache_hits,
+            'poolHits': self.pool_hits,
+            'blocked': self.blocked,
+            'cachedTargets': len(self._cache),
+            'pooledConnections': sum(len(c) for c in self._idle.values())
+        }
+
+
+def _is_open(reader, writer):
+    # A peer that hung up leaves the transport half-open, so EOF has to be checked too.
+    return not writer.is_closing() and not reader.at_eof()
@@ -0,0 +1,250 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from inference import NUM_FEATURES
+from training import BLOCK_ROWS, TrainingConfig, TrainingError, fit, forward, score_metrics
+
+# validationType values that are cross-validated rather than scored on a single holdout.
+CV_TYPES = ('k-fold', 'stratified-k-fold', 'leave-one-out')
+METRIC_KEYS = ('accuracy', 'precision', 'recall', 'f1Score')
+
+
+class SharedArray:
+    """A NumPy array backed by a named shared-memory segment that worker processes attach to."""
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(create=True, size=size) if self.owner else shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self):
+        return (self.shm.name, self.shape, self.dtype.str)
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class FoldData:
+    """Worker-side view of the shared dataset with the interface `training.fit` expects."""
+
+    def __init__(self, task, features, y):
+        self.task = task
+        self.y = y
+        self._features = features
+        rows = len(y)
+        self.blocks = [(start, min(rows, start + BLOCK_ROWS)) for start in range(0, rows, BLOCK_ROWS)]
+
+    def features(self, start, stop):
+        return self._features[start:stop]
+
+
+def _run_fold(specs, task, params, fold):
+    """Trains on every fold but `fold` and scores it; writes its out-of-fold outputs into the shared array."""
+    shared = [SharedArray.attach(spec) for spec in specs]
+    try:
+        return _fit_fold(task, params, fold, *(s.array for s in shared))
+    finally:
+        for s in shared:
+            s.close()
+
+
+def _fit_fold(task, params, fold, features, y, folds, outputs):
+    # Kept separate from _run_fold so no views of the shared buffers outlive the call.
+    started = time.perf_counter()
+    data = FoldData(task, features, y)
+    validation_mask = folds == fold
+    weights, bias, metrics, _ = fit(data, TrainingConfig(params), ~validation_mask, validation_mask, track_history=False)
+    outputs[validation_mask] = forward(features[validation_mask], weights, bias, task == 'classification')
+    return {
+        'fold': fold + 1,
+        'trainRows': int(len(y) - np.count_nonzero(validation_mask)),
+        'validationRows': int(np.count_nonzero(validation_mask)),
+        'seconds': round(time.perf_counter() - started, 4),
+        **{key: metrics[key] for key in METRIC_KEYS}
+    }
+
+
+# Modules pool tasks live in, imported once by the fork server rather than by every worker.
+WORKER_MODULES = ['cross_validation', 'hyperparameter_search', 'preprocessing']
+
+
+def create_process_pool(max_workers):
+    """
+    Returns a ProcessPoolExecutor for NumPy-only tasks. The server already
+    runs threads by the time a pool is needed, and forking it could copy a
+    lock some thread holds, so workers are forked from a clean fork server
+    (spawned where that isn't available). Datasets reach them through
+    shared memory, so nothing large is pickled.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(WORKER_MODULES)
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def settle(futures):
+    """
+    Cancels the pool tasks that haven't started and waits for the rest, so
+    the shared memory they attach to can be unlinked safely afterwards.
+    """
+    wait([future for future in futures if not future.cancel()])
+
+
+def select_rows(valid, max_shared_bytes, seed):
+    """
+    Returns (row_indices, sampled): the labelled rows, or a uniform sample of
+    them if their features would exceed `max_shared_bytes`.
+    """
+    rows = np.flatnonzero(valid)
+    max_rows = max(1, max_shared_bytes // (NUM_FEATURES * 4))
+    if rows.size <= max_rows:
+        return rows, False
+    return np.sort(np.random.default_rng(seed).choice(rows, max_rows, replace=False)), True
+
+
+def share_rows(data, rows):
+    """Copies the features and targets of `rows` (sorted indices into a TrainingData) into shared memory."""
+    features = SharedArray((rows.size, NUM_FEATURES), np.float32)
+    y = SharedArray((rows.size,), np.float64)
+    try:
+        for start, stop in data.blocks:
+            selected = rows[(rows >= start) & (rows < stop)]
+            if selected.size:
+                position = np.searchsorted(rows, selected)
+                features.array[position] = data.features(start, stop)[selected - start]
+        y.array[:] = data.y[rows]
+    except BaseException:
+        features.close()
+        y.close()
+        raise
+    return features, y
+
+
+def assign_folds(y, task, validation_type, k, seed):
+    """
+    Returns an int32 fold number per row. 'stratified-k-fold' deals each class
+    (for regression: above/below the median) round-robin across folds so every
+    fold keeps the overall class balance; 'leave-one-out' gives each row its own fold.
+    """
+    rows = len(y)
+    rng = np.random.default_rng(seed)
+    folds = np.empty(rows, dtype=np.int32)
+    if validation_type == 'leave-one-out':
+        folds[rng.permutation(rows)] = np.arange(rows, dtype=np.int32)
+        return folds
+    if validation_type == 'stratified-k-fold':
+        strata = y >= 0.5 if task == 'classification' else y > np.median(y)
+        offset = 0
+        for stratum in (np.flatnonzero(strata), np.flatnonzero(~strata)):
+            order = rng.permutation(stratum)
+            folds[order] = (np.arange(order.size) + offset) % k
+            offset += order.size
+        return folds
+    folds[rng.permutation(rows)] = np.arange(rows) % k
+    return folds
+
+
+class CrossValidator:
+    """
+    Runs k-fold, stratified k-fold and leave-one-out cross-validation with one
+    task per fold on a process pool.
+
+    The featurized dataset, targets and fold assignment are copied once into
+    shared memory; workers attach to the segments by name, so nothing but the
+    segment names and training parameters is pickled per fold. Datasets whose
+    features exceed `max_shared_bytes` are cross-validated on a uniform sample.
+    Leave-one-out needs one model per row and falls back to k-fold above `max_folds` rows.
+    """
+
+    def __init__(self, max_workers=None, max_shared_bytes=1024 * 1024 * 1024, max_folds=200):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_shared_bytes = max_shared_bytes
+        self.max_folds = max_folds
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def pool(self):
+        """The process pool fold tasks run on, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = create_process_pool(self.max_workers)
+            return self._executor
+
+    def run(self, data, config):
+        """Cross-validates `data` (a TrainingData) with config.validation_type and returns the aggregated report."""
+        started = time.perf_counter()
+        rows, sampled = select_rows(data.valid, self.max_shared_bytes, config.seed)
+
+        validation_type = config.validation_type
+        k = config.k_folds
+        if validation_type == 'leave-one-out':
+            if rows.size <= self.max_folds:
+                k = rows.size
+            else:
+                validation_type = 'k-fold'
+        k = min(k, rows.size)
+        if k < 2:
+            raise TrainingError('Cross-validation needs at least two labelled rows.')
+
+        features, y = share_rows(data, rows)
+        folds = SharedArray((rows.size,), np.int32)
+        outputs = SharedArray((rows.size,), np.float64)
+        shared = [features, y, folds, outputs]
+        fold_futures = []
+        try:
+            folds.array[:] = assign_folds(y.array, data.task, validation_type, k, config.seed)
+
+            specs = [s.spec for s in shared]
+            pool = self.pool()
+            for fold in range(k):
+                fold_futures.append(pool.submit(_run_fold, specs, data.task, _config_params(config), fold))
+            fold_results = [future.result() for future in fold_futures]
+            pooled = score_metrics(outputs.array.copy(), y.array.copy(), data.task == 'classification')
+        finally:
+            settle(fold_futures)
+            for s in shared:
+                s.close()
+
+        return {
+            'validationType': validation_type,
+            'folds': k,
+            'rows': int(rows.size),
+            'sampled': sampled,
+            'workers': min(self.max_workers, k),
+            'elapsedSeconds': round(time.perf_counter() - started, 4),
+            # Pooled over every row's out-of-fold prediction.
+            **{key: pooled[key] for key in METRIC_KEYS},
+            'foldMean': {key: round(float(np.mean([f[key] for f in fold_results])), 2) for key in METRIC_KEYS},
+            'foldStd': {key: round(float(np.std([f[key] for f in fold_results])), 2) for key in METRIC_KEYS},
+            'foldResults': fold_results
+        }
+
+
+def _config_params(config):
+    # TrainingConfig is rebuilt in the worker from the ModelParameters it was parsed from.
+    return {
+        'learningRate': config.learning_rate,
+        'epochs': config.epochs,
+        'batchSize': config.batch_size,
+        'seed': config.seed
+    }
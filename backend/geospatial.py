@@ -0,0 +1,302 @@
+import math
+import re
+
+import numpy as np
+
+from columnar import Column
+
+# Mean Earth radius (IUGG), in kilometres.
+EARTH_RADIUS_KM = 6371.0088
+# Rows per chunk when computing distances, bounding temporary arrays for very large datasets.
+DISTANCE_CHUNK_ROWS = 1 << 20
+# Zones per axis when geoFencing is on but no geofences were given.
+DEFAULT_ZONE_GRID = 8
+
+_LATITUDE = re.compile(r'^(?P<prefix>.*?)[_\s.-]?(lat|latitude)$', re.IGNORECASE)
+_LONGITUDE = re.compile(r'^(?P<prefix>.*?)[_\s.-]?(lon|lng|long|longitude)$', re.IGNORECASE)
+
+
+class GeoError(ValueError):
+    """Geofences, reference points or coordinate columns that can't be used."""
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in kilometres between points given in degrees.
+    Arguments broadcast like NumPy arrays, so one call can measure millions
+    of points against a single reference point. NaN coordinates give NaN.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def chunked_haversine(lat, lon, lat2, lon2, chunk_rows=DISTANCE_CHUNK_ROWS):
+    """haversine() over arrays of points in chunks, so temporaries stay bounded for very large inputs."""
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    scalar = np.ndim(lat2) == 0
+    out = np.empty(lat.shape, dtype=np.float64)
+    for start in range(0, lat.size, chunk_rows):
+        stop = start + chunk_rows
+        out[start:stop] = haversine(lat[start:stop], lon[start:stop],
+                                    lat2 if scalar else lat2[start:stop], lon2 if scalar else lon2[start:stop])
+    return out
+
+
+class Geofence:
+    """
+    A named polygon. `ring` is a sequence of [longitude, latitude] vertices
+    (GeoJSON order); holes and antimeridian crossings are not supported.
+    """
+
+    def __init__(self, name, ring):
+        ring = np.asarray(ring, dtype=np.float64)
+        if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 3 or not np.isfinite(ring).all():
+            raise GeoError(f'Geofence "{name}" needs at least three [longitude, latitude] vertices.')
+        self.name = str(name)
+        self.lon, self.lat = ring[:, 0].copy(), ring[:, 1].copy()
+        self.bbox = (self.lat.min(), self.lon.min(), self.lat.max(), self.lon.max())
+
+    @classmethod
+    def parse(cls, spec, index):
+        """Builds a geofence from {"name", "coordinates": ring}, a GeoJSON Polygon or a GeoJSON Feature."""
+        if not isinstance(spec, dict):
+            raise GeoError('Each geofence must be an object.')
+        geometry = spec.get('geometry') or spec
+        name = spec.get('name') or (spec.get('properties') or {}).get('name') or f'fence{index + 1}'
+        coordinates = geometry.get('coordinates')
+        if geometry.get('type') == 'Polygon' and coordinates:
+            coordinates = coordinates[0]  # Exterior ring
+        try:
+            return cls(name, coordinates)
+        except (TypeError, ValueError) as e:
+            raise GeoError(str(e) if isinstance(e, GeoError) else f'Geofence "{name}" has invalid coordinates.')
+
+    def contains(self, lat, lon):
+        """Vectorized even-odd ray casting: a boolean array, True where (lat, lon) is inside."""
+        inside = np.zeros(lat.shape, dtype=bool)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in range(len(self.lat)):
+                lat1, lon1, lat2, lon2 = self.lat[i], self.lon[i], self.lat[i - 1], self.lon[i - 1]
+                crosses = (lat1 > lat) != (lat2 > lat)
+                inside ^= crosses & (lon < (lon2 - lon1) * (lat - lat1) / (lat2 - lat1) + lon1)
+        return inside
+
+
+class GeofenceIndex:
+    """
+    A uniform grid over the geofences' combined bounding box. Each cell lists
+    the fences whose bounding box overlaps it, so a point is only ray-cast
+    against the few polygons near it instead of every polygon.
+    """
+
+    def __init__(self, fences, grid_size=64):
+        if not fences:
+            raise GeoError('At least one geofence is required.')
+        self.fences = fences
+        self.grid_size = grid_size
+        self.bbox = (min(f.bbox[0] for f in fences), min(f.bbox[1] for f in fences),
+                     max(f.bbox[2] for f in fences), max(f.bbox[3] for f in fences))
+        self._cells = {}
+        for index, fence in enumerate(fences):
+            row0, col0 = self._cell(fence.bbox[0], fence.bbox[1])
+            row1, col1 = self._cell(fence.bbox[2], fence.bbox[3])
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    self._cells.setdefault(row * grid_size + col, []).append(index)
+
+    def _cell(self, lat, lon):
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        row = np.floor((lat - min_lat) / max(max_lat - min_lat, 1e-12) * self.grid_size)
+        col = np.floor((lon - min_lon) / max(max_lon - min_lon, 1e-12) * self.grid_size)
+        return np.clip(row, 0, self.grid_size - 1).astype(np.int64), np.clip(col, 0, self.grid_size - 1).astype(np.int64)
+
+    def locate(self, lat, lon):
+        """Returns, per point, the index of the first listed geofence containing it, or -1."""
+        result = np.full(lat.shape, -1, dtype=np.int32)
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        points = np.flatnonzero((lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon))
+        if not points.size:
+            return result
+        rows, cols = self._cell(lat[points], lon[points])
+        cells = rows * self.grid_size + cols
+        order = np.argsort(cells, kind='stable')
+        occupied, starts = np.unique(cells[order], return_index=True)
+        ends = np.append(starts[1:], order.size)
+
+        candidates = [[] for _ in self.fences]
+        for cell, start, end in zip(occupied.tolist(), starts.tolist(), ends.tolist()):
+            for index in self._cells.get(cell, ()):
+                candidates[index].append(points[order[start:end]])
+
+        for index, fence in enumerate(self.fences):
+            if not candidates[index]:
+                continue
+            near = np.concatenate(candidates[index])
+            near = near[result[near] < 0]
+            south, west, north, east = fence.bbox
+            near = near[(lat[near] >= south) & (lat[near] <= north) & (lon[near] >= west) & (lon[near] <= east)]
+            if near.size:
+                result[near[fence.contains(lat[near], lon[near])]] = index
+        return result
+
+
+def find_coordinate_pairs(names, latitude=None, longitude=None):
+    """
+    Returns [(label, latitude_column, longitude_column)] for the coordinate
+    columns among `names`: the explicit pair if given, otherwise every
+    latitude/longitude pair sharing a prefix (e.g. pickup_lat/pickup_lng).
+    """
+    if latitude or longitude:
+        if latitude not in names or longitude not in names:
+            raise GeoError('latitudeColumn and longitudeColumn must both name numeric dataset columns.')
+        return [('location', latitude, longitude)]
+    latitudes, longitudes = {}, {}
+    for name in names:
+        for pattern, found in ((_LATITUDE, latitudes), (_LONGITUDE, longitudes)):
+            match = pattern.match(name)
+            if match:
+                found.setdefault(match.group('prefix').lower(), name)
+    return [(prefix or 'location', latitudes[prefix], longitudes[prefix]) for prefix in latitudes if prefix in longitudes]
+
+
+class GeoStage:
+    """
+    Derives geospatial feature columns from latitude/longitude columns.
+
+    With `calculateDistance`, every coordinate pair gets its haversine
+    distance to each reference point, and consecutive pairs (e.g. pickup and
+    dropoff) get the distance between them. With `geoFencing`, every pair
+    gets the first geofence containing it as a categorical column, or, when
+    no geofences were given, its zone in a grid over the training data.
+
+    The stage is fitted once on the training data and pickled with the model,
+    so /api/predict derives identical columns for each micro-batch.
+    """
+
+    def __init__(self, pairs, references=(), geofences=(), zones=None, trip_distance=False):
+        self.pairs = pairs
+        self.references = list(references)
+        self.index = GeofenceIndex(list(geofences)) if geofences else None
+        self.zones = zones
+        self.trip_distance = trip_distance
+
+    @classmethod
+    def fit(cls, columns, config):
+        """Builds the stage for a dataset's feature Columns, or returns None if the flags are off or there are no coordinates."""
+        if not (config.geo_fencing or config.calculate_distance):
+            return None
+        by_name = {c.name: c for c in columns}
+        numeric = [c.name for c in columns if not c.is_categorical]
+        pairs = find_coordinate_pairs(numeric, config.latitude_column, config.longitude_column)
+        if not pairs:
+            return None
+
+        _, lat_name, lon_name = pairs[0]
+        lat, lon = _coordinates(by_name[lat_name].values, by_name[lon_name].values)
+        valid = ~np.isnan(lat)
+        if not valid.any():
+            return None
+
+        references = []
+        if config.calculate_distance:
+            references = [_parse_reference(spec, i) for i, spec in enumerate(config.reference_points)]
+            if not references:
+                references = [('center', float(np.mean(lat[valid])), float(np.mean(lon[valid])))]
+        geofences = [Geofence.parse(spec, i) for i, spec in enumerate(config.geofences)] if config.geo_fencing else []
+        zones = None
+        if config.geo_fencing and not geofences:
+            # Percentiles keep a few outliers from stretching the grid.
+            south, north = np.percentile(lat[valid], [1, 99])
+            west, east = np.percentile(lon[valid], [1, 99])
+            zones = (float(south), float(west), float(north), float(east), DEFAULT_ZONE_GRID)
+        return cls(pairs, references, geofences, zones, trip_distance=config.calculate_distance and len(pairs) > 1)
+
+    def columns(self, coordinates):
+        """
+        Returns the derived Columns for rows whose coordinates are given by
+        coordinates(column_name) -> float array.
+        """
+        points = [(label, *_coordinates(coordinates(lat_name), coordinates(lon_name))) for label, lat_name, lon_name in self.pairs]
+        columns = []
+        for label, lat, lon in points:
+            for name, ref_lat, ref_lon in self.references:
+                columns.append(Column(f'geo.{label}.km_to_{name}', 'numeric', chunked_haversine(lat, lon, ref_lat, ref_lon)))
+            if self.index is not None:
+                columns.append(Column(f'geo.{label}.geofence', 'string', self.index.locate(lat, lon),
+                                      [fence.name for fence in self.index.fences]))
+            if self.zones is not None:
+                columns.append(Column(f'geo.{label}.zone', 'string', self._zone_codes(lat, lon), self._zone_names()))
+        if self.trip_distance:
+            for (label1, lat1, lon1), (label2, lat2, lon2) in zip(points, points[1:]):
+                columns.append(Column(f'geo.{label1}_to_{label2}.km', 'numeric', chunked_haversine(lat1, lon1, lat2, lon2)))
+        return columns
+
+    def columns_for_dataset(self, columns, start=0, stop=None):
+        """Derived Columns for rows [start, stop) of a columnar dataset's columns."""
+        by_name = {c.name: c for c in columns}
+
+        def coordinates(name):
+            column = by_name.get(name)
+            if column is None or column.is_categorical:
+                rows = len(columns[0].values[start:stop]) if columns else 0
+                return np.full(rows, np.nan)
+            return np.asarray(column.values[start:stop], dtype=np.float64)
+        return self.columns(coordinates)
+
+    def columns_for_records(self, records):
+        """Derived Columns for a batch of /api/predict records (dicts keyed by column name)."""
+        def coordinates(name):
+            return np.array([_to_float(record.get(name)) if isinstance(record, dict) else np.nan for record in records],
+                            dtype=np.float64)
+        return self.columns(coordinates)
+
+    def _zone_codes(self, lat, lon):
+        south, west, north, east, size = self.zones
+        rows = np.floor((lat - south) / max(north - south, 1e-12) * size)
+        cols = np.floor((lon - west) / max(east - west, 1e-12) * size)
+        inside = (rows >= 0) & (rows < size) & (cols >= 0) & (cols < size)
+        codes = np.where(inside, rows * size + cols, size * size)
+        # Code size*size is "outside the grid"; missing coordinates are null (-1).
+        return np.where(np.isnan(lat) | np.isnan(lon), -1, codes).astype(np.int32)
+
+    def _zone_names(self):
+        size = self.zones[4]
+        return [f'{row}_{col}' for row in range(size) for col in range(size)] + ['outside']
+
+    def describe(self):
+        return {
+            'coordinates': [{'name': label, 'latitude': lat, 'longitude': lon} for label, lat, lon in self.pairs],
+            'referencePoints': [{'name': name, 'latitude': lat, 'longitude': lon} for name, lat, lon in self.references],
+            'geofences': [fence.name for fence in self.index.fences] if self.index else [],
+            'zoneGrid': self.zones[4] if self.zones else None,
+            'tripDistance': self.trip_distance
+        }
+
+
+def _coordinates(lat, lon):
+    """Float arrays of latitude/longitude with out-of-range values as NaN (in both)."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    invalid = ~((np.abs(lat) <= 90) & (np.abs(lon) <= 180))
+    if invalid.any():
+        lat, lon = np.where(invalid, np.nan, lat), np.where(invalid, np.nan, lon)
+    return lat, lon
+
+
+def _parse_reference(spec, index):
+    try:
+        lat, lon = float(spec['latitude']), float(spec['longitude'])
+    except (KeyError, TypeError, ValueError):
+        raise GeoError('Each reference point needs a numeric latitude and longitude.')
+    if not (abs(lat) <= 90 and abs(lon) <= 180):
+        raise GeoError('Reference point coordinates are out of range.')
+    return str(spec.get('name') or f'point{index + 1}'), lat, lon
+
+
+def _to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return math.nan
+    return value
@@ -0,0 +1,260 @@
+import itertools
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+from cross_validation import FoldData, SharedArray, select_rows, settle, share_rows
+from training import BLOCK_ROWS, TrainingConfig, TrainingError, fit
+
+# ModelParameters fields that can be searched: (type, lowest, highest, sample on a log scale).
+SEARCHABLE_PARAMS = {
+    'learningRate': (float, 1e-6, 10.0, True),
+    'batchSize': (int, 1, BLOCK_ROWS, True)
+}
+DEFAULT_SEARCH_SPACE = {
+    'learningRate': {'min': 1e-4, 'max': 1.0},
+    'batchSize': [16, 32, 64, 128]
+}
+STRATEGIES = ('random', 'grid')
+
+
+class SearchSpace:
+    """
+    A search space over ModelParameters. Each searched field is either a list
+    of choices, a {"min", "max", "log"} range or a fixed value. 'random'
+    draws `max_trials` configurations; 'grid' enumerates the cartesian
+    product, with ranges discretized into `grid_points` values.
+    """
+
+    def __init__(self, space=None, strategy='random', max_trials=20, grid_points=4, seed=0):
+        space = space or DEFAULT_SEARCH_SPACE
+        if strategy not in STRATEGIES:
+            raise TrainingError(f'Unknown search strategy "{strategy}". Use one of: {", ".join(STRATEGIES)}.')
+        unknown = set(space) - set(SEARCHABLE_PARAMS)
+        if unknown:
+            raise TrainingError(f'Unsupported search parameters: {", ".join(sorted(unknown))}.')
+        self.strategy = strategy
+        self.max_trials = max_trials
+        self.grid_points = grid_points
+        self.seed = seed
+        self.dimensions = {name: self._parse(name, spec) for name, spec in space.items()}
+
+    def _parse(self, name, spec):
+        cast, low, high, log = SEARCHABLE_PARAMS[name]
+        try:
+            if isinstance(spec, dict):
+                lowest = min(high, max(low, float(spec['min'])))
+                highest = min(high, max(lowest, float(spec['max'])))
+                return ('range', cast, lowest, highest, bool(spec.get('log', log)))
+            choices = spec if isinstance(spec, list) else [spec]
+            values = [cast(min(high, max(low, float(v)))) for v in choices]
+        except (KeyError, TypeError, ValueError):
+            raise TrainingError(f'Invalid search space for "{name}".')
+        if not values:
+            raise TrainingError(f'Search space for "{name}" has no values.')
+        return ('choice', values)
+
+    def _grid_values(self, dimension):
+        if dimension[0] == 'choice':
+            return dimension[1]
+        _, cast, low, high, log = dimension
+        points = np.geomspace(low, high, self.grid_points) if log and low > 0 else np.linspace(low, high, self.grid_points)
+        return sorted({cast(v) for v in points})
+
+    def _sample(self, dimension, rng):
+        if dimension[0] == 'choice':
+            return dimension[1][rng.integers(len(dimension[1]))]
+        _, cast, low, high, log = dimension
+        if log and low > 0:
+            return cast(math.exp(rng.uniform(math.log(low), math.log(high))))
+        return cast(rng.uniform(low, high))
+
+    def trials(self):
+        """Yields the parameter dicts to try, at most `max_trials` of them."""
+        names = list(self.dimensions)
+        if self.strategy == 'grid':
+            grid = itertools.product(*(self._grid_values(self.dimensions[name]) for name in names))
+            for values in itertools.islice(grid, self.max_trials):
+                yield dict(zip(names, values))
+            return
+        rng = np.random.default_rng(self.seed)
+        for _ in range(self.max_trials):
+            yield {name: self._sample(self.dimensions[name], rng) for name in names}
+
+
+class AshaScheduler:
+    """
+    Asynchronous successive halving (ASHA) over training epochs.
+
+    Rungs sit at min_epochs * reduction_factor**k epochs below max_epochs.
+    When a trial reaches a rung its validation loss is recorded there, and it
+    only continues if that loss is within the best 1/reduction_factor of the
+    losses recorded at the rung so far. Decisions never wait for other trials,
+    so workers stay busy while poor trials are stopped early.
+    """
+
+    def __init__(self, min_epochs=1, max_epochs=100, reduction_factor=3):
+        self.max_epochs = max(1, max_epochs)
+        self.min_epochs = min(self.max_epochs, max(1, min_epochs))
+        self.reduction_factor = max(2, reduction_factor)
+        self.rungs = []
+        epoch = self.min_epochs
+        while epoch < self.max_epochs:
+            self.rungs.append(epoch)
+            epoch *= self.reduction_factor
+        self._recorded = {rung: [] for rung in self.rungs}
+
+    def next_milestone(self, epoch):
+        """The epoch at which a trial that has trained `epoch` epochs is next evaluated."""
+        return next((rung for rung in self.rungs if rung > epoch), self.max_epochs)
+
+    def report(self, epoch, loss):
+        """Records a trial's loss at `epoch` and returns whether it should keep training."""
+        if epoch >= self.max_epochs:
+            return False
+        recorded = self._recorded.get(epoch)
+        if recorded is None:
+            return True
+        recorded.append(loss)
+        cutoff = np.percentile(recorded, 100 / self.reduction_factor)
+        return loss <= cutoff
+
+
+def _train_segment(specs, task, params, initial, seed):
+    """Continues one trial for params['epochs'] epochs on the shared dataset and scores it on the validation rows."""
+    shared = [SharedArray.attach(spec) for spec in specs]
+    try:
+        return _fit_segment(task, params, initial, seed, *(s.array for s in shared))
+    finally:
+        for s in shared:
+            s.close()
+
+
+def _fit_segment(task, params, initial, seed, features, y, train_mask):
+    # Kept separate from _train_segment so no views of the shared buffers outlive the call.
+    started = time.perf_counter()
+    config = TrainingConfig(dict(params, seed=seed))
+    weights, bias, metrics, _ = fit(FoldData(task, features, y), config, train_mask, ~train_mask, track_history=False, initial=initial)
+    return weights, bias, metrics, round(time.perf_counter() - started, 4)
+
+
+class HyperparameterSearch:
+    """
+    Runs search trials concurrently on a process pool under an ASHA scheduler.
+
+    A trial trains in segments that end at the scheduler's next rung: each
+    segment is one pool task that resumes from the weights the previous one
+    returned, so a trial the scheduler stops frees its worker immediately.
+    The featurized dataset is shared with workers once, as for cross-validation.
+    """
+
+    def __init__(self, pool, max_concurrent_trials=4, max_shared_bytes=1024 * 1024 * 1024):
+        self.pool = pool
+        self.max_concurrent_trials = max(1, max_concurrent_trials)
+        self.max_shared_bytes = max_shared_bytes
+
+    def run(self, data, config, space, scheduler, emit=None, check_cancelled=None):
+        """
+        Searches `space` on `data` (a TrainingData) using its train/validation
+        split, ranking trials by validation loss. `emit` receives a progress
+        event per trial segment. Returns a summary with the best trial's
+        params, metrics and fitted weights.
+        """
+        emit = emit or (lambda payload: None)
+        started = time.perf_counter()
+        rows, sampled = select_rows(data.valid, self.max_shared_bytes, config.seed)
+        features, y = share_rows(data, rows)
+        train_mask = SharedArray((rows.size,), np.bool_)
+        shared = [features, y, train_mask]
+        pending = {}
+        try:
+            train_mask.array[:] = data.train_mask[rows]
+            if not train_mask.array.any() or train_mask.array.all():
+                raise TrainingError('Hyperparameter search needs both training and validation rows (trainTestSplit below 100).')
+            specs = [s.spec for s in shared]
+            pool = self.pool()
+            base = {'learningRate': config.learning_rate, 'batchSize': config.batch_size}
+            trials = iter(enumerate(space.trials(), start=1))
+            best = None
+            completed = stopped = epochs_trained = 0
+
+            def submit(trial):
+                epochs = scheduler.next_milestone(trial['epoch']) - trial['epoch']
+                params = dict(trial['params'], epochs=epochs)
+                seed = (config.seed + trial['id'] * 7919 + trial['epoch']) % 2 ** 32
+                future = pool.submit(_train_segment, specs, data.task, params, trial['state'], seed)
+                pending[future] = (trial, epochs)
+
+            def start_next():
+                trial_id, params = next(trials, (None, None))
+                if trial_id is None:
+                    return False
+                trial = {'id': trial_id, 'params': dict(base, **params), 'epoch': 0, 'state': None}
+                emit({'log': f"Trial {trial_id} started: {_describe(params)}", 'trial': trial_id, 'status': 'running', 'params': params})
+                submit(trial)
+                return True
+
+            while len(pending) < self.max_concurrent_trials and start_next():
+                pass
+            while pending:
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if check_cancelled:
+                    check_cancelled()
+                for future in done:
+                    trial, epochs = pending.pop(future)
+                    weights, bias, metrics, seconds = future.result()
+                    trial['epoch'] += epochs
+                    trial['state'] = (weights, bias)
+                    epochs_trained += epochs
+                    keep_going = scheduler.report(trial['epoch'], metrics['loss'])
+                    if trial['epoch'] >= scheduler.max_epochs:
+                        status = 'completed'
+                        completed += 1
+                    elif keep_going:
+                        status = 'running'
+                    else:
+                        status = 'stopped'
+                        stopped += 1
+                    emit({
+                        'log': f"Trial {trial['id']} - epoch {trial['epoch']}/{scheduler.max_epochs} - loss: {metrics['loss']:.4f} - accuracy: {metrics['accuracy']/100:.4f}"
+                               + ('' if status == 'running' else f" - {status}"),
+                        'trial': trial['id'],
+                        'epoch': trial['epoch'],
+                        'loss': metrics['loss'],
+                        'accuracy': metrics['accuracy'],
+                        'status': status,
+                        'seconds': seconds
+                    })
+                    if best is None or (trial['epoch'], -metrics['loss']) > (best['epoch'], -best['metrics']['loss']):
+                        best = {'trial': trial['id'], 'params': trial['params'], 'epoch': trial['epoch'],
+                                'metrics': metrics, 'weights': weights, 'bias': bias}
+                    if status == 'running':
+                        submit(trial)
+                    else:
+                        start_next()
+        finally:
+            settle(pending)
+            for s in shared:
+                s.close()
+
+        return {
+            'bestTrial': best['trial'],
+            'bestParams': best['params'],
+            'bestEpochs': best['epoch'],
+            'metrics': best['metrics'],
+            'weights': best['weights'],
+            'bias': best['bias'],
+            'trials': completed + stopped,
+            'completedTrials': completed,
+            'stoppedTrials': stopped,
+            'epochsTrained': epochs_trained,
+            'rows': int(rows.size),
+            'sampled': sampled,
+            'elapsedSeconds': round(time.perf_counter() - started, 4)
+        }
+
+
+def _describe(params):
+    return ', '.join(f"{name}={value:.4g}" if isinstance(value, float) else f"{name}={value}" for name, value in params.items())
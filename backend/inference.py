@@ -0,0 +1,295 @@
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Number of hashed feature buckets each record is projected into.
+NUM_FEATURES = 256
+
+
+def _flatten(record, prefix=''):
+    """Yields (token, value) pairs for every leaf in a (possibly nested) record."""
+    if isinstance(record, dict):
+        for key, value in record.items():
+            yield from _flatten(value, f"{prefix}{key}.")
+    elif isinstance(record, (list, tuple)):
+        for index, value in enumerate(record):
+            yield from _flatten(value, f"{prefix}{index}.")
+    elif isinstance(record, bool) or record is None:
+        yield f"{prefix}{record}", 1.0
+    elif isinstance(record, (int, float)):
+        yield prefix, float(record)
+    else:
+        yield f"{prefix}{record}", 1.0
+
+
+def featurize(records, columns=()):
+    """
+    Projects a list of records into a dense (n_records, NUM_FEATURES) matrix
+    using the hashing trick. crc32 is used instead of hash() so features are
+    stable across processes and restarts. `columns` are extra Columns with one
+    value per record (e.g. derived geospatial features), hashed as if they
+    were fields of the records.
+    """
+    rows, cols, values = [], [], []
+    for row, record in enumerate(records):
+        for token, value in _flatten(record):
+            rows.append(row)
+            cols.append(_bucket(token))
+            values.append(value)
+
+    matrix = np.zeros((len(records), NUM_FEATURES), dtype=np.float64)
+    if rows:
+        np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), np.asarray(values))
+    _add_columns(matrix, columns, 0, None)
+    return _squash(matrix)
+
+
+def featurize_columns(columns, start=0, stop=None):
+    """
+    Column-wise equivalent of featurize() for rows [start, stop) of a
+    columnar dataset: produces the same matrix as featurizing the rows as
+    {column: value} records, without materializing any record.
+    """
+    rows = len(columns[0].values[start:stop]) if columns else 0
+    matrix = np.zeros((rows, NUM_FEATURES), dtype=np.float64)
+    _add_columns(matrix, columns, start, stop)
+    return _squash(matrix)
+
+
+def _add_columns(matrix, columns, start, stop):
+    """Adds the raw (unsquashed) hashed features of rows [start, stop) of `columns` to `matrix`."""
+    rows = np.arange(matrix.shape[0])
+    for column in columns:
+        values = column.values[start:stop]
+        null_bucket = _bucket(f"{column.name}.None")
+        if column.is_categorical:
+            buckets = np.array([_bucket(f"{column.name}.{category}") for category in column.categories] + [null_bucket], dtype=np.int64)
+            # Code -1 (null) indexes the trailing null bucket.
+            np.add.at(matrix, (rows, buckets[values]), 1.0)
+        else:
+            nulls = np.isnan(values)
+            matrix[:, _bucket(f"{column.name}.")] += np.where(nulls, 0.0, values)
+            matrix[:, null_bucket] += nulls
+
+
+def _bucket(token):
+    return zlib.crc32(token.encode('utf-8')) % NUM_FEATURES
+
+
+def _squash(matrix):
+    # Squash large raw numbers so a single field can't saturate the score.
+    return np.sign(matrix) * np.log1p(np.abs(matrix))
+
+
+class LinearScorer:
+    """
+    A linear model over hashed features, scored in one vectorized pass per batch.
+    Without trained weights it uses fixed pseudo-random ones derived from `seed`.
+    `link` is 'logistic' (sigmoid of the logit) or 'identity' (clipped to [0, 1]).
+    `geo` is an optional geospatial.GeoStage whose derived columns are added to
+    every record's features, and `preprocessor` an optional
+    preprocessing.Preprocessor applied to the records first.
+    """
+
+    def __init__(self, seed=0, weights=None, bias=0.0, link='logistic', metadata=None, geo=None, preprocessor=None):
+        if weights is None:
+            weights = np.random.default_rng(seed).normal(0.0, 1.0, NUM_FEATURES)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.link = link
+        self.metadata = metadata or {}
+        self.geo = geo
+        self.preprocessor = preprocessor
+
+    def predict_features(self, features):
+        """Returns the model output in [0, 1] for a featurized matrix."""
+        logits = features @ self.weights + self.bias
+        if getattr(self, 'link', 'logistic') == 'identity':
+            return np.clip(logits, 0.0, 1.0)
+        return 1.0 / (1.0 + np.exp(-np.clip(logits, -500, 500)))
+
+    def score(self, records):
+        """Returns an int array of prediction values in [0, 1000) for the records."""
+        geo = getattr(self, 'geo', None)
+        preprocessor = getattr(self, 'preprocessor', None)
+        derived = geo.columns_for_records(records) if geo else ()
+        if preprocessor:
+            records = preprocessor.transform_records(records)
+        return self.score_features(featurize(records, derived))
+
+    def score_columns(self, columns, start=0, stop=None):
+        """Scores rows [start, stop) of a columnar dataset without materializing records."""
+        geo = getattr(self, 'geo', None)
+        preprocessor = getattr(self, 'preprocessor', None)
+        if not geo and not preprocessor:
+            return self.score_features(featurize_columns(columns, start, stop))
+        # Derived and transformed columns cover the slice only, so they're indexed from 0.
+        derived = geo.columns_for_dataset(columns, start, stop) if geo else []
+        if preprocessor:
+            columns, start, stop = preprocessor.transform_columns(columns, start, stop), 0, None
+        matrix = np.zeros((len(columns[0].values[start:stop]), NUM_FEATURES), dtype=np.float64)
+        _add_columns(matrix, columns, start, stop)
+        _add_columns(matrix, derived, 0, None)
+        return self.score_features(_squash(matrix))
+
+    def score_features(self, features):
+        """Scores an already featurized (n_records, NUM_FEATURES) matrix."""
+        return np.minimum((self.predict_features(features) * 1000).astype(np.int64), 999)
+
+
+def format_prediction(prediction_value):
+    """Builds the prediction payload returned by /api/predict for one record."""
+    prediction_value = int(prediction_value)
+    return {
+        'riskScore': prediction_value / 10,
+        'category': 'Category B' if prediction_value > 500 else 'Category A',
+        'confidence': f"{ (prediction_value % 40) + 50 }%"  # A value between 50-90%
+    }
+
+
+class InferenceEngine:
+    """
+    Coalesces concurrent prediction requests into micro-batches.
+
+    Callers submit one or more records and block on a Future. A single
+    background worker drains the queue, waiting at most `max_wait` seconds
+    for up to `max_batch_size` records, and scores the whole batch at once.
+    Only requests for the same scorer (model) are coalesced together.
+    """
+
+    def __init__(self, scorer, max_batch_size=64, max_wait=0.005, stats_window=256):
+        self.scorer = scorer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._batch_history = deque(maxlen=stats_window)
+        self._total_batches = 0
+        self._total_records = 0
+        self._queued_records = 0
+        self._listeners = []
+
+    def on_batch(self, listener):
+        """Registers listener(size, latency_seconds), called from the worker after every scored batch."""
+        self._listeners.append(listener)
+
+    def _ensure_worker(self):
+        # Started lazily so the Flask reloader's parent process never spawns one.
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='inference-engine', daemon=True)
+            self._worker.start()
+
+    def submit(self, records, scorer=None):
+        """
+        Queues a list of records and returns a Future resolving to their prediction values.
+        `scorer` overrides the engine's default scorer for these records.
+        """
+        future = Future()
+        if not records:
+            future.set_result([])
+            return future
+        with self._cond:
+            self._ensure_worker()
+            self._queue.append((records, scorer or self.scorer, future))
+            self._queued_records += len(records)
+            self._cond.notify()
+        return future
+
+    def predict(self, records, scorer=None, timeout=None):
+        """Scores a list of records, blocking until its micro-batch has been processed."""
+        return self.submit(records, scorer).result(timeout=timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = [self._queue.popleft()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                if not self._queue:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+                    continue
+                # Never split a caller's records across batches or mix models.
+                records, scorer, _ = self._queue[0]
+                if scorer is not batch[0][1] or size + len(records) > self.max_batch_size:
+                    break
+                item = self._queue.popleft()
+                batch.append(item)
+                size += len(item[0])
+            self._queued_records -= size
+            return batch
+
+    def queued_records(self):
+        """Number of records waiting to be scored."""
+        return self._queued_records
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            records = [record for item_records, _, _ in batch for record in item_records]
+            scorer = batch[0][1]
+            started = time.perf_counter()
+            try:
+                values = scorer.score(records).tolist()
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            latency = time.perf_counter() - started
+            self._record_batch(len(records), latency)
+
+            offset = 0
+            for item_records, _, future in batch:
+                future.set_result(values[offset:offset + len(item_records)])
+                offset += len(item_records)
+
+    def _record_batch(self, size, latency):
+        with self._cond:
+            self._batch_history.append((time.time(), size, latency))
+            self._total_batches += 1
+            self._total_records += size
+        for listener in self._listeners:
+            try:
+                listener(size, latency)
+            except Exception:
+                log.exception('Batch listener failed')
+
+    def stats(self):
+        """Returns per-batch latency and throughput figures over the recent window."""
+        with self._cond:
+            history = list(self._batch_history)
+            total_batches = self._total_batches
+            total_records = self._total_records
+            queued = self._queued_records
+
+        stats = {
+            'maxBatchSize': self.max_batch_size,
+            'maxWaitMs': self.max_wait * 1000,
+            'totalBatches': total_batches,
+            'totalRecords': total_records,
+            'queuedRecords': queued,
+        }
+        if history:
+            sizes = np.array([size for _, size, _ in history], dtype=np.float64)
+            latencies = np.array([latency for _, _, latency in history], dtype=np.float64)
+            busy = latencies.sum()
+            stats.update({
+                'avgBatchSize': round(float(sizes.mean()), 2),
+                'lastBatchSize': int(sizes[-1]),
+                'lastBatchLatencyMs': round(float(latencies[-1]) * 1000, 3),
+                'p50BatchLatencyMs': round(float(np.percentile(latencies, 50)) * 1000, 3),
+                'p95BatchLatencyMs': round(float(np.percentile(latencies, 95)) * 1000, 3),
+                'recordsPerSecond': round(float(sizes.sum() / busy), 1) if busy > 0 else None,
+            })
+        return stats
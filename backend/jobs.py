@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Compact separators and no circular-reference walk: events are small, flat dicts.
+encode_json = json.JSONEncoder(separators=(',', ':'), check_circular=False).encode
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's target when the job has been cancelled."""
+
+
+class EventLog:
+    """
+    Append-only ring buffer of pre-encoded events with monotonically increasing IDs.
+
+    Each event is encoded once on append, as a complete SSE frame
+    (`id: <id_prefix><id>` plus its JSON data), and replayed from the buffer
+    to every reader. The oldest events are dropped once the buffer holds more
+    than `max_events` events or `max_bytes` bytes of encoded frames.
+    """
+
+    def __init__(self, max_events=2000, max_bytes=512 * 1024, id_prefix=''):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.id_prefix = id_prefix
+        self._events = deque()
+        self._bytes = 0
+        self.last_id = 0
+        self.dropped = 0
+
+    def append(self, payload, replaceable=False):
+        """
+        Encodes and stores a payload, returning its event ID. A `replaceable`
+        event (e.g. per-epoch progress) is superseded by later replaceable
+        events, so it may be skipped for readers that fall behind.
+        """
+        self.last_id += 1
+        frame = f"id: {self.id_prefix}{self.last_id}\ndata: {encode_json(payload)}\n\n".encode('utf-8')
+        self._events.append((self.last_id, frame, replaceable))
+        self._bytes += len(frame)
+        while len(self._events) > 1 and (len(self._events) > self.max_events or self._bytes > self.max_bytes):
+            _, evicted, _ = self._events.popleft()
+            self._bytes -= len(evicted)
+            self.dropped += 1
+        return self.last_id
+
+    def since(self, last_id):
+        """Returns the retained (id, frame, replaceable) events with an ID greater than `last_id`."""
+        if not self._events or last_id >= self.last_id:
+            return []
+        first_id = self._events[0][0]
+        start = max(0, last_id - first_id + 1)
+        return list(islice(self._events, start, None))
+
+    def __len__(self):
+        return len(self._events)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+
+class Job:
+    """
+    A unit of background work with an event stream.
+
+    The target function receives the job and reports progress through
+    `emit()`. Events go into a bounded EventLog, so any number of viewers can
+    `attach()` (or resume from an event ID) without recomputing anything;
+    attaching and detaching never affects the job itself.
+    """
+
+    def __init__(self, kind, params, max_events=2000, max_bytes=512 * 1024):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params
+        self.status = QUEUED
+        self.error = None
+        self.createdAt = time.time()
+        self.startedAt = None
+        self.finishedAt = None
+        self.viewers = 0
+        self.future = None
+        self._events = EventLog(max_events, max_bytes, id_prefix=f'{self.id}:')
+        self._cond = threading.Condition()
+        self._cancel = threading.Event()
+        # (loop, asyncio.Event) pairs for viewers attached via attach_async()
+        self._async_waiters = set()
+
+    # --- Called from the worker ---
+
+    def emit(self, payload, replaceable=False):
+        """
+        Appends an event (a JSON-serializable dict) and wakes up attached viewers.
+        Progress updates that a newer one makes redundant should be `replaceable`.
+        """
+        with self._cond:
+            event_id = self._events.append(payload, replaceable)
+            self._cond.notify_all()
+            self._wake_async()
+        return event_id
+
+    def sleep(self, seconds):
+        """Sleeps for `seconds`, raising JobCancelled as soon as the job is cancelled."""
+        if self._cancel.wait(seconds):
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def _set_status(self, status, error=None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            if status == RUNNING:
+                self.startedAt = time.time()
+            elif status in FINISHED_STATES:
+                self.finishedAt = time.time()
+            self._cond.notify_all()
+            self._wake_async()
+
+    def _wake_async(self):
+        for loop, wakeup in list(self._async_waiters):
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:  # Event loop already closed
+                self._async_waiters.discard((loop, wakeup))
+
+    # --- Called from request handlers ---
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        """Requests cancellation. Returns False if the job had already finished."""
+        if self.finished:
+            return False
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            # Never started; the pool won't run it, so finish it here.
+            self._set_status(CANCELLED)
+        return True
+
+    def attach(self, last_event_id=0, heartbeat=15.0, batch_window=0.0):
+        """
+        Yields lists of (event_id, frame, replaceable) events: first every
+        retained event after `last_event_id`, then live events until the job
+        finishes. After waking up for a live event it waits `batch_window`
+        seconds so events emitted in quick succession arrive as one list.
+        Yields None every `heartbeat` seconds without new events so the caller
+        can keep the connection alive (and notice a disconnect).
+        """
+        cursor = last_event_id
+        with self._cond:
+            self.viewers += 1
+        try:
+            while True:
+                with self._cond:
+                    waited = cursor >= self._events.last_id and not self.finished
+                    if waited:
+                        self._cond.wait(heartbeat)
+                    pending = self._events.since(cursor)
+                    done = self.finished
+                if pending and waited and batch_window and not done:
+                    time.sleep(batch_window)
+                    with self._cond:
+                        pending = self._events.since(cursor)
+                        done = self.finished
+                if pending:
+                    cursor = pending[-1][0]
+                    yield pending
+                elif not done:
+                    yield None
+                if done and cursor >= self._events.last_id:
+                    return
+        finally:
+            with self._cond:
+                self.viewers -= 1
+
+    async def attach_async(self, last_event_id=0, heartbeat=15.0, batch_window=0.0):
+        """
+        asyncio counterpart of attach(): an async generator yielding the same
+        items without blocking a thread while waiting for new events.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        wakeup = waiter[1]
+        cursor = last_event_id
+        with self._cond:
+            self.viewers += 1
+            self._async_waiters.add(waiter)
+        try:
+            while True:
+                # Cleared before reading so a concurrent emit() can't be missed.
+                wakeup.clear()
+                with self._cond:
+                    pending = self._events.since(cursor)
+                    done = self.finished
+                    last_id = self._events.last_id
+                if pending:
+                    cursor = pending[-1][0]
+                    yield pending
+                elif not done:
+                    try:
+                        await asyncio.wait_for(wakeup.wait(), heartbeat)
+                    except asyncio.TimeoutError:
+                        yield None
+                    else:
+                        if batch_window:
+                            await asyncio.sleep(batch_window)
+                if done and cursor >= last_id:
+                    return
+        finally:
+            with self._cond:
+                self.viewers -= 1
+                self._async_waiters.discard(waiter)
+
+    def to_dict(self):
+        with self._cond:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'error': self.error,
+                'params': self.params,
+                'createdAt': self.createdAt,
+                'startedAt': self.startedAt,
+                'finishedAt': self.finishedAt,
+                'viewers': self.viewers,
+                'lastEventId': self._events.last_id,
+                'bufferedEvents': len(self._events),
+                'bufferedBytes': self._events.nbytes,
+                'droppedEvents': self._events.dropped
+            }
+
+
+class JobScheduler:
+    """
+    Runs jobs on a bounded worker pool. Jobs beyond `max_workers` wait in the
+    pool's queue. Finished jobs (and their event logs) are kept for status
+    queries and replay, up to `history_limit`.
+    """
+
+    def __init__(self, max_workers=4, history_limit=100, max_events=2000, max_bytes=512 * 1024):
+        self.max_workers = max_workers
+        self.history_limit = history_limit
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created lazily so the Flask reloader's parent process never spawns workers.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+        return self._executor
+
+    def submit(self, kind, target, params):
+        """Queues target(job) for execution and returns the new Job."""
+        job = Job(kind, params, self.max_events, self.max_bytes)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            job.future = self._pool().submit(self._run, job, target)
+        return job
+
+    def _run(self, job, target):
+        if job._cancel.is_set():
+            job._set_status(CANCELLED)
+            return
+        job._set_status(RUNNING)
+        try:
+            target(job)
+        except JobCancelled:
+            job._set_status(CANCELLED)
+        except Exception as e:
+            log.exception('Job failed', extra={'jobId': job.id, 'kind': job.kind})
+            job._set_status(FAILED, str(e))
+        else:
+            job._set_status(COMPLETED)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.history_limit)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def find_latest(self, kind, include_finished=False, **params):
+        """Returns the most recent (by default unfinished) job of `kind` whose params include `params`."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in reversed(jobs):
+            if job.kind == kind and (include_finished or not job.finished) and all(job.params.get(k) == v for k, v in params.items()):
+                return job
+        return None
+
+    def list(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def queued(self):
+        """Number of jobs waiting for a worker."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.status == QUEUED)
+
+    def viewers(self):
+        """Number of event streams currently attached to any job."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sum(job.viewers for job in jobs)
@@ -0,0 +1,121 @@
+import io
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight operations per client and in total.
+
+    `acquire(client)` either takes a slot or says which cap was hit; every
+    successful acquire must be paired with `release(client)`, typically from
+    the response's close callback so the slot is held for the whole transfer.
+    """
+
+    def __init__(self, per_client, total=None):
+        self.per_client = per_client
+        self.total = total
+        self._active = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, client):
+        """Takes a slot for `client`. Returns None on success, else 'client' or 'total' for the cap that was hit."""
+        with self._lock:
+            if self._active.get(client, 0) >= self.per_client:
+                self.rejected += 1
+                return 'client'
+            if self.total is not None and self._in_flight >= self.total:
+                self.rejected += 1
+                return 'total'
+            self._active[client] = self._active.get(client, 0) + 1
+            self._in_flight += 1
+            return None
+
+    def release(self, client):
+        with self._lock:
+            remaining = self._active.get(client, 0) - 1
+            if remaining > 0:
+                self._active[client] = remaining
+            else:
+                self._active.pop(client, None)
+            self._in_flight = max(0, self._in_flight - 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'inFlight': self._in_flight,
+                'clients': len(self._active),
+                'perClientLimit': self.per_client,
+                'totalLimit': self.total,
+                'rejected': self.rejected
+            }
+
+
+class TokenBucketLimiter:
+    """
+    A token bucket per client: `rate` tokens per second refill up to `burst`,
+    and each admitted request takes one. Buckets of the least recently seen
+    clients are dropped beyond `max_clients`; a dropped bucket had been
+    refilling anyway, so it comes back full.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def take(self, client, cost=1):
+        """Takes `cost` tokens for `client`. Returns 0 on success, else the seconds until they would be available."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                tokens = self.burst
+                while len(self._buckets) >= self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                self._buckets.move_to_end(client)
+            if tokens >= cost:
+                self._buckets[client] = (tokens - cost, now)
+                return 0
+            self._buckets[client] = (tokens, now)
+            self.rejected += 1
+            return (cost - tokens) / self.rate if self.rate > 0 else math.inf
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ratePerSecond': self.rate,
+                'burst': self.burst,
+                'clients': len(self._buckets),
+                'rejected': self.rejected
+            }
+
+
+class ReleasingFile(io.FileIO):
+    """
+    A file opened for reading that calls `on_close` once when closed. Servers
+    close a response's file after sending it, so this holds a limiter slot
+    for exactly the duration of a transfer. It is a real file with a
+    fileno(), so servers can still use sendfile() for it.
+    """
+
+    def __init__(self, path, on_close):
+        super().__init__(path, 'r')
+        self._on_close = on_close
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close()
@@ -0,0 +1,193 @@
+import bisect
+import math
+import threading
+import time
+
+# Request latency buckets, in seconds.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    """
+    A named metric with optional labels. Values of each label combination
+    (a tuple in `labelnames` order) are kept in a dict guarded by one lock,
+    so recording a value costs a dict lookup and an uncontended lock.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Yields (suffix, [(label, value), ...], value) for every exposed sample."""
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield '', list(zip(self.labelnames, labels)), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed upper bounds; counts are made cumulative only when scraped."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._values.items()]
+        for labels, counts, total, count in values:
+            pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket
+                yield '_bucket', pairs + [('le', _format_value(bound))], cumulative
+            yield '_sum', pairs, total
+            yield '_count', pairs, count
+
+
+class CallbackMetric(Metric):
+    """
+    A metric read from another component when scraped, so it costs nothing
+    on the hot path. The callback returns a number, or a dict mapping label
+    tuples to numbers; None means there is no value yet.
+    """
+
+    def __init__(self, name, help, callback, kind='gauge', labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        if value is None:
+            return
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, sample in items:
+            if sample is not None:
+                yield '', list(zip(self.labelnames, labels)), sample
+
+
+class MetricsRegistry:
+    """Creates metrics and renders them in the Prometheus text exposition format."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name, help, callback, kind='gauge', labelnames=()):
+        return self._register(CallbackMetric(name, help, callback, kind, labelnames))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.help, quotes=False)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """
+    Per-endpoint request latency and in-flight counts, shared by the Flask
+    hooks and the native ASGI handlers. Latency is measured until the
+    response starts, so streaming responses count their time to first byte.
+    """
+
+    def __init__(self, registry):
+        self.latency = registry.histogram(
+            'http_request_duration_seconds', 'Time until the response started, by endpoint.',
+            ('endpoint', 'method', 'status')
+        )
+        self.in_flight = registry.gauge('http_requests_in_flight', 'Requests being handled, including open streams.')
+
+    def start(self):
+        """Counts a request as in flight and returns the token to pass to observe()."""
+        self.in_flight.inc()
+        return time.perf_counter()
+
+    def observe(self, started, endpoint, method, status):
+        self.latency.observe(time.perf_counter() - started, (endpoint or 'unmatched', method, str(status)))
+
+    def finish(self):
+        self.in_flight.dec()
+
+
+def _escape(value, quotes=True):
+    value = str(value).replace('\\', '\\\\').replace('\n', '\\n')
+    return value.replace('"', '\\"') if quotes else value
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
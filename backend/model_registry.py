@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from inference import LinearScorer, featurize
+
+log = logging.getLogger(__name__)
+
+try:
+    import onnxruntime
+except ImportError:  # onnxruntime is optional; .onnx files fall back to a placeholder scorer
+    onnxruntime = None
+
+
+class OnnxScorer:
+    """Wraps an onnxruntime session so it scores records like LinearScorer."""
+
+    def __init__(self, path):
+        self.session = onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def score(self, records):
+        return self.score_features(featurize(records))
+
+    def score_features(self, features):
+        output = np.asarray(self.session.run(None, {self.input_name: features.astype(np.float32)})[0], dtype=np.float64)
+        probabilities = output.reshape(len(features), -1)[:, -1]
+        return np.clip((probabilities * 1000).astype(np.int64), 0, 999)
+
+
+class PickleScorer:
+    """Adapts an unpickled estimator exposing predict_proba()/predict()."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def score(self, records):
+        return self.score_features(featurize(records))
+
+    def score_features(self, features):
+        if hasattr(self.estimator, 'predict_proba'):
+            probabilities = np.asarray(self.estimator.predict_proba(features))[:, -1]
+        else:
+            probabilities = np.asarray(self.estimator.predict(features), dtype=np.float64)
+        return np.clip((probabilities * 1000).astype(np.int64), 0, 999)
+
+
+def load_model(path):
+    """
+    Deserializes a model file into an object with a score(records) method.
+    Empty placeholder files (and .onnx files without onnxruntime installed)
+    get a deterministic LinearScorer seeded from the file name.
+    """
+    filename = os.path.basename(path)
+    if os.path.getsize(path) > 0:
+        if filename.endswith('.pkl'):
+            with open(path, 'rb') as f:
+                model = pickle.load(f)
+            return model if hasattr(model, 'score') else PickleScorer(model)
+        if filename.endswith('.onnx') and onnxruntime is not None:
+            return OnnxScorer(path)
+    return LinearScorer(seed=zlib.crc32(filename.encode('utf-8')))
+
+
+class ModelRegistry:
+    """
+    In-memory index of the predefined_models folder plus an LRU cache of loaded models.
+
+    The folder is scanned once on construction. A background poller re-stats it
+    every `poll_interval` seconds and only re-indexes entries whose size or
+    mtime changed, so request handlers never touch the disk for listings.
+    Loaded models are kept in an LRU cache bounded by `memory_budget` bytes.
+
+    Each file's SHA-256 is computed when it is indexed and remembered in
+    `.hashes.json` by (size, mtime), so restarts don't rehash unchanged files.
+    """
+
+    HASHES = '.hashes.json'
+
+    def __init__(self, folder, memory_budget=256 * 1024 * 1024, poll_interval=2.0, loader=load_model):
+        self.folder = folder
+        self.memory_budget = memory_budget
+        self.poll_interval = poll_interval
+        self.loader = loader
+        self._lock = threading.RLock()
+        self._entries = {}
+        self._hashes = self._read_hashes()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._listeners = []
+        self._poller = None
+        self.refresh()
+
+    # --- Index ---
+
+    def refresh(self):
+        """Re-stats the folder and updates only the entries that changed."""
+        seen = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    st = entry.stat()
+                    seen[entry.name] = (st.st_size, st.st_mtime, st.st_ctime)
+
+        # Hash new or modified files before taking the lock; listings never wait on disk reads.
+        with self._lock:
+            indexed = {name: (e['fileSize'], e['mtime']) for name, e in self._entries.items()}
+        digests = {}
+        for name, (size, mtime, _) in list(seen.items()):
+            if indexed.get(name) != (size, mtime):
+                try:
+                    digests[name] = self._content_hash(name, size, mtime)
+                except OSError:  # Removed since the scan
+                    del seen[name]
+
+        changed = []
+        with self._lock:
+            for name in list(self._entries):
+                if name not in seen:
+                    del self._entries[name]
+                    self._drop_cached(name)
+                    changed.append(name)
+            for name, (size, mtime, ctime) in seen.items():
+                current = self._entries.get(name)
+                if current and current['fileSize'] == size and current['mtime'] == mtime:
+                    continue
+                if name not in digests:  # Indexed by a concurrent refresh meanwhile
+                    continue
+                self._entries[name] = {
+                    'fileName': name,
+                    'fileSize': size,
+                    'createdAt': ctime,
+                    'mtime': mtime,
+                    'sha256': digests[name],
+                    'path': os.path.join(self.folder, name)
+                }
+                self._drop_cached(name)
+                changed.append(name)
+            listeners = list(self._listeners)
+            stale_hashes = [name for name in self._hashes if name not in seen]
+            for name in stale_hashes:
+                del self._hashes[name]
+
+        if digests or stale_hashes:
+            self._write_hashes()
+        for name in changed:
+            for listener in listeners:
+                listener(name, self.get(name))
+        return changed
+
+    def _read_hashes(self):
+        try:
+            with open(os.path.join(self.folder, self.HASHES)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_hashes(self):
+        path = os.path.join(self.folder, self.HASHES)
+        with self._lock:
+            data = json.dumps(self._hashes)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning('Could not persist model hashes: %s', e)
+
+    def _content_hash(self, name, size, mtime):
+        """Returns the SHA-256 of a model file, reusing the remembered digest if size and mtime match."""
+        with self._lock:
+            cached = self._hashes.get(name)
+        if cached and cached['size'] == size and cached['mtime'] == mtime:
+            return cached['sha256']
+        hasher = hashlib.sha256()
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._hashes[name] = {'size': size, 'mtime': mtime, 'sha256': digest}
+        return digest
+
+    def on_change(self, listener):
+        """Registers listener(name, entry_or_None) called whenever a model file appears, changes or disappears."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _ensure_poller(self):
+        if self.poll_interval and (self._poller is None or not self._poller.is_alive()):
+            self._poller = threading.Thread(target=self._poll, name='model-registry-poller', daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except OSError as e:
+                log.warning('Model registry refresh failed: %s', e)
+
+    def list(self):
+        """Returns the public metadata of every indexed model."""
+        with self._lock:
+            self._ensure_poller()
+            return [
+                {'fileName': e['fileName'], 'fileSize': e['fileSize'], 'createdAt': e['createdAt']}
+                for e in self._entries.values()
+            ]
+
+    def names(self):
+        with self._lock:
+            self._ensure_poller()
+            return list(self._entries)
+
+    def get(self, name):
+        """Returns the index entry for a model file, or None."""
+        with self._lock:
+            entry = self._entries.get(name)
+            return dict(entry) if entry else None
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._entries
+
+    # --- Loaded-model cache ---
+
+    def load(self, name):
+        """Returns the deserialized model for `name`, loading it on a cache miss. Raises KeyError if unknown."""
+        return self.load_versioned(name)[0]
+
+    def load_versioned(self, name):
+        """
+        Returns (model, sha256): the model for `name` and the content hash of
+        the file it was loaded from. Raises KeyError if unknown.
+        """
+        with self._lock:
+            self._ensure_poller()
+            if name in self._cache:
+                self._cache.move_to_end(name)
+                self._hits += 1
+                model, _, digest = self._cache[name]
+                return model, digest
+            entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(name)
+            self._misses += 1
+
+        model = self.loader(entry['path'])
+        size = max(entry['fileSize'], _estimate_size(model))
+        try:
+            st = os.stat(entry['path'])
+            unchanged = (st.st_size, st.st_mtime) == (entry['fileSize'], entry['mtime'])
+        except OSError:
+            unchanged = False
+
+        with self._lock:
+            current = self._entries.get(name)
+            if unchanged and current is not None and current['sha256'] == entry['sha256']:
+                if name in self._cache:  # Another thread loaded it meanwhile
+                    model, _, digest = self._cache[name]
+                    return model, digest
+                self._cache[name] = (model, size, entry['sha256'])
+                self._cache_bytes += size
+                while self._cache_bytes > self.memory_budget and len(self._cache) > 1:
+                    evicted, (_, evicted_size, _) = self._cache.popitem(last=False)
+                    self._cache_bytes -= evicted_size
+                    self._evictions += 1
+                return model, entry['sha256']
+
+        # Replaced or removed around the load, so the model may not match the entry's hash: re-index and retry.
+        self.refresh()
+        return self.load_versioned(name)
+
+    def _drop_cached(self, name):
+        cached = self._cache.pop(name, None)
+        if cached:
+            self._cache_bytes -= cached[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'indexedModels': len(self._entries),
+                'loadedModels': len(self._cache),
+                'cacheBytes': self._cache_bytes,
+                'memoryBudget': self.memory_budget,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hitRate': round(self._hits / lookups, 4) if lookups else None
+            }
+
+
+def _estimate_size(model):
+    weights = getattr(model, 'weights', None)
+    if isinstance(weights, np.ndarray):
+        return weights.nbytes
+    return 0
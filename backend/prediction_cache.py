@@ -0,0 +1,237 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+_canonical_json = json.JSONEncoder(sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode
+
+
+def prediction_key(version, record):
+    """
+    A 16-byte digest of a model version and a record's canonical JSON (sorted
+    keys, no whitespace), so equal records get the same key in every process.
+    """
+    hasher = hashlib.blake2b(version.encode('utf-8'), digest_size=16)
+    hasher.update(b'\0')
+    hasher.update(_canonical_json(record).encode('utf-8'))
+    return hasher.digest()
+
+
+class SharedPredictionStore:
+    """
+    Prediction values in a local SQLite file (WAL mode), so worker processes
+    on one host reuse each other's results. Rows expire after `ttl` seconds
+    (0 for never) and the table is trimmed back to `max_entries` as writes accumulate.
+    """
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS predictions (key BLOB PRIMARY KEY, value INTEGER NOT NULL, expires REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_predictions_expires ON predictions (expires)",
+    ]
+    # SQLite's default limit on bound parameters is 999.
+    MAX_PARAMS = 500
+
+    def __init__(self, path, ttl=3600, max_entries=1000000, trim_every=1000, timeout=5.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.trim_every = trim_every
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._writes = 0
+        with self._lock, self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def get_many(self, keys):
+        """Returns {key: value} for the keys that are stored and unexpired."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(keys), self.MAX_PARAMS):
+                chunk = keys[i:i + self.MAX_PARAMS]
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM predictions WHERE key IN ({','.join('?' * len(chunk))}) AND expires > ?",
+                    (*chunk, now)
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_many(self, items):
+        expires = time.time() + self.ttl if self.ttl else float('inf')
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO predictions (key, value, expires) VALUES (?, ?, ?)",
+                [(key, value, expires) for key, value in items]
+            )
+            self._writes += len(items)
+            if self._writes >= self.trim_every:
+                self._writes = 0
+                self._trim()
+
+    def _trim(self):
+        self._conn.execute("DELETE FROM predictions WHERE expires <= ?", (time.time(),))
+        excess = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM predictions WHERE key IN (SELECT key FROM predictions ORDER BY expires LIMIT ?)", (excess,)
+            )
+
+
+class PredictionCache:
+    """
+    Memoizes prediction values by (model version, canonical record).
+
+    The model version is the model file's content hash, so retraining or
+    replacing a model never serves its predecessor's results. Entries live in
+    an in-process LRU bounded by `max_entries` and expire after `ttl` seconds
+    (0 for never); an optional SharedPredictionStore is consulted on a local
+    miss and written behind by a background thread, so other workers'
+    results are reused too without scoring ever waiting on a disk commit.
+    At most `max_pending_writes` batches wait for that thread; newer ones
+    are only cached locally.
+    """
+
+    def __init__(self, max_entries=100000, ttl=600, shared=None, max_pending_writes=64):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.max_pending_writes = max_pending_writes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = None
+        self._pending_writes = 0
+        self.dropped_writes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get_many(self, keys):
+        """Returns a value (or None on a miss) per key."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry and (not self.ttl or entry[1] > now):
+                    self._entries.move_to_end(key)
+                    values.append(entry[0])
+                else:
+                    values.append(None)
+
+        missing = [key for key, value in zip(keys, values) if value is None]
+        found = {}
+        if missing and self.shared:
+            try:
+                found = self.shared.get_many(missing)
+            except sqlite3.Error as e:
+                log.warning('Shared prediction cache read failed: %s', e)
+            if found:
+                values = [found.get(key, value) if value is None else value for key, value in zip(keys, values)]
+                self._store(found.items())
+
+        with self._lock:
+            self.shared_hits += len(found)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing) - len(found)
+        return values
+
+    def put_many(self, items, shared=True):
+        items = list(items)
+        self._store(items)
+        if not (shared and self.shared):
+            return
+        with self._lock:
+            if self._pending_writes >= self.max_pending_writes:
+                self.dropped_writes += 1
+                return
+            self._pending_writes += 1
+            if self._writer is None:
+                # Created lazily so the Flask reloader's parent process never spawns the thread.
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prediction-cache-writer')
+        self._writer.submit(self._write_shared, items)
+
+    def _write_shared(self, items):
+        try:
+            self.shared.put_many(items)
+        except sqlite3.Error as e:
+            log.warning('Shared prediction cache write failed: %s', e)
+        finally:
+            with self._lock:
+                self._pending_writes -= 1
+
+    def _store(self, items):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = (value, expires)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def submit(self, version, records, compute):
+        """
+        Returns a Future resolving to a value per record. Cached values are
+        used as-is; the remaining distinct records are passed to
+        compute(records) -> Future and their values cached once it resolves.
+        """
+        if not self.enabled:
+            return compute(records)
+        keys = [prediction_key(version, record) for record in records]
+        values = self.get_many(keys)
+        result = Future()
+        # Duplicates within a request are scored once.
+        pending = {}
+        for index, (key, value) in enumerate(zip(keys, values)):
+            if value is None:
+                pending.setdefault(key, index)
+        if not pending:
+            result.set_result(values)
+            return result
+
+        def resolve(future):
+            try:
+                computed = dict(zip(pending, future.result()))
+            except Exception as e:
+                result.set_exception(e)
+                return
+            result.set_result([computed[key] if value is None else value for key, value in zip(keys, values)])
+            self.put_many(computed.items())
+
+        compute([records[index] for index in pending.values()]).add_done_callback(resolve)
+        return result
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'shared': self.shared.path if self.shared else None,
+                'hits': self.hits,
+                'sharedHits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'pendingSharedWrites': self._pending_writes,
+                'droppedSharedWrites': self.dropped_writes,
+                'hitRate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,331 @@
+import json
+import os
+
+import numpy as np
+
+from columnar import Column, ColumnarDataset
+
+# Rows per fit task; larger datasets are fitted in parallel chunks on the process pool.
+CHUNK_ROWS = 1 << 18
+# Items kept per level of a quantile sketch; the median is accurate to roughly 1/SKETCH_SIZE of the rank.
+SKETCH_SIZE = 256
+
+MISSING_OPTIONS = ('none', 'impute_mean', 'impute_median', 'drop_row')
+CLEANING_OPTIONS = ('none', 'remove_duplicates', 'trim_whitespace')
+SCALING_OPTIONS = ('none', 'standard_scaler', 'min_max_scaler')
+
+_FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch (KLL-style compactor levels). Items at level h
+    stand for 2**h values; when a level holds more than `size` items it is
+    sorted and every other item is promoted, so memory stays O(size * log n)
+    and sketches built over separate chunks merge into one for the whole column.
+    """
+
+    def __init__(self, size=SKETCH_SIZE):
+        self.size = size
+        self.levels = []
+        self._compactions = 0
+
+    def update(self, values):
+        self._add(0, np.asarray(values, dtype=np.float64))
+        self._compact()
+
+    def merge(self, other):
+        for height, items in enumerate(other.levels):
+            self._add(height, items)
+        self._compact()
+        return self
+
+    def _add(self, height, items):
+        while len(self.levels) <= height:
+            self.levels.append(np.empty(0, dtype=np.float64))
+        self.levels[height] = np.concatenate((self.levels[height], items))
+
+    def _compact(self):
+        height = 0
+        while height < len(self.levels):
+            items = self.levels[height]
+            if items.size > self.size:
+                items = np.sort(items)
+                # Odd leftovers stay at this level; alternating offsets keep the sketch unbiased.
+                keep = items.size % 2
+                self._compactions += 1
+                self._add(height + 1, items[keep + self._compactions % 2::2])
+                self.levels[height] = items[:keep]
+            height += 1
+
+    def quantile(self, q):
+        """The approximate q-quantile (0 <= q <= 1), or NaN for an empty sketch."""
+        items = np.concatenate(self.levels) if self.levels else np.empty(0)
+        if not items.size:
+            return float('nan')
+        weights = np.concatenate([np.full(level.size, 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        cumulative = np.cumsum(weights[order])
+        return float(items[order][np.searchsorted(cumulative, q * cumulative[-1])])
+
+
+class ColumnStats:
+    """
+    Count, nulls, mean, variance (M2), min and max of a numeric column, plus
+    an optional QuantileSketch. Partial stats over chunks combine exactly with
+    merge() (Chan et al.'s pairwise update), in any grouping.
+    """
+
+    def __init__(self, quantiles=False):
+        self.count = 0
+        self.nulls = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        self.sketch = QuantileSketch() if quantiles else None
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        present = values[~np.isnan(values)]
+        self.nulls += values.size - present.size
+        if not present.size:
+            return self
+        chunk = ColumnStats()
+        chunk.count = present.size
+        chunk.mean = float(present.mean())
+        chunk.m2 = float(np.sum((present - chunk.mean) ** 2))
+        chunk.min, chunk.max = float(present.min()), float(present.max())
+        if self.sketch is not None:
+            self.sketch.update(present)
+        return self._combine(chunk)
+
+    def merge(self, other):
+        self.nulls += other.nulls
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        return self._combine(other)
+
+    def _combine(self, other):
+        if not other.count:
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    @property
+    def std(self):
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+    @property
+    def median(self):
+        return self.sketch.quantile(0.5) if self.sketch is not None else float('nan')
+
+
+def _choice(value, options, enabled):
+    """Maps a ModelParameters value to one of `options`; a bare true (checkbox UIs) selects `enabled`."""
+    if value is True or (isinstance(value, str) and value.strip().lower() == 'true'):
+        return enabled
+    return value if value in options else 'none'
+
+
+def parse_options(params):
+    """Returns (handleMissingData, dataCleaning, featureScaling) from ModelParameters."""
+    return (
+        _choice(params.get('handleMissingData'), MISSING_OPTIONS, 'impute_mean'),
+        _choice(params.get('dataCleaning'), CLEANING_OPTIONS, 'remove_duplicates'),
+        _choice(params.get('featureScaling'), SCALING_OPTIONS, 'standard_scaler')
+    )
+
+
+def _row_hashes(columns, code_maps, start, stop):
+    """A 64-bit FNV-style hash of every row in [start, stop); equal rows hash equally."""
+    rows = len(columns[0].values[start:stop])
+    hashes = np.full(rows, _FNV_OFFSET, dtype=np.uint64)
+    for column in columns:
+        values = np.asarray(column.values[start:stop])
+        if column.is_categorical:
+            if column.name in code_maps:
+                values = code_maps[column.name][values]
+            bits = values.astype(np.int64).view(np.uint64)
+        else:
+            # One bit pattern for NaN and for ±0.0.
+            bits = np.where(np.isnan(values), np.nan, values + 0.0).view(np.uint64)
+        hashes ^= bits
+        hashes *= _FNV_PRIME
+        hashes ^= hashes >> np.uint64(29)
+    return hashes
+
+
+def _fit_chunk(columns, plan, start, stop):
+    """Fits one chunk: (stats by column, row hashes or None, incomplete-row mask or None)."""
+    by_name = {c.name: c for c in columns}
+    stats = {name: ColumnStats(plan['quantiles']).update(by_name[name].values[start:stop]) for name in plan['stats']}
+    hashes = _row_hashes(columns, plan['code_maps'], start, stop) if plan['dedupe'] else None
+    incomplete = None
+    if plan['complete']:
+        incomplete = np.zeros(len(columns[0].values[start:stop]), dtype=bool)
+        for name in plan['complete']:
+            values = by_name[name].values[start:stop]
+            incomplete |= values < 0 if by_name[name].is_categorical else np.isnan(values)
+    return stats, hashes, incomplete
+
+
+def _fit_chunk_at(path, plan, start, stop):
+    # Runs in a pool worker: reopens the memory-mapped dataset instead of pickling its columns.
+    with open(os.path.join(path, 'meta.json')) as f:
+        dataset = ColumnarDataset(path, json.load(f))
+    return _fit_chunk(dataset.columns, plan, start, stop)
+
+
+class Preprocessor:
+    """
+    The fitted handleMissingData / dataCleaning / featureScaling transform.
+
+    Fitting is one streaming pass over the dataset in chunks of CHUNK_ROWS:
+    each chunk yields mergeable ColumnStats (and row hashes for deduplication,
+    or null flags for drop_row), run in parallel on a process pool for large
+    datasets. Dropping rows (drop_row, remove_duplicates) only affects
+    training and is returned as a row mask rather than copying data; the
+    per-column transforms (imputation, scaling, trimmed categories) are
+    pickled with the model so /api/predict applies them to each batch.
+    """
+
+    def __init__(self, missing, cleaning, scaling):
+        self.missing = missing
+        self.cleaning = cleaning
+        self.scaling = scaling
+        # name -> (fill value or None, shift, scale) for numeric columns.
+        self.numeric = {}
+        # name -> (trimmed categories, old code -> new code map) for string columns.
+        self.categories = {}
+        self.report = {}
+
+    @classmethod
+    def fit(cls, dataset, feature_columns, params, pool=None):
+        """
+        Fits the options in `params` to `feature_columns` of a ColumnarDataset.
+        Returns (preprocessor, keep) where keep is a boolean row mask (or None
+        if no rows are dropped); (None, None) if every option is 'none'.
+        `pool` is a callable returning a process pool for datasets over one chunk.
+        """
+        self = cls(*parse_options(params))
+        if (self.missing, self.cleaning, self.scaling) == ('none', 'none', 'none'):
+            return None, None
+
+        if self.cleaning == 'trim_whitespace':
+            for column in feature_columns:
+                if column.is_categorical and column.kind != 'boolean':
+                    trimmed = [str(c).strip() for c in column.categories]
+                    unique = list(dict.fromkeys(trimmed))
+                    if len(unique) < len(trimmed) or unique != column.categories:
+                        positions = {c: i for i, c in enumerate(unique)}
+                        # Trailing -1 keeps null codes null when indexed with -1.
+                        self.categories[column.name] = (unique, np.array([positions[c] for c in trimmed] + [-1], dtype=np.int32))
+
+        numeric = [c.name for c in feature_columns if not c.is_categorical]
+        impute = self.missing in ('impute_mean', 'impute_median')
+        plan = {
+            'stats': numeric if impute or self.scaling != 'none' else [],
+            'quantiles': self.missing == 'impute_median',
+            'dedupe': self.cleaning == 'remove_duplicates',
+            'complete': [c.name for c in feature_columns] if self.missing == 'drop_row' else [],
+            'code_maps': {name: codes for name, (_, codes) in self.categories.items()}
+        }
+
+        chunks = [(start, min(dataset.rows, start + CHUNK_ROWS)) for start in range(0, dataset.rows, CHUNK_ROWS)]
+        if pool and len(chunks) > 1:
+            executor = pool()
+            futures = [executor.submit(_fit_chunk_at, dataset.path, plan, start, stop) for start, stop in chunks]
+            results = [future.result() for future in futures]
+        else:
+            results = [_fit_chunk(dataset.columns, plan, start, stop) for start, stop in chunks]
+
+        stats = {name: ColumnStats(plan['quantiles']) for name in plan['stats']}
+        for chunk_stats, _, _ in results:
+            for name, partial in chunk_stats.items():
+                stats[name].merge(partial)
+
+        for name, column_stats in stats.items():
+            fill = None
+            if impute and column_stats.nulls and column_stats.count:
+                fill = column_stats.mean if self.missing == 'impute_mean' else column_stats.median
+            shift, scale = 0.0, 1.0
+            if self.scaling == 'standard_scaler' and column_stats.count:
+                shift, scale = column_stats.mean, column_stats.std or 1.0
+            elif self.scaling == 'min_max_scaler' and column_stats.count:
+                shift, scale = column_stats.min, (column_stats.max - column_stats.min) or 1.0
+            if fill is not None or (shift, scale) != (0.0, 1.0):
+                self.numeric[name] = (fill, shift, scale)
+
+        keep = None
+        if plan['dedupe'] and dataset.rows:
+            hashes = np.concatenate([h for _, h, _ in results])
+            _, first = np.unique(hashes, return_index=True)
+            keep = np.zeros(dataset.rows, dtype=bool)
+            keep[first] = True
+            self.report['duplicateRows'] = int(dataset.rows - first.size)
+        if plan['complete'] and dataset.rows:
+            complete = ~np.concatenate([i for _, _, i in results])
+            self.report['droppedRows'] = int(dataset.rows - np.count_nonzero(complete))
+            keep = complete if keep is None else keep & complete
+        self.report['chunks'] = len(chunks)
+        self.report['parallel'] = bool(pool and len(chunks) > 1)
+        return self, keep
+
+    def transform_columns(self, columns, start=0, stop=None):
+        """Returns the Columns for rows [start, stop) with the fitted transforms applied, indexed from 0."""
+        transformed = []
+        for column in columns:
+            values = column.values[start:stop]
+            categories = column.categories
+            if column.name in self.numeric:
+                fill, shift, scale = self.numeric[column.name]
+                values = np.asarray(values, dtype=np.float64)
+                if fill is not None:
+                    values = np.where(np.isnan(values), fill, values)
+                values = (values - shift) / scale
+            elif column.name in self.categories:
+                categories, codes = self.categories[column.name]
+                values = codes[values]
+            transformed.append(Column(column.name, column.kind, values, categories))
+        return transformed
+
+    def transform_records(self, records):
+        """Applies the fitted transforms to /api/predict records, returning new dicts."""
+        transformed = []
+        for record in records:
+            if not isinstance(record, dict):
+                transformed.append(record)
+                continue
+            record = dict(record)
+            for name, (fill, shift, scale) in self.numeric.items():
+                value = record.get(name)
+                if value is None and fill is not None:
+                    value = fill
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    record[name] = (value - shift) / scale
+            if self.cleaning == 'trim_whitespace':
+                for name, value in record.items():
+                    if isinstance(value, str):
+                        record[name] = value.strip()
+            transformed.append(record)
+        return transformed
+
+    def describe(self):
+        return {
+            'handleMissingData': self.missing,
+            'dataCleaning': self.cleaning,
+            'featureScaling': self.scaling,
+            'columns': {
+                name: {'fill': fill, 'shift': shift, 'scale': scale}
+                for name, (fill, shift, scale) in self.numeric.items()
+            },
+            'trimmedColumns': sorted(self.categories),
+            **self.report
+        }
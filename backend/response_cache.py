@@ -0,0 +1,80 @@
+import hashlib
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Pre-serialized JSON responses for read-heavy collections, with strong ETags.
+
+    Each collection has a version counter that writers bump via `bump()`.
+    A cached body is served for as long as its collection's version is
+    unchanged, so a repeated read costs a dict lookup and no JSON encoding.
+    Collections in `shared_collections` are also checked against
+    shared_version(collection), the storage's own write counter, so writes
+    made by other processes invalidate them too.
+    The ETag is a digest of the body, so it stays stable across rebuilds and
+    processes. `ttl` (seconds, 0 for none) additionally bounds an entry's age.
+    """
+
+    def __init__(self, dumps, ttl=0, max_entries_per_collection=256, shared_version=None, shared_collections=()):
+        self.dumps = dumps
+        self.ttl = ttl
+        self.max_entries_per_collection = max_entries_per_collection
+        self.shared_version = shared_version
+        self.shared_collections = frozenset(shared_collections)
+        self._versions = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def bump(self, collection):
+        """Invalidates every cached response of a collection after a write."""
+        with self._lock:
+            self._versions[collection] = self._versions.get(collection, 0) + 1
+            self._entries.pop(collection, None)
+
+    def version(self, collection):
+        with self._lock:
+            return self._versions.get(collection, 0)
+
+    def get(self, collection, key, build):
+        """
+        Returns (body_bytes, etag, headers) for `key` within a collection.
+        On a miss, build() returns (payload, headers) and only the payload is
+        serialized; headers (or None) are cached alongside the body.
+        """
+        now = time.monotonic()
+        shared = self.shared_version(collection) if collection in self.shared_collections else None
+        with self._lock:
+            version = (self._versions.get(collection, 0), shared)
+            entry = self._entries.get(collection, {}).get(key)
+            if entry and entry[0] == version and (not self.ttl or entry[1] > now):
+                self.hits += 1
+                return entry[2], entry[3], entry[4]
+            self.misses += 1
+
+        payload, headers = build()
+        body = self.dumps(payload).encode('utf-8') + b'\n'
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+        with self._lock:
+            # Only cache if no write happened while building; otherwise the next read rebuilds.
+            if self._versions.get(collection, 0) == version[0]:
+                entries = self._entries.setdefault(collection, {})
+                if key not in entries and len(entries) >= self.max_entries_per_collection:
+                    entries.pop(next(iter(entries)))
+                entries[key] = (version, now + self.ttl, body, etag, headers)
+        return body, etag, headers
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'collections': dict(self._versions),
+                'entries': sum(len(entries) for entries in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': round(self.hits / lookups, 4) if lookups else None
+            }
@@ -0,0 +1,48 @@
+HEARTBEAT = b': keep-alive\n\n'
+
+
+class SSEWriter:
+    """
+    Turns the event batches of Job.attach() / attach_async() into SSE writes
+    for one client.
+
+    Events are stored as pre-encoded frames, so a batch becomes one write by
+    joining bytes; a heartbeat (None) becomes a comment frame. A client is
+    treated as slow while its batches hold more than `max_backlog` events or
+    its previous write took longer than `slow_write_seconds`. For a slow
+    client, replaceable events (per-epoch progress) are coalesced to the
+    latest one in each batch, so it catches up with the job instead of
+    working through every intermediate update. The first batch is the replay
+    of the job's history and is always sent in full.
+    """
+
+    def __init__(self, max_backlog=64, slow_write_seconds=0.5):
+        self.max_backlog = max_backlog
+        self.slow_write_seconds = slow_write_seconds
+        self.slow = False
+        self.replayed = False
+        self.events = 0
+        self.coalesced = 0
+
+    def encode(self, batch):
+        """Returns the bytes to write for a batch of events (or a heartbeat for None)."""
+        if batch is None:
+            return HEARTBEAT
+        behind = self.slow or (self.replayed and len(batch) > self.max_backlog)
+        self.replayed = True
+        if behind and len(batch) > 1:
+            frames = self._coalesce(batch)
+        else:
+            frames = [frame for _, frame, _ in batch]
+        self.events += len(frames)
+        return b''.join(frames)
+
+    def _coalesce(self, batch):
+        latest = max((i for i, (_, _, replaceable) in enumerate(batch) if replaceable), default=None)
+        frames = [frame for i, (_, frame, replaceable) in enumerate(batch) if not replaceable or i == latest]
+        self.coalesced += len(batch) - len(frames)
+        return frames
+
+    def wrote(self, seconds):
+        """Records how long the previous write took to be accepted by the connection."""
+        self.slow = seconds > self.slow_write_seconds
@@ -0,0 +1,492 @@
+import bisect
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+def hash_api_key(key):
+    """SHA-256 hex digest used to index API keys without comparing raw secrets."""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def mask_api_key(key):
+    """The display form of a key ("sk_ab...wxyz"); only this and the digest are ever stored."""
+    return f"{key[:5]}...{key[-4:]}"
+
+
+class Storage:
+    """
+    Interface for persisting projects and API keys.
+    Projects and keys are plain dicts shaped exactly like the API responses.
+    """
+
+    # --- Projects ---
+
+    def create_project(self, project):
+        raise NotImplementedError
+
+    def get_project(self, project_id):
+        raise NotImplementedError
+
+    def list_projects(self):
+        raise NotImplementedError
+
+    def query_projects(self, owner=None, domain_type=None, created_after=None, created_before=None,
+                       sort='createdAt', descending=False, after=None, limit=50):
+        """
+        Returns (projects, has_more): up to `limit` projects matching the
+        filters, ordered by (`sort`, id), starting after the `after` position
+        (a (sort_value, id) pair taken from the last project of the previous
+        page). createdAt bounds are inclusive below and exclusive above.
+        A `limit` of None returns every matching project.
+        """
+        raise NotImplementedError
+
+    # --- API keys ---
+
+    def list_api_keys(self):
+        raise NotImplementedError
+
+    def get_api_key(self, key_id):
+        raise NotImplementedError
+
+    def get_api_key_by_hash(self, key_hash):
+        raise NotImplementedError
+
+    def add_api_key(self, api_key, key_hash):
+        """
+        Stores a key. api_key['key'] is kept as given, so it must already be
+        the masked display form; requests are matched by `key_hash`. A key
+        stored with a None hash is display-only and never authenticates.
+        """
+        raise NotImplementedError
+
+    def replace_api_key(self, api_key, key_hash):
+        """Like add_api_key, but first drops any key with the same id or hash."""
+        raise NotImplementedError
+
+    def delete_api_key(self, key_id):
+        """Deletes a key. Returns True if it existed."""
+        raise NotImplementedError
+
+    def set_api_key_status(self, key_id, status):
+        """Updates a key's status. Returns the updated key, or None if it doesn't exist."""
+        raise NotImplementedError
+
+    def count_api_keys(self):
+        raise NotImplementedError
+
+    def next_api_key_id(self):
+        """Returns the next free "sk-<n>" id, starting from the number of keys plus one."""
+        n = self.count_api_keys() + 1
+        while self.get_api_key(f"sk-{n}") is not None:
+            n += 1
+        return f"sk-{n}"
+
+    # --- Collection versions ---
+
+    def collection_version(self, collection):
+        """
+        Returns a counter that every write to a collection ("projects" or
+        "keys") increments, so caches can tell whether stored data changed.
+        """
+        raise NotImplementedError
+
+    def seed_api_keys(self, api_keys):
+        """Inserts the given keys as display-only rows if no key has been stored yet."""
+        if self.count_api_keys() == 0:
+            for api_key in api_keys:
+                self.add_api_key(dict(api_key), None)
+
+    def close(self):
+        pass
+
+
+class MemoryStorage(Storage):
+    """
+    Process-local storage backed by dicts. Nothing survives a restart.
+    Projects are indexed by (createdAt, id), overall and per owner and
+    domainType, in sorted lists maintained on insert.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._projects = {}
+        self._projects_by_created = []
+        self._projects_by_owner = {}
+        self._projects_by_domain_type = {}
+        self._keys = {}
+        self._keys_by_hash = {}
+        self._hashes = {}
+        self._versions = {}
+
+    def create_project(self, project):
+        with self._lock:
+            self._projects[project['id']] = dict(project)
+            position = (project['createdAt'], project['id'])
+            bisect.insort(self._projects_by_created, position)
+            bisect.insort(self._projects_by_owner.setdefault(project['owner'], []), position)
+            bisect.insort(self._projects_by_domain_type.setdefault(project['domainType'], []), position)
+            self._bump('projects')
+        return project
+
+    def get_project(self, project_id):
+        with self._lock:
+            project = self._projects.get(project_id)
+            return dict(project) if project else None
+
+    def list_projects(self):
+        with self._lock:
+            return [dict(project) for project in self._projects.values()]
+
+    def query_projects(self, owner=None, domain_type=None, created_after=None, created_before=None,
+                       sort='createdAt', descending=False, after=None, limit=50):
+        with self._lock:
+            # Walk the narrowest index; the other equality filter is checked per project.
+            candidates = [self._projects_by_created]
+            if owner is not None:
+                candidates.append(self._projects_by_owner.get(owner, []))
+            if domain_type is not None:
+                candidates.append(self._projects_by_domain_type.get(domain_type, []))
+            index = min(candidates, key=len)
+
+            lo = 0 if created_after is None else bisect.bisect_left(index, (created_after,))
+            hi = len(index) if created_before is None else bisect.bisect_left(index, (created_before,))
+            if sort == 'createdAt' and after is not None:
+                if descending:
+                    hi = min(hi, bisect.bisect_left(index, tuple(after)))
+                else:
+                    lo = max(lo, bisect.bisect_right(index, tuple(after)))
+            positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+
+            def matches(project):
+                return ((owner is None or project['owner'] == owner)
+                        and (domain_type is None or project['domainType'] == domain_type))
+
+            if sort == 'createdAt':
+                page = []
+                for i in positions:
+                    project = self._projects[index[i][1]]
+                    if matches(project):
+                        page.append(dict(project))
+                        if limit is not None and len(page) > limit:
+                            break
+            else:
+                keyed = sorted(
+                    ((_sort_value(project, sort), project['id']), project)
+                    for project in (self._projects[index[i][1]] for i in range(lo, hi)) if matches(project)
+                )
+                if descending:
+                    keyed.reverse()
+                if after is not None:
+                    after = tuple(after)
+                    keyed = [item for item in keyed if (item[0] < after if descending else item[0] > after)]
+                page = [dict(project) for _, project in (keyed if limit is None else keyed[:limit + 1])]
+        if limit is None:
+            return page, False
+        return page[:limit], len(page) > limit
+
+    def list_api_keys(self):
+        with self._lock:
+            return [_copy_key(key) for key in self._keys.values()]
+
+    def get_api_key(self, key_id):
+        with self._lock:
+            key = self._keys.get(key_id)
+            return _copy_key(key) if key else None
+
+    def get_api_key_by_hash(self, key_hash):
+        with self._lock:
+            key = self._keys_by_hash.get(key_hash)
+            return _copy_key(key) if key else None
+
+    def add_api_key(self, api_key, key_hash):
+        with self._lock:
+            self._store_key(api_key, key_hash)
+        return api_key
+
+    def replace_api_key(self, api_key, key_hash):
+        with self._lock:
+            previous = self._keys_by_hash.pop(key_hash, None)
+            if previous is not None:
+                self._keys.pop(previous['id'], None)
+                self._hashes.pop(previous['id'], None)
+            if self._keys.pop(api_key['id'], None) is not None:
+                self._keys_by_hash.pop(self._hashes.pop(api_key['id'], None), None)
+            self._store_key(api_key, key_hash)
+        return api_key
+
+    def _store_key(self, api_key, key_hash):
+        # Called with the lock held.
+        stored = _copy_key(api_key)
+        self._keys[stored['id']] = stored
+        if key_hash is not None:
+            self._keys_by_hash[key_hash] = stored
+            self._hashes[stored['id']] = key_hash
+        self._bump('keys')
+
+    def delete_api_key(self, key_id):
+        with self._lock:
+            key = self._keys.pop(key_id, None)
+            if key is None:
+                return False
+            self._keys_by_hash.pop(self._hashes.pop(key_id, None), None)
+            self._bump('keys')
+            return True
+
+    def set_api_key_status(self, key_id, status):
+        with self._lock:
+            key = self._keys.get(key_id)
+            if key is None:
+                return None
+            key['status'] = status
+            self._bump('keys')
+            return _copy_key(key)
+
+    def count_api_keys(self):
+        with self._lock:
+            return len(self._keys)
+
+    def collection_version(self, collection):
+        with self._lock:
+            return self._versions.get(collection, 0)
+
+    def _bump(self, collection):
+        # Called with the lock held.
+        self._versions[collection] = self._versions.get(collection, 0) + 1
+
+
+class SQLiteStorage(Storage):
+    """
+    SQLite storage in WAL mode, shareable across worker processes.
+
+    Connections come from a fixed-size pool. All SQL is parameterized with
+    constant statement text, so sqlite3's per-connection statement cache
+    reuses the prepared statements.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS projects (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            description TEXT,
+            owner TEXT,
+            domain_type TEXT,
+            created_at NUMERIC
+        )""",
+        # (filter, created_at, id) indexes serve keyset pagination without a sort step.
+        "CREATE INDEX IF NOT EXISTS idx_projects_created ON projects (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_projects_owner_created ON projects (owner, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_projects_domain_type_created ON projects (domain_type, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_projects_name ON projects (COALESCE(name, ''), id)",
+        """CREATE TABLE IF NOT EXISTS api_keys (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            key TEXT NOT NULL,
+            key_hash TEXT,
+            status TEXT NOT NULL,
+            created_at NUMERIC,
+            permissions TEXT NOT NULL
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys (key_hash)",
+        # Bumped in the same transaction as every write, so all processes see when a collection changed.
+        """CREATE TABLE IF NOT EXISTS versions (
+            collection TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )""",
+    ]
+
+    BUMP_VERSION = ("INSERT INTO versions (collection, version) VALUES (?, 1) "
+                    "ON CONFLICT (collection) DO UPDATE SET version = version + 1")
+
+    PROJECT_COLUMNS = "id, name, description, owner, domain_type, created_at"
+    KEY_COLUMNS = "id, name, key, status, created_at, permissions"
+
+    def __init__(self, path, pool_size=8, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pool = queue.Queue()
+        for _ in range(pool_size):
+            self._pool.put(self._connect())
+        with self._connection() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, cached_statements=64)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrows a pooled connection for one transaction."""
+        conn = self._pool.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._pool.put(conn)
+
+    # --- Projects ---
+
+    def create_project(self, project):
+        with self._connection() as conn:
+            conn.execute(
+                f"INSERT INTO projects ({self.PROJECT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+                (project['id'], project['name'], project['description'], project['owner'],
+                 project['domainType'], project['createdAt'])
+            )
+            conn.execute(self.BUMP_VERSION, ('projects',))
+        return project
+
+    def get_project(self, project_id):
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {self.PROJECT_COLUMNS} FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return _project_from_row(row) if row else None
+
+    def list_projects(self):
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT {self.PROJECT_COLUMNS} FROM projects ORDER BY rowid").fetchall()
+        return [_project_from_row(row) for row in rows]
+
+    SORT_COLUMNS = {'createdAt': 'created_at', 'name': "COALESCE(name, '')"}
+
+    def query_projects(self, owner=None, domain_type=None, created_after=None, created_before=None,
+                       sort='createdAt', descending=False, after=None, limit=50):
+        column = self.SORT_COLUMNS[sort]
+        clauses, params = [], []
+        for clause, value in (("owner = ?", owner), ("domain_type = ?", domain_type),
+                              ("created_at >= ?", created_after), ("created_at < ?", created_before)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        if after is not None:
+            clauses.append(f"({column}, id) {'<' if descending else '>'} (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = 'DESC' if descending else 'ASC'
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {self.PROJECT_COLUMNS} FROM projects {where} "
+                f"ORDER BY {column} {direction}, id {direction} LIMIT ?",
+                (*params, -1 if limit is None else limit + 1)  # LIMIT -1: no limit
+            ).fetchall()
+        if limit is None:
+            return [_project_from_row(row) for row in rows], False
+        return [_project_from_row(row) for row in rows[:limit]], len(rows) > limit
+
+    # --- API keys ---
+
+    def list_api_keys(self):
+        with self._connection() as conn:
+            rows = conn.execute(f"SELECT {self.KEY_COLUMNS} FROM api_keys ORDER BY rowid").fetchall()
+        return [_key_from_row(row) for row in rows]
+
+    def get_api_key(self, key_id):
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {self.KEY_COLUMNS} FROM api_keys WHERE id = ?", (key_id,)).fetchone()
+        return _key_from_row(row) if row else None
+
+    def get_api_key_by_hash(self, key_hash):
+        with self._connection() as conn:
+            row = conn.execute(f"SELECT {self.KEY_COLUMNS} FROM api_keys WHERE key_hash = ?", (key_hash,)).fetchone()
+        return _key_from_row(row) if row else None
+
+    def add_api_key(self, api_key, key_hash):
+        return self._insert_api_key("INSERT", api_key, key_hash)
+
+    def replace_api_key(self, api_key, key_hash):
+        # REPLACE drops whichever rows clash on the id or the unique key_hash, atomically.
+        return self._insert_api_key("INSERT OR REPLACE", api_key, key_hash)
+
+    def _insert_api_key(self, verb, api_key, key_hash):
+        with self._connection() as conn:
+            conn.execute(
+                f"{verb} INTO api_keys (id, name, key, key_hash, status, created_at, permissions) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (api_key['id'], api_key['name'], api_key['key'], key_hash,
+                 api_key['status'], api_key['createdAt'], json.dumps(api_key['permissions']))
+            )
+            conn.execute(self.BUMP_VERSION, ('keys',))
+        return api_key
+
+    def delete_api_key(self, key_id):
+        with self._connection() as conn:
+            if conn.execute("DELETE FROM api_keys WHERE id = ?", (key_id,)).rowcount == 0:
+                return False
+            conn.execute(self.BUMP_VERSION, ('keys',))
+        return True
+
+    def set_api_key_status(self, key_id, status):
+        with self._connection() as conn:
+            if conn.execute("UPDATE api_keys SET status = ? WHERE id = ?", (status, key_id)).rowcount == 0:
+                return None
+            conn.execute(self.BUMP_VERSION, ('keys',))
+            row = conn.execute(f"SELECT {self.KEY_COLUMNS} FROM api_keys WHERE id = ?", (key_id,)).fetchone()
+        return _key_from_row(row)
+
+    def count_api_keys(self):
+        with self._connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM api_keys").fetchone()[0]
+
+    def collection_version(self, collection):
+        with self._connection() as conn:
+            row = conn.execute("SELECT version FROM versions WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else 0
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def _copy_key(key):
+    copied = dict(key)
+    copied['permissions'] = dict(key.get('permissions') or {})
+    return copied
+
+
+def _project_from_row(row):
+    return {
+        'id': row[0],
+        'name': row[1],
+        'description': row[2],
+        'owner': row[3],
+        'domainType': row[4],
+        'createdAt': row[5]
+    }
+
+
+def _sort_value(project, sort):
+    if sort == 'name':
+        return project['name'] or ''
+    return project[sort]
+
+
+def _key_from_row(row):
+    return {
+        "id": row[0],
+        "name": row[1],
+        "key": row[2],
+        "status": row[3],
+        "createdAt": row[4],
+        "permissions": json.loads(row[5])
+    }
+
+
+def create_storage(url):
+    """
+    Builds a storage backend from a URL:
+    "sqlite:///<path>" (the default engine) or "memory://".
+    """
+    if url.startswith('memory://'):
+        return MemoryStorage()
+    if url.startswith('sqlite:///'):
+        return SQLiteStorage(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported storage URL: {url}")
@@ -0,0 +1,82 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line, including its `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a bounded queue for a listener thread to format and
+    write, so logging never blocks a request on I/O. When the listener falls
+    behind and the queue is full, records are dropped and counted instead.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener; only what can't safely cross threads is resolved here.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level='INFO', fmt='json', max_queue=10000, stream=None):
+    """
+    Routes the root logger through a DroppingQueueHandler to a listener
+    thread writing to `stream` (stderr by default) as JSON lines or plain
+    text. Returns the handler, whose `dropped` count is exposed as a metric.
+    """
+    root = logging.getLogger()
+    for handler in root.handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler = DroppingQueueHandler(queue.Queue(max_queue))
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    return handler
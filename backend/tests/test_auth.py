@@ -0,0 +1,129 @@
+from types import SimpleNamespace
+
+import pytest
+
+import auth
+from auth import ApiKeyAuthenticator, extract_api_key
+from storage import MemoryStorage, hash_api_key, mask_api_key
+
+RAW_KEY = 'sk_live_0123456789abcdef'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def get_api_key_by_hash(self, key_hash):
+        self.lookups += 1
+        return super().get_api_key_by_hash(key_hash)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+@pytest.fixture
+def storage():
+    storage = CountingStorage()
+    add_key(storage, 'sk-1', RAW_KEY, **{'read:projects': True, 'write:projects': False})
+    return storage
+
+
+def add_key(storage, key_id, raw_key, status='Active', **permissions):
+    storage.add_api_key({
+        'id': key_id,
+        'name': key_id,
+        'key': mask_api_key(raw_key),
+        'status': status,
+        'createdAt': 1700000000,
+        'permissions': permissions
+    }, hash_api_key(raw_key))
+
+
+def test_extract_api_key_sources():
+    assert extract_api_key({'Authorization': 'Bearer sk_a'}, {}) == 'sk_a'
+    assert extract_api_key({'X-API-Key': 'sk_b'}, {'apiKey': 'sk_c'}) == 'sk_b'
+    assert extract_api_key({}, {'apiKey': 'sk_c'}) == 'sk_c'
+    assert extract_api_key({'Authorization': 'Bearer '}, {}) is None
+    assert extract_api_key({}, {}) is None
+
+
+def test_authorize(storage, clock):
+    authenticator = ApiKeyAuthenticator(storage)
+
+    assert authenticator.authorize(RAW_KEY, 'read:projects') is None
+    assert authenticator.authorize(RAW_KEY, 'write:projects')[1] == 403
+    assert authenticator.authorize('sk_unknown', 'read:projects')[1] == 401
+    assert authenticator.authorize(None, 'read:projects')[1] == 401
+    assert authenticator.authorize(None, 'read:projects', required=False) is None
+    # A presented key is verified even where keys aren't required.
+    assert authenticator.authorize('sk_unknown', 'read:projects', required=False)[1] == 401
+
+
+def test_inactive_keys_are_rejected(storage, clock):
+    add_key(storage, 'sk-2', 'sk_inactive', status='Inactive', **{'read:projects': True})
+
+    assert ApiKeyAuthenticator(storage).authorize('sk_inactive', 'read:projects')[1] == 401
+
+
+def test_lookups_are_cached_until_the_ttl_expires(storage, clock):
+    authenticator = ApiKeyAuthenticator(storage, ttl=10)
+
+    assert authenticator.lookup(RAW_KEY) == frozenset({'read:projects'})
+    clock.now += 9
+    assert authenticator.lookup(RAW_KEY) == frozenset({'read:projects'})
+    assert storage.lookups == 1
+
+    storage.set_api_key_status('sk-1', 'Inactive')
+    clock.now += 1
+    assert authenticator.lookup(RAW_KEY) is None
+    assert storage.lookups == 2
+    assert (authenticator.hits, authenticator.misses) == (1, 2)
+
+
+def test_unknown_keys_are_cached_too(storage, clock):
+    authenticator = ApiKeyAuthenticator(storage, ttl=10)
+
+    assert authenticator.lookup('sk_unknown') is None
+    assert authenticator.lookup('sk_unknown') is None
+    assert storage.lookups == 1
+
+
+def test_invalidate_drops_a_key_immediately(storage, clock):
+    authenticator = ApiKeyAuthenticator(storage, ttl=10)
+    authenticator.lookup(RAW_KEY)
+
+    storage.delete_api_key('sk-1')
+    assert authenticator.lookup(RAW_KEY) is not None
+    authenticator.invalidate('sk-1')
+    assert authenticator.lookup(RAW_KEY) is None
+    authenticator.invalidate('sk-missing')
+
+
+def test_cache_evicts_the_least_recently_used_entry(storage, clock):
+    add_key(storage, 'sk-2', 'sk_second', **{'read:projects': True})
+    add_key(storage, 'sk-3', 'sk_third', **{'read:projects': True})
+    authenticator = ApiKeyAuthenticator(storage, ttl=10, max_entries=2)
+
+    authenticator.lookup(RAW_KEY)
+    authenticator.lookup('sk_second')
+    authenticator.lookup(RAW_KEY)  # A hit keeps the first key recent
+    authenticator.lookup('sk_third')
+    assert storage.lookups == 3
+
+    authenticator.lookup(RAW_KEY)
+    assert storage.lookups == 3
+    authenticator.lookup('sk_second')
+    assert storage.lookups == 4
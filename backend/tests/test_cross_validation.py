@@ -0,0 +1,169 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from cross_validation import CrossValidator, SharedArray, assign_folds, create_process_pool, settle
+from inference import NUM_FEATURES
+from training import BLOCK_ROWS, TrainingConfig, TrainingError
+
+SHM_DIR = '/dev/shm'
+
+
+def shared_segments():
+    # SharedMemory names its segments psm_*; on Linux each is a file under /dev/shm.
+    return {name for name in os.listdir(SHM_DIR) if name.startswith('psm_')}
+
+
+needs_shm_dir = pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason='shared memory is not exposed as files here')
+
+
+class ArrayData:
+    """The parts of a TrainingData that cross-validation reads, over in-memory arrays."""
+
+    def __init__(self, features, y, task='classification'):
+        self.task = task
+        self.y = y
+        self.valid = ~np.isnan(y)
+        self._features = features.astype(np.float32)
+        rows = len(y)
+        self.blocks = [(start, min(rows, start + BLOCK_ROWS)) for start in range(0, rows, BLOCK_ROWS)]
+
+    def features(self, start, stop):
+        return self._features[start:stop]
+
+
+def make_data(rows, seed=0, task='classification'):
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(rows, NUM_FEATURES))
+    y = (features[:, 0] > 0).astype(np.float64)
+    return ArrayData(features, y, task)
+
+
+@pytest.fixture(scope='module')
+def validator():
+    validator = CrossValidator(max_workers=2)
+    yield validator
+    validator.pool().shutdown()
+
+
+def test_k_fold_assigns_every_row_to_one_of_k_balanced_folds():
+    y = np.arange(103, dtype=np.float64)
+
+    folds = assign_folds(y, 'regression', 'k-fold', 5, seed=3)
+
+    assert folds.dtype == np.int32
+    assert sorted(np.bincount(folds).tolist()) == [20, 20, 21, 21, 21]
+    assert np.array_equal(folds, assign_folds(y, 'regression', 'k-fold', 5, seed=3))
+    assert not np.array_equal(folds, assign_folds(y, 'regression', 'k-fold', 5, seed=4))
+
+
+def test_stratified_k_fold_keeps_the_class_balance_in_every_fold():
+    y = np.array([1.0] * 30 + [0.0] * 70)
+
+    folds = assign_folds(y, 'classification', 'stratified-k-fold', 5, seed=0)
+
+    for fold in range(5):
+        assert np.count_nonzero(y[folds == fold] == 1.0) == 6
+        assert np.count_nonzero(folds == fold) == 20
+
+
+def test_stratified_regression_splits_on_the_median():
+    y = np.arange(40, dtype=np.float64)
+
+    folds = assign_folds(y, 'regression', 'stratified-k-fold', 4, seed=0)
+
+    for fold in range(4):
+        assert np.count_nonzero(y[folds == fold] > np.median(y)) == 5
+
+
+def test_leave_one_out_gives_each_row_its_own_fold():
+    folds = assign_folds(np.zeros(17), 'classification', 'leave-one-out', 17, seed=1)
+
+    assert sorted(folds.tolist()) == list(range(17))
+
+
+@needs_shm_dir
+def test_shared_array_is_unlinked_when_its_owner_closes():
+    before = shared_segments()
+    owner = SharedArray((4, 3), np.float64)
+    owner.array[:] = 7.0
+
+    attached = SharedArray.attach(owner.spec)
+    assert attached.array.sum() == 84.0
+    attached.close()
+    assert shared_segments() - before == {owner.shm.name.lstrip('/')}
+
+    owner.close()
+    assert shared_segments() == before
+    with pytest.raises(FileNotFoundError):
+        SharedArray.attach(owner.spec)
+
+
+def test_settle_cancels_queued_tasks_and_waits_for_running_ones():
+    pool = create_process_pool(1)
+    try:
+        futures = [pool.submit(time.sleep, 0.3) for _ in range(4)]
+        time.sleep(0.1)
+
+        settle(futures)
+
+        assert all(future.done() for future in futures)
+        assert any(future.cancelled() for future in futures)
+        assert not futures[0].cancelled()
+    finally:
+        pool.shutdown()
+
+
+@needs_shm_dir
+@pytest.mark.parametrize('validation_type, folds', [('k-fold', 3), ('stratified-k-fold', 3), ('leave-one-out', 12)])
+def test_cross_validation_reports_every_fold_and_frees_its_shared_memory(validator, validation_type, folds):
+    data = make_data(12)
+    config = TrainingConfig({'validationType': validation_type, 'kFolds': 3, 'epochs': 3, 'modelType': 'Classification'})
+    before = shared_segments()
+
+    report = validator.run(data, config)
+
+    assert report['validationType'] == validation_type
+    assert report['folds'] == folds
+    assert report['rows'] == 12
+    assert [fold['fold'] for fold in report['foldResults']] == list(range(1, folds + 1))
+    assert sum(fold['validationRows'] for fold in report['foldResults']) == 12
+    assert shared_segments() == before
+
+
+@needs_shm_dir
+def test_a_run_that_fails_while_sharing_rows_frees_its_shared_memory(validator):
+    class UnreadableData(ArrayData):
+        def features(self, start, stop):
+            raise OSError('columnar file vanished')
+
+    data = make_data(12)
+    data.__class__ = UnreadableData
+    before = shared_segments()
+
+    with pytest.raises(OSError):
+        validator.run(data, TrainingConfig({'validationType': 'k-fold', 'kFolds': 3}))
+
+    assert shared_segments() == before
+
+
+def test_too_few_labelled_rows():
+    data = make_data(2)
+    data.valid[1] = False
+
+    with pytest.raises(TrainingError):
+        CrossValidator(max_workers=1).run(data, TrainingConfig({'validationType': 'k-fold', 'kFolds': 2}))
+
+
+@needs_shm_dir
+def test_leave_one_out_falls_back_to_k_fold_on_large_datasets():
+    validator = CrossValidator(max_workers=2, max_folds=5)
+    try:
+        report = validator.run(make_data(20), TrainingConfig({'validationType': 'leave-one-out', 'kFolds': 4, 'epochs': 2}))
+    finally:
+        validator.pool().shutdown()
+
+    assert report['validationType'] == 'k-fold'
+    assert report['folds'] == 4
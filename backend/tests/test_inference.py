@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from inference import InferenceEngine
+from model_registry import ModelRegistry
+
+
+class RecordingScorer:
+    """Scores each record as its own 'value' and remembers every batch it was given."""
+
+    def __init__(self, delay=0.0, offset=0):
+        self.delay = delay
+        self.offset = offset
+        self.batches = []
+
+    def score(self, records):
+        self.batches.append(len(records))
+        time.sleep(self.delay)
+        return np.array([record['value'] + self.offset for record in records], dtype=np.int64)
+
+
+def submit_concurrently(engine, requests):
+    """Submits every (records, scorer) request from its own thread at once; returns the results in order."""
+    results = [None] * len(requests)
+    barrier = threading.Barrier(len(requests))
+
+    def run(index, records, scorer):
+        barrier.wait()
+        results[index] = engine.predict(records, scorer, timeout=10)
+
+    threads = [threading.Thread(target=run, args=(i, records, scorer)) for i, (records, scorer) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_requests_are_coalesced_into_batches():
+    scorer = RecordingScorer(delay=0.01)
+    engine = InferenceEngine(scorer, max_batch_size=16, max_wait=0.05)
+    requests = [([{'value': i}, {'value': i + 100}], None) for i in range(24)]
+
+    results = submit_concurrently(engine, requests)
+
+    assert results == [[i, i + 100] for i in range(24)]
+    assert sum(scorer.batches) == 48
+    assert max(scorer.batches) > 2
+    assert max(scorer.batches) <= 16
+    stats = engine.stats()
+    assert stats['totalRecords'] == 48
+    assert stats['totalBatches'] == len(scorer.batches)
+    assert stats['queuedRecords'] == 0
+
+
+def test_a_callers_records_are_never_split_across_batches():
+    scorer = RecordingScorer(delay=0.01)
+    engine = InferenceEngine(scorer, max_batch_size=4, max_wait=0.05)
+    requests = [([{'value': v} for v in range(i, i + 3)], None) for i in range(0, 30, 3)]
+
+    results = submit_concurrently(engine, requests)
+
+    assert results == [list(range(i, i + 3)) for i in range(0, 30, 3)]
+    assert set(scorer.batches) == {3}
+
+
+def test_requests_for_different_models_are_not_mixed():
+    first, second = RecordingScorer(delay=0.01), RecordingScorer(delay=0.01, offset=1000)
+    engine = InferenceEngine(first, max_batch_size=64, max_wait=0.05)
+    requests = [([{'value': i}], first if i % 2 else second) for i in range(20)]
+
+    results = submit_concurrently(engine, requests)
+
+    assert results == [[i] if i % 2 else [i + 1000] for i in range(20)]
+    assert sum(first.batches) == 10
+    assert sum(second.batches) == 10
+
+
+def test_a_failing_batch_fails_only_its_own_futures():
+    class Failing:
+        def score(self, records):
+            raise ValueError('boom')
+
+    engine = InferenceEngine(RecordingScorer(), max_wait=0.001)
+    with pytest.raises(ValueError):
+        engine.predict([{'value': 1}], Failing(), timeout=5)
+    assert engine.predict([{'value': 2}], timeout=5) == [2]
+
+
+def test_empty_requests_resolve_immediately():
+    assert InferenceEngine(RecordingScorer()).submit([]).result(timeout=0) == []
+
+
+class VersionScorer:
+    """A 'model' whose predictions are the version number written in its file."""
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.version = int(f.read().strip())
+
+    def score(self, records):
+        return np.full(len(records), self.version, dtype=np.int64)
+
+
+def write_model(path, version):
+    # Every version has a different size, so the registry sees the change even within one mtime tick.
+    with open(path, 'w') as f:
+        f.write(f"{version}\n" + ' ' * version)
+
+
+def test_hot_swapping_a_model_under_load_never_mixes_versions(tmp_path):
+    path = tmp_path / 'Risk_Model.pkl'
+    write_model(path, 1)
+    registry = ModelRegistry(str(tmp_path), poll_interval=0, loader=VersionScorer)
+    engine = InferenceEngine(None, max_batch_size=32, max_wait=0.002)
+    versions_by_sha = {registry.get('Risk_Model.pkl')['sha256']: 1}
+    mismatches, seen = [], set()
+    stop = threading.Event()
+
+    def client():
+        while not stop.is_set():
+            model, sha = registry.load_versioned('Risk_Model.pkl')
+            values = engine.predict([{'x': 1}, {'x': 2}], model, timeout=10)
+            seen.add(values[0])
+            if values != [model.version] * 2 or versions_by_sha.get(sha, model.version) != model.version:
+                mismatches.append((values, sha, model.version))
+
+    threads = [threading.Thread(target=client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    try:
+        for version in range(2, 12):
+            time.sleep(0.02)
+            write_model(path, version)
+            registry.refresh()
+            versions_by_sha[registry.get('Risk_Model.pkl')['sha256']] = version
+        time.sleep(0.05)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    assert not mismatches
+    assert len(seen) > 1
+    model, sha = registry.load_versioned('Risk_Model.pkl')
+    assert model.version == 11
+    assert versions_by_sha[sha] == 11
+    assert engine.predict([{'x': 1}], model, timeout=5) == [11]
+
+
+def test_registry_reloads_a_file_replaced_behind_its_index(tmp_path):
+    path = tmp_path / 'Risk_Model.pkl'
+    write_model(path, 1)
+    registry = ModelRegistry(str(tmp_path), poll_interval=0, loader=VersionScorer)
+    stale_sha = registry.get('Risk_Model.pkl')['sha256']
+
+    # Replaced on disk but not yet re-indexed: the load must not be cached under the old hash.
+    write_model(path, 2)
+    model, sha = registry.load_versioned('Risk_Model.pkl')
+
+    assert model.version == 2
+    assert sha != stale_sha
+    assert registry.load('Risk_Model.pkl') is model
+    assert os.path.exists(tmp_path / ModelRegistry.HASHES)
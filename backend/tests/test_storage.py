@@ -0,0 +1,177 @@
+import sqlite3
+
+import pytest
+
+from storage import MemoryStorage, SQLiteStorage, create_storage, hash_api_key, mask_api_key
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        engine = create_storage('memory://')
+    else:
+        engine = create_storage(f"sqlite:///{tmp_path / 'data' / 'uimodel.db'}")
+    yield engine
+    engine.close()
+
+
+def make_project(index, created_at, owner='alice', domain_type='finance', name=None):
+    return {
+        'id': f"proj-{index:03d}",
+        'name': name if name is not None else f"Project {index % 7}",
+        'description': '',
+        'owner': owner,
+        'domainType': domain_type,
+        'createdAt': created_at
+    }
+
+
+def make_key(key_id, key, status='Active', **permissions):
+    return {
+        'id': key_id,
+        'name': key_id,
+        'key': mask_api_key(key),
+        'status': status,
+        'createdAt': 1700000000,
+        'permissions': permissions
+    }
+
+
+def walk(storage, page_size, sort='createdAt', descending=False, **filters):
+    """Follows keyset pages to the end and returns every project in the order the pages gave them."""
+    projects, after = [], None
+    while True:
+        page, has_more = storage.query_projects(sort=sort, descending=descending, after=after, limit=page_size, **filters)
+        projects.extend(page)
+        if not has_more:
+            return projects
+        last = page[-1]
+        after = ((last['name'] or '') if sort == 'name' else last[sort], last['id'])
+
+
+def test_sqlite_creates_its_schema(tmp_path):
+    path = tmp_path / 'data' / 'uimodel.db'
+    SQLiteStorage(str(path)).close()
+
+    conn = sqlite3.connect(path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    columns = {row[1]: row for row in conn.execute("PRAGMA table_info(api_keys)")}
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    conn.close()
+
+    assert {'projects', 'api_keys', 'versions'} <= tables
+    assert {'idx_projects_created', 'idx_projects_owner_created', 'idx_projects_domain_type_created',
+            'idx_projects_name', 'idx_api_keys_key_hash'} <= indexes
+    assert set(columns) == {'id', 'name', 'key', 'key_hash', 'status', 'created_at', 'permissions'}
+    assert columns['key_hash'][3] == 0  # Nullable, for display-only keys
+    assert journal_mode == 'wal'
+
+
+def test_sqlite_schema_is_reapplied_without_losing_data(tmp_path):
+    path = str(tmp_path / 'uimodel.db')
+    first = SQLiteStorage(path)
+    first.create_project(make_project(1, 100))
+    first.add_api_key(make_key('sk-1', 'sk_secret_one'), hash_api_key('sk_secret_one'))
+    first.close()
+
+    second = SQLiteStorage(path)
+    assert second.get_project('proj-001') == make_project(1, 100)
+    assert second.get_api_key_by_hash(hash_api_key('sk_secret_one'))['id'] == 'sk-1'
+    assert second.collection_version('projects') == 1
+    second.close()
+
+
+def test_writes_bump_their_collection_version(storage):
+    projects, keys = storage.collection_version('projects'), storage.collection_version('keys')
+
+    storage.create_project(make_project(1, 100))
+    assert storage.collection_version('projects') == projects + 1
+    storage.add_api_key(make_key('sk-1', 'sk_secret_one'), hash_api_key('sk_secret_one'))
+    storage.set_api_key_status('sk-1', 'Inactive')
+    storage.delete_api_key('sk-1')
+    assert storage.collection_version('keys') == keys + 3
+    assert storage.collection_version('projects') == projects + 1
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('page_size', [1, 4, 50])
+def test_keyset_pages_cover_every_project_once_in_order(storage, descending, page_size):
+    # Several projects share a createdAt, so the id tie-breaker decides their order.
+    for index in range(23):
+        storage.create_project(make_project(index, 1000 + index // 3))
+
+    projects = walk(storage, page_size, descending=descending)
+
+    expected = sorted(storage.list_projects(), key=lambda p: (p['createdAt'], p['id']), reverse=descending)
+    assert [p['id'] for p in projects] == [p['id'] for p in expected]
+
+
+def test_keyset_pages_sorted_by_name(storage):
+    for index in range(15):
+        storage.create_project(make_project(index, 1000 + index, name='' if index == 4 else None))
+
+    projects = walk(storage, 4, sort='name')
+
+    assert [(p['name'], p['id']) for p in projects] == sorted((p['name'], p['id']) for p in storage.list_projects())
+
+
+def test_keyset_pages_with_filters(storage):
+    for index in range(30):
+        storage.create_project(make_project(index, 1000 + index, owner=('alice', 'bob')[index % 2],
+                                            domain_type=('finance', 'health', 'retail')[index % 3]))
+
+    projects = walk(storage, 2, owner='bob', domain_type='health', created_after=1005, created_before=1025)
+
+    assert [p['id'] for p in projects] == [f"proj-{i:03d}" for i in range(5, 25) if i % 2 == 1 and i % 3 == 1]
+
+
+def test_unlimited_query_returns_everything(storage):
+    for index in range(5):
+        storage.create_project(make_project(index, 1000 + index))
+
+    projects, has_more = storage.query_projects(limit=None, descending=True)
+
+    assert [p['id'] for p in projects] == [f"proj-{i:03d}" for i in range(4, -1, -1)]
+    assert has_more is False
+
+
+def test_api_keys_are_stored_masked_and_found_by_hash(storage):
+    raw = 'sk_0123456789abcdef0123456789abcdef'
+    storage.add_api_key(make_key('sk-1', raw, **{'read:projects': True}), hash_api_key(raw))
+
+    stored = storage.get_api_key_by_hash(hash_api_key(raw))
+    assert stored['id'] == 'sk-1'
+    assert stored['key'] == 'sk_01...cdef'
+    assert stored['permissions'] == {'read:projects': True}
+    assert all(raw not in str(key) for key in storage.list_api_keys())
+    assert storage.get_api_key_by_hash(hash_api_key('sk_other')) is None
+
+
+def test_seeded_keys_are_display_only(storage):
+    storage.seed_api_keys([make_key('sk-1', 'sk_...aBc1'), make_key('sk-2', 'sk_...dEf2')])
+    storage.seed_api_keys([make_key('sk-3', 'sk_...gHi3')])
+
+    assert [key['id'] for key in storage.list_api_keys()] == ['sk-1', 'sk-2']
+    assert storage.get_api_key_by_hash(hash_api_key('sk_...aBc1')) is None
+    assert storage.next_api_key_id() == 'sk-3'
+
+
+def test_replacing_a_key_drops_the_old_secret(storage):
+    storage.add_api_key(make_key('sk-admin', 'sk_first'), hash_api_key('sk_first'))
+
+    storage.replace_api_key(make_key('sk-admin', 'sk_second'), hash_api_key('sk_second'))
+    storage.replace_api_key(make_key('sk-admin', 'sk_second'), hash_api_key('sk_second'))
+
+    assert storage.get_api_key_by_hash(hash_api_key('sk_first')) is None
+    assert storage.get_api_key_by_hash(hash_api_key('sk_second'))['id'] == 'sk-admin'
+    assert storage.count_api_keys() == 1
+    assert storage.delete_api_key('sk-admin')
+    assert storage.get_api_key_by_hash(hash_api_key('sk_second')) is None
+    assert not storage.delete_api_key('sk-admin')
+
+
+def test_unknown_storage_url():
+    with pytest.raises(ValueError):
+        create_storage('postgres://localhost/uimodel')
+    assert isinstance(create_storage('memory://'), MemoryStorage)
@@ -0,0 +1,313 @@
+import os
+import pickle
+import uuid
+
+import numpy as np
+
+from geospatial import GeoError, GeoStage
+from inference import LinearScorer, NUM_FEATURES, featurize_columns
+from preprocessing import Preprocessor
+
+# Rows featurized at a time; training streams over the memory-mapped columns in blocks.
+BLOCK_ROWS = 65536
+# Category labels treated as the positive class of a categorical target.
+POSITIVE_LABELS = frozenset(['true', '1', 'yes', 'y', 'positive', 'anomaly', 'malicious', 'bad', 'fraud'])
+
+
+class TrainingError(Exception):
+    """The dataset or parameters can't be used for training."""
+
+
+def _number(value, default, cast, low, high):
+    try:
+        return min(high, max(low, cast(float(value))))
+    except (TypeError, ValueError):
+        return default
+
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes', 'on')
+    return bool(value)
+
+
+def _list(value):
+    return value if isinstance(value, list) else []
+
+
+class TrainingConfig:
+    """The ModelParameters fields the training engine honours, coerced and clamped."""
+
+    def __init__(self, params=None):
+        params = params or {}
+        self.learning_rate = _number(params.get('learningRate'), 0.01, float, 1e-6, 10.0)
+        self.epochs = _number(params.get('epochs'), 100, int, 1, 1000)
+        self.batch_size = _number(params.get('batchSize'), 32, int, 1, BLOCK_ROWS)
+        self.train_split = _number(params.get('trainTestSplit'), 80, float, 1, 100) / 100
+        self.model_type = params.get('modelType') or 'Regression'
+        self.target = params.get('targetColumn')
+        self.seed = _number(params.get('seed'), 0, int, 0, 2 ** 32 - 1)
+        self.validation_type = params.get('validationType') or 'train-test'
+        self.k_folds = _number(params.get('kFolds'), 5, int, 2, 100)
+        self.geo_fencing = _flag(params.get('geoFencing'))
+        self.calculate_distance = _flag(params.get('calculateDistance'))
+        self.geofences = _list(params.get('geofences'))
+        self.reference_points = _list(params.get('referencePoints'))
+        self.latitude_column = params.get('latitudeColumn')
+        self.longitude_column = params.get('longitudeColumn')
+        # handleMissingData / dataCleaning / featureScaling are parsed by preprocessing.Preprocessor.
+        self.params = params
+
+
+class TrainingData:
+    """
+    Target vector, train/validation masks and block-wise features for a dataset.
+
+    The target is the `targetColumn` parameter or the last column. Categorical
+    targets (and any target when modelType isn't 'Regression') are trained as
+    binary classification; numeric targets under 'Regression' are min-max
+    scaled to [0, 1] and fitted with linear regression.
+    With geoFencing or calculateDistance, the columns derived by a GeoStage
+    are computed once over all rows and featurized with the dataset's own.
+    handleMissingData / dataCleaning / featureScaling fit a Preprocessor
+    (in parallel chunks on `pool()` for large datasets); rows it drops are
+    left out of both splits and its transforms are applied to every block.
+    Featurized blocks are cached as float32 while they fit in `feature_cache_bytes`.
+    """
+
+    def __init__(self, dataset, config, feature_cache_bytes=512 * 1024 * 1024, pool=None):
+        if len(dataset.columns) < 2:
+            raise TrainingError('Training needs at least one feature column and a target column.')
+        target = dataset.column(config.target) if config.target else dataset.columns[-1]
+        if target is None:
+            raise TrainingError(f'Target column "{config.target}" not found in the dataset.')
+
+        self.rows = dataset.rows
+        self.target = target.name
+        self.feature_columns = [c for c in dataset.columns if c is not target]
+        if target.is_categorical or config.model_type != 'Regression':
+            self.task = 'classification'
+            self.y, valid, self.target_info = _classification_target(target)
+        else:
+            self.task = 'regression'
+            self.y, valid, self.target_info = _regression_target(target)
+        self.preprocessor, keep = Preprocessor.fit(dataset, self.feature_columns, config.params, pool)
+        if keep is not None:
+            valid = valid & keep
+        if not valid.any():
+            raise TrainingError(f'Target column "{self.target}" has no values.')
+        self.valid = valid
+
+        try:
+            self.geo = GeoStage.fit(self.feature_columns, config)
+            self.geo_columns = self.geo.columns_for_dataset(self.feature_columns) if self.geo else []
+        except GeoError as e:
+            raise TrainingError(str(e))
+
+        split = np.random.default_rng(config.seed).random(self.rows) < config.train_split
+        self.train_mask = valid & split
+        self.validation_mask = valid & ~split
+        if not self.train_mask.any():
+            self.train_mask = valid
+        if not self.validation_mask.any():
+            # No holdout (e.g. a 100% split): report metrics on the training rows.
+            self.validation_mask = self.train_mask
+
+        self.blocks = [(start, min(self.rows, start + BLOCK_ROWS)) for start in range(0, self.rows, BLOCK_ROWS)]
+        cacheable = self.rows * NUM_FEATURES * 4 <= feature_cache_bytes
+        self._cache = {} if cacheable else None
+
+    def features(self, start, stop):
+        if self._cache is not None and start in self._cache:
+            return self._cache[start]
+        columns = self.feature_columns + self.geo_columns
+        if self.preprocessor:
+            columns, start_row, stop_row = self.preprocessor.transform_columns(columns, start, stop), 0, None
+        else:
+            start_row, stop_row = start, stop
+        features = featurize_columns(columns, start_row, stop_row).astype(np.float32)
+        if self._cache is not None:
+            self._cache[start] = features
+        return features
+
+    @property
+    def link(self):
+        return 'logistic' if self.task == 'classification' else 'identity'
+
+
+def _classification_target(column):
+    if column.is_categorical:
+        codes = np.asarray(column.values)
+        valid = codes >= 0
+        positive = next((i for i, c in enumerate(column.categories) if str(c).strip().lower() in POSITIVE_LABELS), None)
+        if positive is None:
+            # Otherwise the minority class is the positive one.
+            counts = np.bincount(codes[valid], minlength=len(column.categories))
+            present = np.flatnonzero(counts)
+            positive = int(present[np.argmin(counts[present])])
+        y = (codes == positive).astype(np.float64)
+        return y, valid, {'positiveLabel': column.categories[positive]}
+
+    values = np.asarray(column.values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    present = values[valid]
+    if np.isin(present, (0.0, 1.0)).all():
+        return np.where(valid, values, 0.0), valid, {'positiveLabel': 1}
+    threshold = float(np.median(present))
+    return (values > threshold).astype(np.float64), valid, {'positiveLabel': f'> {threshold}'}
+
+
+def _regression_target(column):
+    values = np.asarray(column.values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    low, high = float(np.min(values[valid], initial=0.0)), float(np.max(values[valid], initial=0.0))
+    span = high - low or 1.0
+    return np.where(valid, (values - low) / span, 0.0), valid, {'min': low, 'max': high}
+
+
+def forward(features, weights, bias, logistic):
+    logits = features @ weights + bias
+    if logistic:
+        return 1.0 / (1.0 + np.exp(-np.clip(logits, -500, 500)))
+    return logits
+
+
+def _loss(outputs, targets, logistic):
+    if logistic:
+        p = np.clip(outputs, 1e-7, 1 - 1e-7)
+        return float(-np.mean(targets * np.log(p) + (1 - targets) * np.log(1 - p)))
+    return float(np.mean((outputs - targets) ** 2))
+
+
+def evaluate(weights, bias, data, mask):
+    """Scores the rows selected by `mask` and returns their metrics (see `score_metrics`)."""
+    logistic = data.task == 'classification'
+    outputs, targets = [], []
+    for start, stop in data.blocks:
+        block_mask = mask[start:stop]
+        if block_mask.any():
+            outputs.append(forward(data.features(start, stop)[block_mask], weights, bias, logistic))
+            targets.append(data.y[start:stop][block_mask])
+    return score_metrics(np.concatenate(outputs), np.concatenate(targets), logistic)
+
+
+def score_metrics(outputs, targets, logistic):
+    """
+    Returns loss plus accuracy, precision, recall and F1 as percentages for
+    model outputs against targets. For regression, accuracy is R² (floored
+    at 0) and precision/recall/F1 are for "above the median target".
+    """
+    if logistic:
+        predicted, actual = outputs >= 0.5, targets >= 0.5
+        accuracy = float(np.mean(predicted == actual))
+    else:
+        residual = float(np.sum((targets - outputs) ** 2))
+        total = float(np.sum((targets - targets.mean()) ** 2)) or 1.0
+        accuracy = max(0.0, 1.0 - residual / total)
+        threshold = float(np.median(targets))
+        predicted, actual = outputs > threshold, targets > threshold
+
+    true_positives = float(np.sum(predicted & actual))
+    precision = true_positives / max(1.0, float(np.sum(predicted)))
+    recall = true_positives / max(1.0, float(np.sum(actual)))
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        'loss': round(_loss(outputs, targets, logistic), 6),
+        'accuracy': round(accuracy * 100, 2),
+        'precision': round(precision * 100, 2),
+        'recall': round(recall * 100, 2),
+        'f1Score': round(f1 * 100, 2),
+        'samples': int(targets.size)
+    }
+
+
+def train(data, config, on_epoch=None, check_cancelled=None):
+    """
+    Fits a model on the dataset's train split and evaluates it on the
+    validation split after each epoch (see `fit`).
+    Calls on_epoch(epoch, epochs, train_loss, validation_metrics) after each epoch.
+    Returns (model, final_validation_metrics, history).
+    """
+    weights, bias, metrics, history = fit(data, config, data.train_mask, data.validation_mask, on_epoch, check_cancelled)
+    return build_model(data, weights, bias, metrics), metrics, history
+
+
+def build_model(data, weights, bias, metrics):
+    """Wraps fitted weights for `data` (a TrainingData) in a LinearScorer that records how it was trained."""
+    geo = getattr(data, 'geo', None)
+    preprocessor = getattr(data, 'preprocessor', None)
+    return LinearScorer(weights=weights, bias=bias, link=data.link, geo=geo, preprocessor=preprocessor, metadata={
+        'task': data.task,
+        'target': data.target,
+        'targetInfo': data.target_info,
+        'features': [c.name for c in data.feature_columns],
+        'geo': geo.describe() if geo else None,
+        'preprocessing': preprocessor.describe() if preprocessor else None,
+        'metrics': metrics
+    })
+
+
+def fit(data, config, train_mask, validation_mask, on_epoch=None, check_cancelled=None, track_history=True, initial=None):
+    """
+    Fits a linear/logistic model on the rows in `train_mask` with vectorized
+    mini-batch gradient descent, honouring learningRate, epochs and batchSize.
+    Blocks are visited in a shuffled order and rows are shuffled within each
+    block every epoch. `data` only needs `task`, `blocks`, `features()` and `y`.
+    Without `track_history` (and no on_epoch) the validation rows are scored
+    once at the end instead of after every epoch. `initial` is a (weights,
+    bias) pair to continue training from instead of zeros.
+    Returns (weights, bias, final_validation_metrics, history).
+    """
+    logistic = data.task == 'classification'
+    track_history = track_history or on_epoch is not None
+    rng = np.random.default_rng(config.seed)
+    if initial is None:
+        weights, bias = np.zeros(NUM_FEATURES, dtype=np.float64), 0.0
+    else:
+        weights, bias = np.array(initial[0], dtype=np.float64), float(initial[1])
+    history = []
+    metrics = None
+
+    for epoch in range(1, config.epochs + 1):
+        loss_sum, seen = 0.0, 0
+        for block_index in rng.permutation(len(data.blocks)):
+            if check_cancelled:
+                check_cancelled()
+            start, stop = data.blocks[block_index]
+            block_mask = train_mask[start:stop]
+            if not block_mask.any():
+                continue
+            features = data.features(start, stop)[block_mask]
+            targets = data.y[start:stop][block_mask]
+            order = rng.permutation(targets.size)
+            for i in range(0, order.size, config.batch_size):
+                batch = order[i:i + config.batch_size]
+                batch_features, batch_targets = features[batch], targets[batch]
+                outputs = forward(batch_features, weights, bias, logistic)
+                error = outputs - batch_targets
+                weights -= config.learning_rate * (batch_features.T @ error) / batch.size
+                bias -= config.learning_rate * float(error.mean())
+                loss_sum += _loss(outputs, batch_targets, logistic) * batch.size
+                seen += batch.size
+
+        if not track_history:
+            continue
+        train_loss = loss_sum / max(1, seen)
+        metrics = evaluate(weights, bias, data, validation_mask)
+        history.append({'epoch': epoch, 'loss': round(train_loss, 6), 'validation': metrics})
+        if on_epoch:
+            on_epoch(epoch, config.epochs, train_loss, metrics)
+
+    if metrics is None:
+        metrics = evaluate(weights, bias, data, validation_mask)
+    return weights, bias, metrics, history
+
+
+def save_model(model, folder, filename):
+    """Pickles a trained model into the models folder with an atomic rename."""
+    path = os.path.join(folder, filename)
+    tmp_path = os.path.join(folder, f".{filename}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
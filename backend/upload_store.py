@@ -0,0 +1,304 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+# Streams are copied through a buffer of at most this many bytes, so memory use
+# stays flat regardless of file size.
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """An upload request that can't be applied; carries the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadSession:
+    """State of one resumable upload: the partial file on disk plus an incremental hash."""
+
+    def __init__(self, upload_id, filename, size, created_at=None):
+        self.id = upload_id
+        self.filename = filename
+        self.size = size
+        self.offset = 0
+        self.created_at = created_at or time.time()
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        return {
+            'uploadId': self.id,
+            'fileName': self.filename,
+            'size': self.size,
+            'offset': self.offset,
+            'createdAt': self.created_at
+        }
+
+
+class UploadStore:
+    """
+    Content-hashed file store for the uploads folder.
+
+    Files are streamed to a partial file under `.partial/` while being hashed,
+    then committed with an atomic rename. A manifest maps each committed file
+    name to its SHA-256 digest; a file whose content is already stored under
+    another name is hard-linked instead of written twice.
+
+    Resumable uploads are sessions: the client declares the total size, then
+    appends chunks at the current offset until the upload is complete. Session
+    metadata is kept on disk so an upload can resume after a server restart.
+    """
+
+    MANIFEST = '.manifest.json'
+
+    def __init__(self, folder, buffer_size=DEFAULT_BUFFER_SIZE, max_file_size=None, session_ttl=24 * 3600):
+        self.folder = folder
+        self.partial_folder = os.path.join(folder, '.partial')
+        self.buffer_size = buffer_size
+        self.max_file_size = max_file_size
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._sessions = {}
+        os.makedirs(self.partial_folder, exist_ok=True)
+        self._manifest = self._read_manifest()
+
+    # --- Manifest ---
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.folder, self.MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        path = os.path.join(self.folder, self.MANIFEST)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, path)
+
+    def file_hash(self, filename):
+        """
+        Returns the SHA-256 digest of a stored file, hashing (and recording) it
+        once if it predates the manifest or changed on disk. None if missing.
+        """
+        path = os.path.join(self.folder, filename)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._manifest.get(filename)
+        if entry and entry['size'] == st.st_size and entry['mtime'] == st.st_mtime:
+            return entry['sha256']
+
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(self.buffer_size), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        with self._lock:
+            self._manifest[filename] = {'sha256': digest, 'size': st.st_size, 'mtime': st.st_mtime}
+            self._write_manifest()
+        return digest
+
+    def latest(self, suffix=''):
+        """Returns the name of the most recently committed file ending in `suffix`, or None."""
+        with self._lock:
+            entries = sorted(self._manifest.items(), key=lambda item: item[1]['mtime'], reverse=True)
+        for filename, _ in entries:
+            if filename.lower().endswith(suffix) and os.path.exists(os.path.join(self.folder, filename)):
+                return filename
+        return None
+
+    def known_hashes(self):
+        """Returns the content hashes of all files recorded in the manifest."""
+        with self._lock:
+            return {entry['sha256'] for entry in self._manifest.values()}
+
+    def _find_by_hash(self, digest):
+        for filename, entry in self._manifest.items():
+            if entry['sha256'] == digest and os.path.exists(os.path.join(self.folder, filename)):
+                return filename
+        return None
+
+    # --- Streaming writes ---
+
+    def _copy(self, stream, f, hasher, limit):
+        """Copies at most `limit` bytes from stream to f, hashing as it goes. Returns the bytes copied."""
+        copied = 0
+        while True:
+            chunk = stream.read(self.buffer_size if limit is None else min(self.buffer_size, limit - copied + 1))
+            if not chunk:
+                return copied
+            copied += len(chunk)
+            if limit is not None and copied > limit:
+                raise UploadError('Upload exceeds the declared or maximum file size', 413)
+            hasher.update(chunk)
+            f.write(chunk)
+
+    def _commit(self, partial_path, filename, digest):
+        """Atomically moves a fully written partial file into place, deduplicating by content hash."""
+        final_path = os.path.join(self.folder, filename)
+        with self._lock:
+            existing = self._find_by_hash(digest)
+            if existing == filename:
+                os.remove(partial_path)
+            elif existing:
+                # Same bytes already stored under another name: share them via a hard link.
+                link_path = f"{partial_path}.link"
+                try:
+                    os.link(os.path.join(self.folder, existing), link_path)
+                    os.remove(partial_path)
+                    os.replace(link_path, final_path)
+                except OSError:
+                    os.replace(partial_path, final_path)
+            else:
+                os.replace(partial_path, final_path)
+            st = os.stat(final_path)
+            self._manifest[filename] = {'sha256': digest, 'size': st.st_size, 'mtime': st.st_mtime}
+            self._write_manifest()
+        return {'fileName': filename, 'size': st.st_size, 'sha256': digest, 'deduplicated': existing is not None}
+
+    def save_stream(self, stream, filename):
+        """Streams a whole file (e.g. a multipart part) to disk and commits it."""
+        partial_path = os.path.join(self.partial_folder, f"{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        try:
+            with open(partial_path, 'wb') as f:
+                self._copy(stream, f, hasher, self.max_file_size)
+        except BaseException:
+            os.remove(partial_path)
+            raise
+        return self._commit(partial_path, filename, hasher.hexdigest())
+
+    # --- Resumable sessions ---
+
+    def _session_paths(self, upload_id):
+        base = os.path.join(self.partial_folder, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def create_session(self, filename, size):
+        if size < 0:
+            raise UploadError('Upload size must not be negative')
+        if self.max_file_size is not None and size > self.max_file_size:
+            raise UploadError('Upload exceeds the maximum file size', 413)
+        self._expire_sessions()
+
+        session = UploadSession(uuid.uuid4().hex, filename, size)
+        partial_path, meta_path = self._session_paths(session.id)
+        open(partial_path, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump({'fileName': filename, 'size': size, 'createdAt': session.created_at}, f)
+        with self._lock:
+            self._sessions[session.id] = session
+        return session
+
+    def get_session(self, upload_id):
+        """Returns a live session, restoring it from disk (and re-hashing the partial file) if needed."""
+        if not upload_id.isalnum():
+            return None
+        with self._lock:
+            session = self._sessions.get(upload_id)
+        if session:
+            return session
+
+        partial_path, meta_path = self._session_paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        session = UploadSession(upload_id, meta['fileName'], meta['size'], meta['createdAt'])
+        try:
+            with open(partial_path, 'rb') as f:
+                for block in iter(lambda: f.read(self.buffer_size), b''):
+                    session.hasher.update(block)
+                    session.offset += len(block)
+        except FileNotFoundError:  # Expired between reading the metadata and the data
+            return None
+        with self._lock:
+            return self._sessions.setdefault(upload_id, session)
+
+    def append_chunk(self, upload_id, offset, stream):
+        """
+        Appends a chunk at `offset`, which must equal the session's current offset.
+        Commits the file once all declared bytes have arrived.
+        Returns the session state, plus the committed file info when complete.
+        """
+        session = self.get_session(upload_id)
+        if session is None:
+            raise UploadError('Upload not found', 404)
+
+        with session.lock:
+            if offset != session.offset:
+                raise UploadError(f'Offset mismatch: expected {session.offset}', 409)
+            partial_path, meta_path = self._session_paths(upload_id)
+            remaining = session.size - session.offset
+            hasher = session.hasher.copy()
+            try:
+                f = open(partial_path, 'r+b')
+            except FileNotFoundError:
+                raise self._expired(upload_id)
+            with f:
+                f.seek(session.offset)
+                try:
+                    written = self._copy(stream, f, hasher, remaining)
+                except BaseException:
+                    # Drop the half-written chunk so the client can retry it from the same offset.
+                    f.truncate(session.offset)
+                    raise
+            session.hasher = hasher
+            session.offset += written
+            try:
+                os.utime(meta_path)  # Keeps an active session from expiring
+            except FileNotFoundError:
+                raise self._expired(upload_id)
+
+            result = session.to_dict()
+            if session.offset == session.size:
+                result['file'] = self._commit(partial_path, session.filename, session.hasher.hexdigest())
+                os.remove(meta_path)
+                with self._lock:
+                    self._sessions.pop(upload_id, None)
+            return result
+
+    def _expired(self, upload_id):
+        """Forgets a session whose files expired while it was in use; returns the error to raise."""
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+        for path in self._session_paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+        return UploadError('Upload session expired', 410)
+
+    def abort_session(self, upload_id):
+        session = self.get_session(upload_id)
+        if session is None:
+            return False
+        with session.lock, self._lock:
+            self._sessions.pop(upload_id, None)
+            for path in self._session_paths(upload_id):
+                if os.path.exists(path):
+                    os.remove(path)
+        return True
+
+    def _expire_sessions(self):
+        cutoff = time.time() - self.session_ttl
+        for name in os.listdir(self.partial_folder):
+            path = os.path.join(self.partial_folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    if name.endswith('.json'):
+                        with self._lock:
+                            self._sessions.pop(name[:-len('.json')], None)
+            except OSError:
+                pass
@@ -61,6 +61,7 @@ const PERMISSIONS_CONFIG = {
     'write:users': 'Invite, suspend, or remove users from the organization.',
     'read:billing': 'View billing history, invoices, and current usage metrics.',
     'admin:webhooks': 'Create, update, and delete webhooks for platform integrations.',
+    'admin:keys': 'Create, revoke, and manage API keys. Keys can only grant permissions they hold.',
   },
 };
 